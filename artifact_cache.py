@@ -0,0 +1,95 @@
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import tracing
+
+# One manifest per script: data_cache/manifests/{name}.json, plus
+# {name}.shard-{i}-of-{n}.json written by `--shard i/n` runs until they are merged
+MANIFEST_ROOT = 'data_cache/manifests'
+
+
+class ArtifactManifest:
+    """Records a hash of the inputs each output (chart/CSV) was rendered from.
+
+    A stage whose inputs hash to the recorded value and whose outputs still exist
+    can be skipped. The manifest is only touched by the parent process, so jobs
+    running in a process pool never race on it. A shard run reads the main manifest
+    but writes its own file, so concurrent shards never share one.
+    """
+
+    def __init__(self, name, root=MANIFEST_ROOT, shard=None):
+        main_path = os.path.join(root, f"{name}.json")
+        self.path = main_path if shard is None else os.path.join(root, f"{name}.shard-{shard[0] + 1}-of-{shard[1]}.json")
+        self.entries = {}
+        self.pending = {}
+        for path in dict.fromkeys([main_path, self.path]):
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self.entries.update(json.load(f))
+
+    # Hash of a frame (index, columns and values) plus any JSON-serializable parameters
+    @staticmethod
+    def digest(df, *params):
+        h = hashlib.sha256()
+        h.update(json.dumps([list(map(str, df.columns)), params], sort_keys=True, default=str).encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return h.hexdigest()
+
+    def is_current(self, key, digest, outputs):
+        entry = self.entries.get(key)
+        return (entry is not None and entry['hash'] == digest
+                and all(os.path.exists(path) for path in outputs))
+
+    def record(self, key, digest, outputs):
+        self.entries[key] = {'hash': digest, 'outputs': list(outputs)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    # Split jobs into the ones that must run and the ones whose outputs are current.
+    # jobs: list of (key, args, df, outputs); params are hashed together with df.
+    # Returns (jobs to run as (key, args), skipped keys).
+    def plan(self, jobs, params, force=False):
+        to_run = []
+        skipped = []
+        self.pending = {}
+        for key, args, df, outputs in jobs:
+            if key in self.pending or key in skipped:
+                continue
+            digest = self.digest(df, params)
+            if not force and self.is_current(key, digest, outputs):
+                skipped.append(key)
+            else:
+                self.pending[key] = (digest, outputs)
+                to_run.append((key, args))
+        tracing.count('artifact_hits', len(skipped))
+        tracing.count('artifact_misses', len(to_run))
+        return to_run, skipped
+
+    # Record the planned hashes of the jobs that succeeded and write the manifest
+    def commit(self, succeeded):
+        for key in succeeded:
+            if key in self.pending:
+                self.record(key, *self.pending[key])
+        self.save()
+
+
+# Fold the shard manifests of a script into its main manifest and remove them
+def merge_manifests(name, root=MANIFEST_ROOT):
+    manifest = ArtifactManifest(name, root)
+    shard_paths = sorted(glob.glob(os.path.join(root, f"{glob.escape(name)}.shard-*.json")))
+    for path in shard_paths:
+        with open(path, encoding='utf-8') as f:
+            manifest.entries.update(json.load(f))
+    manifest.save()
+    for path in shard_paths:
+        os.remove(path)
+    return manifest
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+FILL_MODES = ('next_open', 'close')
+
+
+# Forward fill along the date axis of a (dates x tickers) array; leading NaNs stay NaN
+def _ffill(values):
+    rows = np.where(np.isnan(values), 0, np.arange(values.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def _shift(values, fill):
+    shifted = np.empty_like(values)
+    shifted[0] = fill
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+# Value of a position relative to the equity just before its entry: the remaining cash
+# (1 - size - entry commission) plus size * price / entry
+def _segment_value(size, price, entry, commission):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(size != 0, 1 - size - commission * np.abs(size) + size * price / entry, 1.0)
+
+
+# Vectorized backtest of target positions for the whole universe.
+# close / open_ / positions are (dates x tickers) frames; positions are the target
+# fraction of each ticker's equity (1 = fully long, -1 = fully short, 0 = flat)
+# decided at each bar's close. Every ticker is an independent account starting
+# with `cash`, like one Cerebro per ticker.
+# fill='next_open' fills at the next bar's open (backtrader's default market order),
+# fill='close' fills at the signal bar's close (cheat-on-close).
+# A change of target closes the old position and opens the new one at the fill price.
+# commission is a fraction of traded value, slippage a fraction of the fill price.
+# Returns (equity, trades): equity is (dates x tickers), trades has one row per position.
+def run_backtest(close, positions, open_=None, cash=10000.0, commission=0.0, slippage=0.0, fill='next_open'):
+    if fill not in FILL_MODES:
+        raise ValueError(f"fill must be one of {FILL_MODES}")
+    close_values = _ffill(close.to_numpy(dtype=np.float64))
+    target = positions.reindex(index=close.index, columns=close.columns).to_numpy(dtype=np.float64)
+    target = np.nan_to_num(target)
+
+    if fill == 'next_open':
+        opens = (open_.reindex(index=close.index, columns=close.columns).to_numpy(dtype=np.float64)
+                 if open_ is not None else np.full_like(close_values, np.nan))
+        fill_price = np.where(np.isnan(opens), close_values, opens)
+        held = _shift(target, 0.0)
+    else:
+        fill_price = close_values
+        held = target
+    held = np.where(np.isnan(close_values), 0.0, held)
+    prev_held = _shift(held, 0.0)
+    change = held != prev_held
+    entries = change & (held != 0)
+    exits = change & (prev_held != 0)
+
+    entry_price = fill_price * (1 + slippage * np.sign(held))
+    exit_price = fill_price * (1 - slippage * np.sign(prev_held))
+    entry = _ffill(np.where(entries, entry_price, np.nan))
+    prev_entry = _shift(entry, np.nan)
+
+    value_prev_close = _segment_value(prev_held, _shift(close_values, np.nan), prev_entry, commission)
+    value_close = _segment_value(held, close_values, entry, commission)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        exit_cost = np.where(prev_held != 0, commission * np.abs(prev_held) * exit_price / prev_entry, 0.0)
+        value_exit = _segment_value(prev_held, exit_price, prev_entry, commission) - exit_cost
+        before_entry = value_exit / value_prev_close
+        growth = np.where(change, before_entry * value_close, value_close / value_prev_close)
+    equity_values = cash * np.cumprod(growth, axis=0)
+    equity = pd.DataFrame(equity_values, index=close.index, columns=close.columns)
+
+    # Equity just before each entry (after closing the previous position at the same fill)
+    pre_entry = _shift(equity_values, cash) * before_entry
+    trades = _trades(close.index, close.columns, held, entries, exits, entry_price, exit_price,
+                     pre_entry, value_exit, value_close)
+    return equity, trades
+
+
+# Pair every entry with the first exit after it in the same column
+def _trades(dates, tickers, held, entries, exits, entry_price, exit_price,
+            pre_entry, value_exit, value_close):
+    n_dates = len(dates)
+    entry_cols, entry_rows = np.nonzero(entries.T)
+    exit_cols, exit_rows = np.nonzero(exits.T)
+    exit_keys = exit_cols * (n_dates + 1) + exit_rows
+    if len(exit_keys):
+        match = np.searchsorted(exit_keys, entry_cols * (n_dates + 1) + entry_rows, side='right')
+        safe = np.minimum(match, len(exit_keys) - 1)
+        closed = (match < len(exit_keys)) & (exit_cols[safe] == entry_cols)
+        exit_at = np.where(closed, exit_rows[safe], n_dates - 1)
+    else:
+        closed = np.zeros(len(entry_rows), dtype=bool)
+        exit_at = np.full(len(entry_rows), n_dates - 1)
+
+    start_equity = pre_entry[entry_rows, entry_cols]
+    final_value = np.where(closed, value_exit[exit_at, entry_cols], value_close[exit_at, entry_cols])
+    pnl = start_equity * (final_value - 1)
+    trades = pd.DataFrame({
+        'ticker': np.asarray(tickers)[entry_cols],
+        'entry_date': dates[entry_rows],
+        'exit_date': pd.DatetimeIndex(dates[exit_at]).where(closed),
+        'size': held[entry_rows, entry_cols],
+        'entry_price': entry_price[entry_rows, entry_cols],
+        'exit_price': np.where(closed, exit_price[exit_at, entry_cols], np.nan),
+        'bars': np.where(closed, exit_at - entry_rows, exit_at - entry_rows + 1),
+        'pnl': pnl,
+        'return_pct': pnl / start_equity * 100,
+        'status': np.where(closed, 'closed', 'open'),
+    })
+    return trades
+
+
+# Per-ticker summary using the names of backtrader's analyzers for cross-checking:
+# Returns (rtot), TradeAnalyzer (total/open/closed/won/lost, pnl), DrawDown (max drawdown,
+# moneydown, len) and SharpeRatio(timeframe=Days, annualize=True, riskfreerate=0).
+def summarize(equity, trades, cash=10000.0):
+    values = equity.to_numpy()
+    previous = _shift(values, cash)
+    returns = values / previous - 1
+    peak = np.maximum(np.maximum.accumulate(values, axis=0), cash)
+    drawdown = (peak - values) / peak * 100
+    at_peak = values >= peak
+    last_peak = np.maximum.accumulate(np.where(at_peak, np.arange(len(values))[:, None], -1), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = returns.mean(axis=0) / returns.std(axis=0) * np.sqrt(TRADING_DAYS)
+
+    summary = pd.DataFrame({
+        'start_value': cash,
+        'end_value': values[-1],
+        'rtot': np.log(values[-1] / cash),
+        'return_pct': (values[-1] / cash - 1) * 100,
+        'max_drawdown': drawdown.max(axis=0),
+        'max_moneydown': (peak - values).max(axis=0),
+        'max_len': (np.arange(len(values))[:, None] - last_peak).max(axis=0),
+        'sharpe': np.where(returns.std(axis=0) > 0, sharpe, np.nan),
+    }, index=equity.columns)
+
+    closed = trades[trades['status'] == 'closed']
+    grouped = closed.groupby('ticker')['pnl']
+    summary['trades_total'] = trades.groupby('ticker').size()
+    summary['trades_open'] = (trades['status'] == 'open').groupby(trades['ticker']).sum()
+    summary['trades_closed'] = grouped.size()
+    summary['won'] = (closed['pnl'] > 0).groupby(closed['ticker']).sum()
+    summary['lost'] = (closed['pnl'] <= 0).groupby(closed['ticker']).sum()
+    summary['pnl_net'] = grouped.sum()
+    summary['pnl_won'] = closed['pnl'].where(closed['pnl'] > 0, 0).groupby(closed['ticker']).sum()
+    summary['pnl_lost'] = closed['pnl'].where(closed['pnl'] <= 0, 0).groupby(closed['ticker']).sum()
+    counts = ['trades_total', 'trades_open', 'trades_closed', 'won', 'lost']
+    summary[counts] = summary[counts].fillna(0).astype(int)
+    summary[['pnl_net', 'pnl_won', 'pnl_lost']] = summary[['pnl_net', 'pnl_won', 'pnl_lost']].fillna(0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary['win_rate'] = np.where(summary['trades_closed'] > 0, summary['won'] / summary['trades_closed'] * 100, np.nan)
+    summary.index.name = 'Ticker'
+    return summary
@@ -0,0 +1,203 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+import tracing
+from data_provider import YFinanceProvider, market_of, normalize_bars, panel_to_frames, safe_name
+
+# Root of the local OHLCV cache: data_cache/bars/{market}/{ticker}.parquet
+CACHE_ROOT = 'data_cache/bars'
+
+# Default freshness window (seconds); a ticker refreshed more recently than this is served from disk
+DEFAULT_MAX_AGE = 3600
+
+# Bars are split/dividend adjusted (yfinance auto_adjust). When a re-fetched completed bar
+# differs from the stored copy by more than this relative amount, the adjustment basis has
+# changed since the history was stored and the whole covered range is downloaded again.
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+def bar_path(ticker, root=CACHE_ROOT):
+    return os.path.join(root, market_of(ticker), f"{safe_name(ticker)}.parquet")
+
+
+def meta_path(ticker, root=CACHE_ROOT):
+    return os.path.join(root, market_of(ticker), f"{safe_name(ticker)}.meta.json")
+
+
+def _read_meta(ticker, root):
+    path = meta_path(ticker, root)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_meta(ticker, meta, root):
+    path = meta_path(ticker, root)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+# Load the stored bars of a ticker (empty frame when nothing is cached yet)
+def load_bars(ticker, start=None, end=None, root=CACHE_ROOT):
+    path = bar_path(ticker, root)
+    if not os.path.exists(path):
+        return normalize_bars(None)
+    df = pd.read_parquet(path)
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df
+
+
+def save_bars(ticker, df, root=CACHE_ROOT):
+    path = bar_path(ticker, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+    tracing.count('bytes_written', os.path.getsize(path), ticker)
+
+
+# Merge newly fetched bars into the stored ones; fresh rows win on overlapping dates
+def merge_bars(stored, fresh):
+    if stored.empty:
+        return fresh
+    if fresh.empty:
+        return stored
+    df = pd.concat([stored, fresh])
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+# Work out which date ranges a ticker is missing.
+# Returns a list of (start, end) ranges to fetch; end=None means "up to today".
+# Only bars from the second-to-last stored date onwards are fetched: the last bar is
+# re-fetched because it may have been an intraday snapshot, the one before it is a completed
+# bar compared with the stored copy by _adjustment_changed. History before the first stored
+# date is back-filled once when an earlier start is requested.
+def _missing_ranges(ticker, start, max_age, root):
+    stored = load_bars(ticker, root=root)
+    meta = _read_meta(ticker, root)
+    covered_from = pd.Timestamp(meta['covered_from']) if 'covered_from' in meta else None
+    needs_backfill = covered_from is None or start < covered_from
+
+    if not needs_backfill and time.time() - meta.get('refreshed_at', 0) < max_age:
+        return stored, meta, []
+    if stored.empty:
+        return stored, meta, [(start, None)]
+    ranges = [(stored.index[max(len(stored) - 2, 0)], None)]
+    if needs_backfill and start < stored.index[0]:
+        ranges.append((start, stored.index[0]))
+    return stored, meta, ranges
+
+
+# True when the completed bars fetched again (all overlapping dates except the last stored
+# one) no longer match the stored closes, i.e. a split or dividend re-adjusted the history
+def _adjustment_changed(stored, fresh):
+    overlap = stored.index[:-1].intersection(fresh.index)
+    if overlap.empty:
+        return False
+    old = stored.loc[overlap, 'Close']
+    new = fresh.loc[overlap, 'Close']
+    return bool(((new - old).abs() > ADJUSTMENT_TOLERANCE * old.abs()).any())
+
+
+# Fetch each (start, end) range for its group of tickers; returns ({ticker: [frames]}, errors)
+def _fetch_groups(provider, groups):
+    fetched = {}
+    errors = {}
+    for (range_start, range_end), group in groups.items():
+        with tracing.span('fetch', tickers=len(group), start=str(range_start)):
+            panel = provider.fetch(group, range_start, range_end)
+        for ticker, df in panel_to_frames(panel).items():
+            fetched.setdefault(ticker, []).append(df)
+            tracing.count('rows_downloaded', len(df), ticker)
+        errors.update(provider.errors)
+    return fetched, errors
+
+
+def _combine(frames):
+    fresh = frames[0]
+    for df in frames[1:]:
+        fresh = merge_bars(fresh, df)
+    return fresh
+
+
+def _store_merged(ticker, start, stored, meta, fresh, root):
+    df = merge_bars(stored, fresh)
+    if not df.empty:
+        save_bars(ticker, df, root)
+        covered_from = pd.Timestamp(meta['covered_from']) if 'covered_from' in meta else start
+        meta['covered_from'] = str(min(start, covered_from))
+        meta['refreshed_at'] = time.time()
+        _write_meta(ticker, meta, root)
+    return df
+
+
+# Bring the cached history of a ticker up to date and return all stored bars
+def refresh_bars(ticker, start, max_age=DEFAULT_MAX_AGE, root=CACHE_ROOT, provider=None):
+    return refresh_many([ticker], start, max_age=max_age, root=root, provider=provider)[0].get(
+        ticker, normalize_bars(None))
+
+
+# Batched refresh of a whole universe.
+# Tickers needing the same date range are fetched together in one provider call, so a
+# daily run with every ticker last updated yesterday costs one batched delta request.
+# Tickers whose history was re-adjusted since it was stored are downloaded again in full
+# (again batched by range) and replace the stored bars.
+# Returns ({ticker: bars}, {ticker: error}).
+def refresh_many(tickers, start, max_age=DEFAULT_MAX_AGE, root=CACHE_ROOT, provider=None):
+    provider = provider or YFinanceProvider()
+    start = pd.Timestamp(start).normalize()
+    state = {}
+    groups = {}
+    for ticker in dict.fromkeys(tickers):
+        stored, meta, ranges = _missing_ranges(ticker, start, max_age, root)
+        state[ticker] = (stored, meta)
+        tracing.count('cache_misses' if ranges else 'cache_hits', 1, ticker)
+        for fetch_range in ranges:
+            groups.setdefault(fetch_range, []).append(ticker)
+
+    fetched, errors = _fetch_groups(provider, groups)
+
+    bars = {}
+    rebase = {}
+    for ticker, (stored, meta) in state.items():
+        if ticker not in fetched:
+            bars[ticker] = stored
+            continue
+        fresh = _combine(fetched[ticker])
+        if _adjustment_changed(stored, fresh):
+            covered_from = pd.Timestamp(meta['covered_from']) if 'covered_from' in meta else start
+            rebase.setdefault((min(start, covered_from, stored.index[0]), None), []).append(ticker)
+            continue
+        bars[ticker] = _store_merged(ticker, start, stored, meta, fresh, root)
+
+    if rebase:
+        refetched, rebase_errors = _fetch_groups(provider, rebase)
+        errors.update(rebase_errors)
+        for group in rebase.values():
+            for ticker in group:
+                stored, meta = state[ticker]
+                if ticker not in refetched:
+                    bars[ticker] = stored
+                    continue
+                tracing.count('history_readjusted', 1, ticker)
+                bars[ticker] = _store_merged(ticker, start, normalize_bars(None), meta,
+                                             _combine(refetched[ticker]), root)
+    return bars, errors
+
+
+# Cached replacement for yf.download(ticker, start=..., end=...)
+def get_bars(ticker, start, end=None, max_age=DEFAULT_MAX_AGE, root=CACHE_ROOT, provider=None):
+    df = refresh_bars(ticker, start, max_age=max_age, root=root, provider=provider)
+    df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import logging
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import tracing
+
+
+# Worker initializer: charts are only written to disk, never shown. Workers log at the
+# parent's level and start with an empty tracer (a forked worker would otherwise inherit
+# and send back the parent's events).
+def _init_worker(log_level=logging.WARNING, trace=False):
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    logging.getLogger().setLevel(log_level)
+    tracing.disable()
+    if trace:
+        tracing.enable()
+
+
+# Run one job, capturing its console and log output so it can be reported in the summary.
+# collect: return the job's trace events to the parent process (pool workers only)
+def _run_job(func, args, collect=False):
+    buffer = io.StringIO()
+    handler = logging.StreamHandler(buffer)
+    handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        with contextlib.redirect_stdout(buffer):
+            result = func(*args)
+        error = None if result is not None else 'No result returned'
+    except Exception:
+        result, error = None, traceback.format_exc(limit=3)
+    finally:
+        root.removeHandler(handler)
+    return result, error, buffer.getvalue(), tracing.drain() if collect else None
+
+
+# Fan func(*args) out over a process pool.
+# jobs is a list of (key, args); duplicate keys are run once. A job fails when it
+# raises or returns None. Returns (results, failures) where results maps key ->
+# return value in job order and failures maps key -> (error, captured output).
+# on_done(key, result, error) is called in the parent as each job finishes, so callers can
+# checkpoint progress before the whole batch is done. mp_context picks the start method
+# (e.g. multiprocessing.get_context('spawn') from a multi-threaded GUI process).
+def run_batch(func, jobs, max_workers=None, on_done=None, mp_context=None):
+    jobs = list(dict(jobs).items())
+    max_workers = max_workers or os.cpu_count() or 1
+    outcomes = {}
+
+    def finish(key, outcome):
+        outcomes[key] = outcome
+        tracing.merge(outcome[3])
+        if on_done is not None:
+            on_done(key, outcome[0], outcome[1])
+
+    if max_workers == 1 or len(jobs) <= 1:
+        for key, args in jobs:
+            finish(key, _run_job(func, args))
+    else:
+        trace = tracing.is_enabled()
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=(logging.getLogger().getEffectiveLevel(), trace)) as pool:
+            futures = {pool.submit(_run_job, func, args, trace): key for key, args in jobs}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    results = {}
+    failures = {}
+    for key, _ in jobs:
+        result, error, output, _ = outcomes[key]
+        if error is None:
+            results[key] = result
+        else:
+            failures[key] = (error, output)
+    return results, failures
+
+
+def print_summary(title, results, failures):
+    print(f"{title}: {len(results)} succeeded, {len(failures)} failed")
+    for key, (error, output) in failures.items():
+        reason = output.strip().splitlines()[-1] if output.strip() else error.strip().splitlines()[-1]
+        print(f"  {key}: {reason}")
@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')  # charts are only written to disk, never shown
+import numpy as np
+import pandas as pd
+
+import enhanced_us_stock
+import trend
+import us_stock
+from correlation_engine import RollingCorrelation, return_panel
+from indicator_engine import (ADVANCED_SPECS, TECHNICAL_SPECS, TREND_SPECS, build_panel, compute_indicators,
+                              ticker_frame)
+import tracing
+from return_stats import stats_for_frames
+
+BENCHMARK_ROOT = 'data_cache/benchmarks'
+BASELINE_PATH = os.path.join(BENCHMARK_ROOT, 'baseline.json')
+
+TRADING_DAYS = 252
+
+# Settings that change the amount of work; runs are only compared when these match
+CONFIG_KEYS = ['tickers', 'years', 'gap_rate', 'nan_rate', 'seed', 'plot_tickers', 'model_tickers']
+
+
+# Deterministic OHLCV frames shaped like bar_store output: a geometric random walk per ticker,
+# a share of tickers listed part-way through the range, missing sessions (gap_rate of rows
+# dropped) and missing values (nan_rate of cells blanked)
+def synthetic_frames(n_tickers=50, years=5, gap_rate=0.01, nan_rate=0.001, seed=0, end='2024-12-31'):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=int(years * TRADING_DAYS), name='Date')
+    frames = {}
+    for i in range(n_tickers):
+        start = int(rng.integers(0, len(dates) // 2)) if rng.random() < 0.2 else 0
+        index = dates[start:]
+        n = len(index)
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+        open_ = close * (1 + rng.normal(0, 0.005, n))
+        high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.015, n))
+        low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.015, n))
+        volume = rng.integers(100_000, 10_000_000, n).astype(np.float64)
+        df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Adj Close': close,
+                           'Volume': volume}, index=index)
+        df = df[rng.random(n) >= gap_rate]
+        frames[f"SYN{i:04d}"] = df.mask(rng.random(df.shape) < nan_rate)
+    return frames
+
+
+# Run inside a scratch directory (the scripts write to relative results_* paths)
+@contextlib.contextmanager
+def _workdir(path):
+    previous = os.getcwd()
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def _stock_analysis():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock_predict'))
+    import stock_analysis
+    return stock_analysis
+
+
+# Stages: name -> (setup, run, items). setup() is untimed and builds the input of one
+# repetition (fresh copies, since several stage functions modify their input); run(input)
+# is what gets timed.
+def build_stages(frames, plot_tickers=3, model_tickers=3):
+    filled = {ticker: df.ffill().bfill() for ticker, df in frames.items()}
+    technical = {t: _quiet(us_stock.calculate_technical_indicators, df.copy()) for t, df in filled.items()}
+    advanced = {t: _quiet(enhanced_us_stock.calculate_advanced_indicators, df) for t, df in filled.items()}
+    plotted = list(filled)[:plot_tickers]
+    trend_result = trend.calculate_universe_indicators({t: filled[t] for t in plotted})
+    trends = {t: ticker_frame(trend_result, t) for t in plotted}
+    modelled = list(filled)[:model_tickers]
+
+    def copies(source, tickers=None):
+        return lambda: {t: source[t].copy() for t in (tickers or source)}
+
+    def each(func):
+        return lambda data: {t: _quiet(func, df) for t, df in data.items()}
+
+    def plot_technical(data):
+        for ticker, df in data.items():
+            _quiet(us_stock.plot_technical_indicators, ticker, df, 'benchmark')
+
+    def plot_advanced(data):
+        for ticker, df in data.items():
+            _quiet(enhanced_us_stock.plot_advanced_indicators, ticker, df, 'benchmark')
+
+    def plot_candlestick(data):
+        for ticker, df in data.items():
+            _quiet(trend.plot_candlestick_chart, df, ticker, 'benchmark')
+
+    def write_csv(data):
+        for ticker, (tech, adv) in data.items():
+            output_dir = f'results_stock_analysis/benchmark/{ticker}'
+            os.makedirs(output_dir, exist_ok=True)
+            tech[[c for c in tech.columns if c not in ('Open', 'High', 'Low', 'Adj Close')]].to_csv(
+                f'{output_dir}/technical_indicators_and_volume.csv')
+            adv.to_csv(f'{output_dir}/{ticker}_advanced_indicators.csv', index=True)
+
+    # Importing stock_analysis (yfinance, sklearn, textblob) happens in setup, outside the timing
+    def train_setup():
+        _stock_analysis()
+        return copies(filled, modelled)()
+
+    def train(data):
+        stock_analysis = _stock_analysis()
+        for df in data.values():
+            X, y = stock_analysis.prepare_features(stock_analysis.calculate_technical_indicators(df).dropna())
+            stock_analysis.train_model(X, y)
+
+    def universe(data):
+        return compute_indicators(build_panel(data), TECHNICAL_SPECS + ADVANCED_SPECS + TREND_SPECS)
+
+    # Daily correlation refresh: the window up to the previous day is restored in setup,
+    # the timed part folds in the last day and derives both matrices
+    returns = return_panel(filled)
+
+    def correlation_setup():
+        return RollingCorrelation.from_returns(returns.iloc[:-1])
+
+    def correlation_update(engine):
+        engine.update(returns.index[-1], returns.iloc[-1])
+        return engine.correlation(), engine.covariance()
+
+    # The whole chain on one copy of the raw frames, with the same chart/model subsets as above
+    def end_to_end(data):
+        cleaned = {t: _quiet(trend.clean_stock_data, df.ffill().bfill()) for t, df in data.items()}
+        formatted = {t: _quiet(enhanced_us_stock.format_data, df) for t, df in cleaned.items()}
+        result = universe(formatted)
+        frames_out = {t: ticker_frame(result, t) for t in formatted}
+        write_csv({t: (df, df) for t, df in frames_out.items()})  # one frame holds both indicator sets
+        plot_technical({t: frames_out[t] for t in plotted})
+        plot_advanced({t: frames_out[t] for t in plotted})
+        plot_candlestick({t: frames_out[t] for t in plotted})
+        train({t: formatted[t] for t in modelled})
+        return stats_for_frames(formatted)
+
+    return {
+        'clean_stock_data': (copies(frames), each(trend.clean_stock_data), len(frames)),
+        'format_data': (copies(filled), each(enhanced_us_stock.format_data), len(filled)),
+        'technical_indicators': (copies(filled), each(us_stock.calculate_technical_indicators), len(filled)),
+        'advanced_indicators': (copies(filled), each(enhanced_us_stock.calculate_advanced_indicators), len(filled)),
+        'universe_indicators': (lambda: filled, universe, len(filled)),
+        'plot_technical': (copies(technical, plotted), plot_technical, len(plotted)),
+        'plot_advanced': (copies(advanced, plotted), plot_advanced, len(plotted)),
+        'plot_candlestick': (lambda: trends, plot_candlestick, len(plotted)),
+        'write_csv': (lambda: {t: (technical[t], advanced[t]) for t in filled}, write_csv, len(filled)),
+        'train_model': (train_setup, train, len(modelled)),
+        'return_stats': (lambda: filled, stats_for_frames, len(filled)),
+        'rolling_correlation': (correlation_setup, correlation_update, len(filled)),
+        'end_to_end': (copies(frames), end_to_end, len(frames)),
+    }
+
+
+# Best and median wall time of `repeat` runs of every selected stage
+def run_benchmarks(frames, stages=None, repeat=3, plot_tickers=3, model_tickers=3, workdir=None):
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as scratch:
+        workdir = workdir or scratch
+        with _workdir(workdir):
+            table = build_stages(frames, plot_tickers, model_tickers)
+            selected = stages or list(table)
+            unknown = set(selected) - set(table)
+            if unknown:
+                raise KeyError(f"Unknown stages: {sorted(unknown)}")
+            results = {}
+            for name in selected:
+                setup, run, items = table[name]
+                times = []
+                for _ in range(repeat):
+                    data = setup()
+                    started = time.perf_counter()
+                    run(data)
+                    times.append(time.perf_counter() - started)
+                best = min(times)
+                results[name] = {'best': best, 'median': float(np.median(times)), 'runs': times, 'items': items,
+                                 'per_item_ms': best / items * 1000 if items else 0.0}
+                print(f"{name:<22} best {best:8.3f}s  median {results[name]['median']:8.3f}s  ({items} items)")
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Stages whose best time grew by more than threshold (a ratio, 0.25 = 25%) and by more than
+# min_delta seconds over the baseline; the absolute floor keeps millisecond stages from
+# failing on timer noise
+def compare_reports(report, baseline, threshold=0.25, min_delta=0.05):
+    rows = []
+    for name, current in report['stages'].items():
+        before = baseline['stages'].get(name)
+        if before is None:
+            continue
+        ratio = current['best'] / before['best'] if before['best'] > 0 else float('inf')
+        regressed = ratio > 1 + threshold and current['best'] - before['best'] > min_delta
+        rows.append({'stage': name, 'baseline': before['best'], 'current': current['best'], 'ratio': ratio,
+                     'regressed': regressed})
+    return pd.DataFrame(rows, columns=['stage', 'baseline', 'current', 'ratio', 'regressed']).set_index('stage')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmark of every pipeline stage on synthetic data')
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--gap-rate', type=float, default=0.01, help='share of sessions dropped per ticker')
+    parser.add_argument('--nan-rate', type=float, default=0.001, help='share of OHLCV cells set to NaN')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--plot-tickers', type=int, default=3, help='tickers charted by the plot stages')
+    parser.add_argument('--model-tickers', type=int, default=3, help='tickers trained by the model stage')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='+', help='subset of stages to run (default: all)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--output', help='also write this run to a JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown ratio per stage')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='ignore slowdowns below this many seconds')
+    args = parser.parse_args(argv)
+    tracing.configure_logging('ERROR')  # the stages' warnings about synthetic gaps are expected
+
+    config = {'tickers': args.tickers, 'years': args.years, 'gap_rate': args.gap_rate, 'nan_rate': args.nan_rate,
+              'seed': args.seed, 'plot_tickers': args.plot_tickers, 'model_tickers': args.model_tickers,
+              'repeat': args.repeat}
+    baseline_path = os.path.abspath(args.baseline)
+    frames = synthetic_frames(args.tickers, args.years, args.gap_rate, args.nan_rate, args.seed)
+    print(f"Synthetic data: {len(frames)} tickers, {sum(len(df) for df in frames.values())} rows")
+    report = {
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'config': config,
+        'environment': environment(),
+        'stages': run_benchmarks(frames, args.stages, args.repeat, args.plot_tickers, args.model_tickers),
+    }
+    if args.output:
+        save_report(report, args.output)
+    if args.save_baseline:
+        save_report(report, baseline_path)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline first")
+        return 0
+
+    baseline = load_report(baseline_path)
+    mismatched = [key for key in CONFIG_KEYS if baseline['config'].get(key) != config[key]]
+    if mismatched:
+        print(f"Baseline was recorded with different settings ({', '.join(mismatched)}); not comparing")
+        return 2
+    if baseline.get('environment') != report['environment']:
+        print("Warning: baseline was recorded on a different environment")
+    comparison = compare_reports(report, baseline, args.threshold, args.min_delta)
+    print(comparison.to_string(float_format=lambda x: f"{x:.3f}"))
+    regressed = comparison.index[comparison['regressed']].tolist()
+    if regressed:
+        print(f"Regressions over {args.threshold:.0%}: {', '.join(regressed)}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import squareform
+from sklearn.cluster import KMeans
+
+import tracing
+from bar_store import load_bars, refresh_many
+from data_provider import market_of
+from indicator_engine import TECHNICAL_SPECS, build_panel, compute_indicators
+from results_dataset import DATASET_ROOT
+from run_manifest import last_trading_day
+from ticker_registry import get_universe
+
+logger = logging.getLogger(__name__)
+
+# {CORRELATION_ROOT}/{name}/state.npz holds the rolling window, so the next day's run only
+# folds in the new rows; {name}/as_of=YYYY-MM-DD/ holds that day's matrices and clusters
+CORRELATION_ROOT = os.path.join(DATASET_ROOT, 'correlation')
+
+DEFAULT_WINDOW = 60
+
+# The indicator columns of stock_influences.csv that can be derived from bars
+INFLUENCE_FIELDS = ['MA10', 'MA20', 'RSI', 'MACD', 'MACD_signal', 'Upper_BB', 'Middle_BB', 'Lower_BB', 'ATR', 'ADX']
+
+# Price-level columns, divided by Close so features are comparable across tickers
+PRICE_LEVEL_FIELDS = ['MA10', 'MA20', 'MACD', 'MACD_signal', 'Upper_BB', 'Middle_BB', 'Lower_BB', 'ATR']
+
+
+# Daily returns of a (dates x tickers) close panel. Each ticker's return is taken against its
+# own previous close, so a missing day (holiday, late listing, the other market's calendar)
+# does not break the series; rows where a ticker has no close stay NaN.
+def return_panel(frames):
+    panel = build_panel(frames, ['Close'])
+    close = panel['Close']
+    valid = ~np.isnan(close)
+    rows = np.where(valid, np.arange(len(close))[:, None], -1)
+    last_valid = np.maximum.accumulate(rows, axis=0)
+    previous = np.full(close.shape, np.nan)
+    has_previous = last_valid[:-1] >= 0
+    previous[1:][has_previous] = close[last_valid[:-1][has_previous], np.nonzero(has_previous)[1]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.where(valid, close / previous - 1, np.nan)
+    return pd.DataFrame(returns, index=pd.DatetimeIndex(panel['dates'], name='Date'),
+                        columns=pd.Index(panel['tickers'], name='Ticker'))
+
+
+class RollingCorrelation:
+    """Rolling covariance and correlation of a return panel over the last `window` days.
+
+    The window's rows are kept together with their pairwise sums (pair counts, sums,
+    sums of squares and cross products over the rows where both tickers have a return),
+    so a new day is one rank-one add and one rank-one remove, O(n^2), instead of
+    recomputing the whole window. Pairs use the rows both tickers have, like
+    DataFrame.corr(min_periods=...). The sums are rebuilt from the rows every
+    `rebuild_every` updates to shed floating-point drift.
+    """
+
+    def __init__(self, tickers, window=DEFAULT_WINDOW, min_periods=None, rebuild_every=250):
+        self.tickers = list(tickers)
+        self.window = window
+        self.min_periods = min_periods or max(window // 2, 2)
+        self.rebuild_every = rebuild_every
+        self.rows = np.full((window, len(self.tickers)), np.nan)
+        self.dates = np.full(window, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.position = 0
+        self.updates = 0
+        self._rebuild()
+
+    @classmethod
+    def from_returns(cls, returns, window=DEFAULT_WINDOW, **kwargs):
+        engine = cls(returns.columns, window, **kwargs)
+        tail = returns.iloc[-window:]
+        engine.rows[:len(tail)] = tail.to_numpy(dtype=np.float64)
+        engine.dates[:len(tail)] = tail.index.values
+        engine.position = len(tail) % window
+        engine._rebuild()
+        return engine
+
+    @property
+    def last_date(self):
+        dates = self.dates[~np.isnat(self.dates)]
+        return pd.Timestamp(dates.max()) if len(dates) else None
+
+    def _rebuild(self):
+        valid = (~np.isnan(self.rows)).astype(np.float64)
+        x = np.nan_to_num(self.rows)
+        self.count = valid.T @ valid
+        self.sum = x.T @ valid
+        self.sumsq = (x * x).T @ valid
+        self.cross = x.T @ x
+
+    # Rank-one add (sign=1) or remove (sign=-1) of one row; a missing return contributes
+    # zero to every sum and to the pair counts, so whole-matrix outer products handle gaps
+    def _apply(self, row, sign):
+        valid = ~np.isnan(row)
+        if not valid.any():
+            return
+        mask = valid.astype(np.float64)
+        x = np.where(valid, row, 0.0)
+        signed = sign * x
+        self.count += np.outer(sign * mask, mask)
+        self.sum += np.outer(signed, mask)
+        self.sumsq += np.outer(signed * x, mask)
+        self.cross += np.outer(signed, x)
+
+    # Add one day of returns (a Series or dict by ticker, or an array in ticker order);
+    # tickers outside the engine's universe are ignored, missing ones count as no return
+    def update(self, date, returns):
+        if isinstance(returns, (pd.Series, dict)):
+            returns = pd.Series(returns, dtype=np.float64).reindex(self.tickers).to_numpy()
+        row = np.asarray(returns, dtype=np.float64)
+        self._apply(self.rows[self.position], -1.0)
+        self.rows[self.position] = row
+        self.dates[self.position] = np.datetime64(pd.Timestamp(date), 'ns')
+        self.position = (self.position + 1) % self.window
+        self.updates += 1
+        if self.updates % self.rebuild_every == 0:
+            self._rebuild()
+        else:
+            self._apply(row, 1.0)
+
+    # Fold in every row of a return panel newer than the last date already in the window
+    def extend(self, returns):
+        last = self.last_date
+        new = returns if last is None else returns[returns.index > last]
+        values = new.reindex(columns=self.tickers).to_numpy(dtype=np.float64)
+        for date, row in zip(new.index, values):
+            self.update(date, row)
+        return len(new)
+
+    def _frame(self, values):
+        with np.errstate(invalid='ignore'):
+            values[self.count < self.min_periods] = np.nan
+        return pd.DataFrame(values, index=pd.Index(self.tickers, name='Ticker'),
+                            columns=pd.Index(self.tickers, name='Ticker'))
+
+    def covariance(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = (self.cross - self.sum * self.sum.T / self.count) / (self.count - 1)
+        return self._frame(values)
+
+    def correlation(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            spread = np.maximum(self.count * self.sumsq - self.sum ** 2, 0.0)
+            values = (self.count * self.cross - self.sum * self.sum.T) / np.sqrt(spread * spread.T)
+        return self._frame(np.clip(values, -1.0, 1.0))
+
+    # Only the window's rows are stored; the pairwise sums are rebuilt on load
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            np.savez(f, rows=self.rows, dates=self.dates, position=self.position, tickers=np.array(self.tickers),
+                     params=np.array([self.window, self.min_periods, self.rebuild_every]))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            window, min_periods, rebuild_every = (int(v) for v in data['params'])
+            engine = cls(data['tickers'].tolist(), window, min_periods, rebuild_every)
+            engine.rows[:] = data['rows']
+            engine.dates[:] = data['dates']
+            engine.position = int(data['position'])
+        engine._rebuild()
+        return engine
+
+
+def state_path(name, root=CORRELATION_ROOT):
+    return os.path.join(root, name, 'state.npz')
+
+
+# Write one day's matrices as float32 .npy (np.load(..., mmap_mode='r') reads single rows
+# without loading the whole matrix) plus the ticker order they are indexed by
+@tracing.traced('write')
+def write_matrices(name, engine, as_of=None, root=CORRELATION_ROOT):
+    as_of = str(pd.Timestamp(as_of or engine.last_date).date())
+    out_dir = os.path.join(root, name, f"as_of={as_of}")
+    os.makedirs(out_dir, exist_ok=True)
+    for kind, frame in (('correlation', engine.correlation()), ('covariance', engine.covariance())):
+        path = os.path.join(out_dir, f"{kind}.npy")
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, frame.to_numpy(dtype=np.float32))
+        os.replace(f"{path}.tmp", path)
+    with open(os.path.join(out_dir, 'tickers.json'), 'w', encoding='utf-8') as f:
+        json.dump(engine.tickers, f)
+    return out_dir
+
+
+def list_as_of(name, root=CORRELATION_ROOT):
+    base = os.path.join(root, name)
+    if not os.path.isdir(base):
+        return []
+    return sorted(entry.split('=', 1)[1] for entry in os.listdir(base) if entry.startswith('as_of='))
+
+
+# Read a stored matrix back as a DataFrame (the latest day by default); mmap keeps it on disk
+def read_matrix(name, kind='correlation', as_of=None, mmap=False, root=CORRELATION_ROOT):
+    dates = list_as_of(name, root)
+    if not dates:
+        raise FileNotFoundError(f"No {kind} matrices stored for {name}")
+    out_dir = os.path.join(root, name, f"as_of={as_of or dates[-1]}")
+    with open(os.path.join(out_dir, 'tickers.json'), encoding='utf-8') as f:
+        tickers = pd.Index(json.load(f), name='Ticker')
+    values = np.load(os.path.join(out_dir, f"{kind}.npy"), mmap_mode='r' if mmap else None)
+    return pd.DataFrame(values, index=tickers, columns=tickers, copy=False)
+
+
+# Per-ticker features for clustering: the stock_influences.csv indicator columns at each
+# ticker's latest bar, with price-level columns divided by Close
+def indicator_features(indicators, fields=INFLUENCE_FIELDS):
+    rows = {}
+    for ticker in indicators.columns.get_level_values('Ticker').unique():
+        df = indicators[ticker]
+        df = df[df['Close'].notna()]
+        if df.empty:
+            continue
+        last = df.iloc[-1]
+        rows[ticker] = [last[f] / last['Close'] if f in PRICE_LEVEL_FIELDS else last[f] for f in fields]
+    return pd.DataFrame.from_dict(rows, orient='index', columns=fields).rename_axis('Ticker')
+
+
+# Cluster tickers on a feature table (indicator_features, or stock_influences.csv read with
+# index_col=0). Columns are z-scored and missing values set to the column mean.
+# method: 'kmeans' or 'hierarchical' (Ward linkage). Returns labels 0..n_clusters-1 by ticker.
+def cluster_features(features, n_clusters=5, method='kmeans', seed=0):
+    values = features.to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    values = np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+    n_clusters = min(n_clusters, len(values))
+    if method == 'kmeans':
+        labels = KMeans(n_clusters=n_clusters, n_init=10, random_state=seed).fit_predict(values)
+    elif method == 'hierarchical':
+        labels = hierarchy.fcluster(hierarchy.linkage(values, 'ward'), n_clusters, 'maxclust') - 1
+    else:
+        raise ValueError(f"Unknown clustering method: {method}")
+    return pd.Series(labels, index=features.index, name='cluster')
+
+
+# Hierarchical clustering on a correlation matrix with distance sqrt((1 - corr) / 2);
+# tickers without enough overlapping history are left out
+def cluster_correlation(corr, n_clusters=5, method='average'):
+    corr = corr.dropna(how='all').dropna(axis=1, how='all')
+    distance = np.sqrt(np.clip((1.0 - corr.fillna(0.0).to_numpy()) / 2.0, 0.0, 1.0))
+    np.fill_diagonal(distance, 0.0)
+    linkage = hierarchy.linkage(squareform(distance, checks=False), method)
+    labels = hierarchy.fcluster(linkage, min(n_clusters, len(corr)), 'maxclust') - 1
+    return pd.Series(labels, index=corr.index, name='cluster')
+
+
+# Daily job: fold the new days of the universe's returns into the stored rolling window
+# (a full rebuild only when there is no state yet, the universe or window changed, or
+# rebuild=True), then write the matrices and the cluster assignments.
+# Rows after the last completed session of any of the universe's markets may hold intraday
+# partial closes; the window only ever appends, so they are left for the next run.
+def update_universe(name, tickers, window=DEFAULT_WINDOW, n_clusters=8, method='kmeans', start='2024-01-01',
+                    rebuild=False, root=CORRELATION_ROOT):
+    _, errors = refresh_many(tickers, start)
+    for ticker, error in errors.items():
+        logger.warning("Download failed for %s: %s", ticker, error)
+    frames = {}
+    for ticker in tickers:
+        with tracing.span('load', ticker):
+            df = load_bars(ticker, start)
+        if not df.empty:
+            frames[ticker] = df
+
+    with tracing.span('returns'):
+        returns = return_panel(frames)
+        completed = min(last_trading_day(market) for market in {market_of(ticker) for ticker in frames})
+        returns = returns[returns.index <= pd.Timestamp(completed)]
+    path = state_path(name, root)
+    engine = RollingCorrelation.load(path) if os.path.exists(path) and not rebuild else None
+    if engine is None or engine.tickers != list(returns.columns) or engine.window != window:
+        with tracing.span('correlation', rows=min(window, len(returns))):
+            engine = RollingCorrelation.from_returns(returns, window)
+        logger.info("Built the %d-day window for %d tickers", window, len(engine.tickers))
+    else:
+        with tracing.span('correlation'):
+            added = engine.extend(returns)
+        logger.info("Added %d new days to the rolling window", added)
+    engine.save(path)
+    out_dir = write_matrices(name, engine, root=root)
+
+    with tracing.span('cluster'):
+        features = indicator_features(compute_indicators(build_panel(frames), TECHNICAL_SPECS))
+        clusters = pd.DataFrame({'feature_cluster': cluster_features(features, n_clusters, method),
+                                 'correlation_cluster': cluster_correlation(engine.correlation(), n_clusters)})
+    features.join(clusters).to_csv(os.path.join(out_dir, 'clusters.csv'))
+    logger.info("Correlation matrices and clusters written to %s", out_dir)
+    return engine, clusters
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Rolling correlation/covariance matrices and ticker clusters')
+    parser.add_argument('--universe', nargs='+', default=['us'], help='ticker_registry subsets (default: us)')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='rolling window in trading days')
+    parser.add_argument('--clusters', type=int, default=8, help='number of clusters')
+    parser.add_argument('--method', choices=['kmeans', 'hierarchical'], default='kmeans')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the window instead of updating it')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    with tracing.session('correlation_engine'):
+        update_universe('_'.join(args.universe), get_universe(*args.universe), args.window, args.clusters,
+                        args.method, rebuild=args.rebuild)
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+# Market partition of a ticker (TW for .TW/.TWO listings, US otherwise)
+def market_of(ticker):
+    return 'TW' if ticker.upper().endswith(('.TW', '.TWO')) else 'US'
+
+
+# Regular trading session per market: (timezone, open, close), Monday to Friday.
+# Exchange holidays are not modelled; a holiday just looks like a quiet session.
+MARKET_HOURS = {
+    'TW': ('Asia/Taipei', '09:00', '13:30'),
+    'US': ('America/New_York', '09:30', '16:00'),
+}
+
+
+def _session(market, now):
+    zone, open_at, close_at = MARKET_HOURS[market]
+    local = (pd.Timestamp(now) if now is not None else pd.Timestamp.now(tz='UTC'))
+    local = (local.tz_localize('UTC') if local.tzinfo is None else local).tz_convert(zone)
+    day = local.normalize()
+    return local, day + pd.Timedelta(open_at + ':00'), day + pd.Timedelta(close_at + ':00')
+
+
+def is_market_open(market, now=None):
+    local, open_time, close_time = _session(market, now)
+    return local.weekday() < 5 and open_time <= local < close_time
+
+
+# Most recent session close at or before now (UTC), i.e. when the last final bar was printed
+def last_close(market, now=None):
+    local, _, close_time = _session(market, now)
+    if local < close_time:
+        close_time -= pd.Timedelta(days=1)
+    while close_time.weekday() >= 5:
+        close_time -= pd.Timedelta(days=1)
+    return close_time.tz_convert('UTC')
+
+
+# File-system safe name for a ticker (e.g. BRK/B -> BRK-B)
+def safe_name(ticker):
+    return ticker.replace('/', '-')
+
+
+# Flatten a single-ticker download into a plain Date-indexed OHLCV frame
+def normalize_bars(df):
+    if df is None or df.empty:
+        return pd.DataFrame(columns=[c for c in BAR_COLUMNS if c != 'Adj Close'])
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] for col in df.columns]
+    df = df[[c for c in BAR_COLUMNS if c in df.columns]]
+    df.index = pd.to_datetime(df.index, errors='coerce')
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df = df[df.index.notnull()]
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    df.index.name = 'Date'
+    return df.astype('float64')
+
+
+# Split a multi-ticker download into one frame per ticker.
+# yfinance puts the ticker on either column level depending on group_by, so the
+# level is located by looking for the requested symbols instead of by position.
+def split_multi_ticker(data, tickers):
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {tickers[0]: normalize_bars(data)} if len(tickers) == 1 else {}
+    level = 0 if set(tickers) & set(data.columns.get_level_values(0)) else 1
+    present = set(data.columns.get_level_values(level))
+    frames = {}
+    for ticker in tickers:
+        if ticker not in present:
+            continue
+        df = data.xs(ticker, axis=1, level=level).dropna(how='all')
+        if not df.empty:
+            frames[ticker] = normalize_bars(df)
+    return frames
+
+
+# Stack per-ticker frames into one tidy (Ticker, Date) panel
+def frames_to_panel(frames):
+    if not frames:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.MultiIndex.from_tuples([], names=['Ticker', 'Date']))
+    return pd.concat(frames, names=['Ticker', 'Date'])
+
+
+# Inverse of frames_to_panel
+def panel_to_frames(panel):
+    return {ticker: df.droplevel('Ticker') for ticker, df in panel.groupby(level='Ticker', sort=False)}
+
+
+class DataProvider:
+    """Batched OHLCV source: splits the universe into chunks, fetches them with bounded
+    concurrency and retries, and isolates per-ticker failures in ``errors``."""
+
+    def __init__(self, chunk_size=50, max_workers=4, retries=3, backoff=1.0):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.errors = {}
+
+    # Fetch one chunk; returns {ticker: frame}. Subclasses implement this.
+    def fetch_chunk(self, tickers, start, end, interval):
+        raise NotImplementedError
+
+    def _fetch_with_retry(self, tickers, start, end, interval):
+        for attempt in range(self.retries):
+            try:
+                return self.fetch_chunk(tickers, start, end, interval), None
+            except Exception as e:
+                error = e
+                if attempt < self.retries - 1:
+                    time.sleep(self.backoff * 2 ** attempt)
+        return {}, error
+
+    def _fetch_isolated(self, tickers, start, end, interval):
+        frames, error = self._fetch_with_retry(tickers, start, end, interval)
+        if error is not None and len(tickers) > 1:
+            # One bad symbol must not sink the whole chunk: retry its members one by one
+            frames = {}
+            for ticker in tickers:
+                frames.update(self._fetch_isolated([ticker], start, end, interval))
+            return frames
+        if error is not None:
+            self.errors[tickers[0]] = str(error)
+        for ticker in tickers:
+            if ticker not in frames and ticker not in self.errors:
+                self.errors[ticker] = 'No data returned'
+        return frames
+
+    # Download bars for many tickers and return one (Ticker, Date) panel
+    def fetch(self, tickers, start, end=None, interval='1d'):
+        tickers = list(dict.fromkeys(tickers))
+        end = end if end is not None else pd.Timestamp('today') + pd.Timedelta(days=1)
+        chunks = [tickers[i:i + self.chunk_size] for i in range(0, len(tickers), self.chunk_size)]
+        self.errors = {}
+        frames = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for result in pool.map(lambda chunk: self._fetch_isolated(chunk, start, end, interval), chunks):
+                frames.update(result)
+        # Keep the caller's ticker order
+        return frames_to_panel({t: frames[t] for t in tickers if t in frames})
+
+
+# yf.download collects results and errors in module-level state (shared._DFS, _ERRORS),
+# so concurrent calls could mix chunks; every call in the process goes through this lock
+_YF_LOCK = threading.Lock()
+
+
+class YFinanceProvider(DataProvider):
+    """Yahoo Finance provider: one multi-ticker ``yf.download`` call per chunk of tickers.
+
+    The calls are serialized (see _YF_LOCK); the pool threads still overlap the
+    splitting and retry back-off of the chunks.
+    """
+
+    def fetch_chunk(self, tickers, start, end, interval):
+        import yfinance as yf
+
+        with _YF_LOCK:
+            data = yf.download(tickers, start=start, end=end, interval=interval,
+                               group_by='ticker', progress=False, threads=False)
+        if data is None or data.empty:
+            raise ValueError(f"No data returned for {', '.join(tickers)}")
+        return split_multi_ticker(data, tickers)
+
+
+class FileProvider(DataProvider):
+    """Offline provider reading one file per ticker (Parquet or CSV).
+
+    ``pattern`` is formatted with ``market`` and ``ticker``; the default matches the
+    bar_store layout so a warm cache can be replayed without network access.
+    """
+
+    def __init__(self, root, pattern='{market}/{ticker}.parquet', **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+        self.pattern = pattern
+
+    def path_for(self, ticker):
+        return os.path.join(self.root, self.pattern.format(market=market_of(ticker), ticker=safe_name(ticker)))
+
+    def fetch_chunk(self, tickers, start, end, interval):
+        if interval != '1d':
+            raise ValueError(f"FileProvider only serves daily bars, got interval={interval}")
+        frames = {}
+        for ticker in tickers:
+            path = self.path_for(ticker)
+            if not os.path.exists(path):
+                continue
+            if path.endswith('.csv'):
+                df = pd.read_csv(path, index_col=0, parse_dates=True)
+            else:
+                df = pd.read_parquet(path)
+            df = normalize_bars(df)
+            df = df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+            if not df.empty:
+                frames[ticker] = df
+        return frames
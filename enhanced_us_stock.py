@@ -1,36 +1,26 @@
-import yfinance as yf
 import pandas as pd
-import talib
 import matplotlib.pyplot as plt
 import os
+import logging
 import numpy as np
 
-# ETF and Stock Lists
+import tracing
+from artifact_cache import ArtifactManifest
+from batch_runner import print_summary, run_batch
+from bar_store import get_bars, refresh_many
+from indicator_engine import ADVANCED_SPECS, build_panel, compute_frame, compute_indicators, ticker_frame
+from results_dataset import write_results
+from run_manifest import RunManifest, checkpoint, merge_shards, run_arguments, shard_lists
+from ticker_registry import get_universe
+
+logger = logging.getLogger(__name__)
+
+# ETF and Stock Lists (maintained in ticker_registry, normalized and deduplicated)
 def get_us_etf_tickers():
-    return [
-        "QQQ",  "QQQM", "VOO", "VTI", "SPY", "IVV", "DIA",
-        "VT", "VXUS", "VUG", "VO", "XLF", "BND", "VWO",  "DIAU", "QQQX"
-    ]
+    return get_universe('us_etfs')
 
 def get_us_stock_tickers():
-    return [
-        "TSLA", "AAPL", "AMZN", "AMD", "NKE", "V", "TSM", "INTC",
-        "MSFT", "ADBE", "GOOG", "MU", "NVDA", "MCD", "SMCI", "BE",
-        "PLUG", "APD", "FCEL", "BLDP", "KO", "PLTR", "SOUN", "META",
-        "CFLT", "AVGO", "QCOM", "IBKR", "LULU", "DDOG", "ZS", "MDB",
-        "NFLX", "ORLY", "BKNG", "ASML", "INTU", "TPL", "URI", "UNH",
-        "ASX",
-        # US_industry
-        "DJCO", "PLBY", "ORCL", "PFE", "MRK", "TPR", "RH", "MSTR",
-        "PGR", "TER", "MRVL", "ANET", "LW", "CLS", "CIEN", "INTU",
-        "IBM", "BRK/B", "MELI", "COIN", "CRWD", "FICO", "NOW",
-        "HUBS", "IT", "MA", "ROP", "MPWR", "KLAC", "TYL", "MTD",
-        "LLY", "REGN", "GHC", "MUSA", "CVCO", "MSCI", "GS", "AMP",
-        "LNG", "PNRG", "TRGP", "PH", "LII", "SPOT", "CHTR", "MLM",
-        "NEU", "LIN", "COST", "CASY", "SAM", "EQIX", "PSA", "ESS",
-        "CEG", "VST", "ATO", "QUBT", "TNXP", "PG", "JNJ", "ABBV"
-
-    ]
+    return get_universe('us_stocks')
 
 # Ensure Directory Exists
 def ensure_directory(path):
@@ -38,6 +28,7 @@ def ensure_directory(path):
         os.makedirs(path)
 
 # Format and Validate Data
+@tracing.traced('clean')
 def format_data(df):
     try:
         required_columns = ['Close', 'High', 'Low', 'Volume']
@@ -56,10 +47,11 @@ def format_data(df):
             raise ValueError("Data contains missing values.")
         return df
     except Exception as e:
-        print(f"Data formatting error: {e}")
+        logger.error("Data formatting error: %s", e)
         return None
 
 # Calculate Advanced Indicators
+@tracing.traced('indicators')
 def calculate_advanced_indicators(df):
     try:
         close = df['Close'].values.astype(np.float64).flatten()
@@ -67,23 +59,37 @@ def calculate_advanced_indicators(df):
         low = df['Low'].values.astype(np.float64).flatten()
         volume = df['Volume'].values.astype(np.float64).flatten()
 
-        print(f"Data Shapes - Close: {close.shape}, High: {high.shape}, Low: {low.shape}, Volume: {volume.shape}")
+        logger.debug("Data Shapes - Close: %s, High: %s, Low: %s, Volume: %s", close.shape, high.shape, low.shape,
+                     volume.shape)
 
         if any(arr.ndim != 1 for arr in [close, high, low, volume]):
             raise ValueError("Input arrays must be 1-dimensional.")
 
-        df['STOCH_K'], df['STOCH_D'] = talib.STOCH(high, low, close, fastk_period=14, slowk_period=3, slowd_period=3)
-        df['CCI'] = talib.CCI(high, low, close, timeperiod=20)
-        df['WILLIAMS_R'] = talib.WILLR(high, low, close, timeperiod=14)
-        df['MFI'] = talib.MFI(high, low, close, volume, timeperiod=14)
-        df['ROC'] = talib.ROC(close, timeperiod=10)
-
-        return df
+        return compute_frame(df, ADVANCED_SPECS)
     except Exception as e:
-        print(f"Indicator calculation error: {e}")
+        logger.error("Indicator calculation error: %s", e)
         return None
 
+# Calculate Advanced Indicators for the whole universe in one (dates x tickers) pass
+def calculate_universe_indicators(tickers):
+    frames = {}
+    for ticker in tickers:
+        df = load_ticker_data(ticker)
+        if df is not None:
+            frames[ticker] = df
+    with tracing.span('indicators', tickers=len(frames)):
+        return compute_indicators(build_panel(frames), ADVANCED_SPECS)
+
+# Bump when the chart or CSV layout changes so existing artifacts get redrawn
+PLOT_STYLE_VERSION = 1
+
+# Output files of one ticker
+def output_paths(ticker, category):
+    output_dir = f'results_stock_analysis/{category}/{ticker}'
+    return [f'{output_dir}/{ticker}_advanced_indicators.png', f'{output_dir}/{ticker}_advanced_indicators.csv']
+
 # Plot Advanced Indicators
+@tracing.traced('plot', 'ticker')
 def plot_advanced_indicators(ticker, df, category):
     output_dir = f'results_stock_analysis/{category}/{ticker}'
     ensure_directory(output_dir)
@@ -118,59 +124,109 @@ def plot_advanced_indicators(ticker, df, category):
     plt.savefig(f'{output_dir}/{ticker}_advanced_indicators.png')
     plt.close()
 
-# Analyze Individual Stock or ETF
-def analyze_ticker(ticker, category):
-    try:
-        print(f"Downloading data for: {ticker}...")
-        data = yf.download(ticker, start='2024-01-01', end=pd.Timestamp('today'), threads=False)
+# Load, Clean and Validate Data for One Ticker
+@tracing.traced('download', 'ticker')
+def load_ticker_data(ticker):
+    logger.debug("Downloading data for: %s...", ticker)
+    data = get_bars(ticker, start='2024-01-01', end=pd.Timestamp('today'))
+
+    if data.empty:
+        logger.warning("No available data for %s.", ticker)
+        return None
+    tracing.count('rows', len(data), ticker)
 
-        if data.empty:
-            print(f"No available data for {ticker}.")
-            return
+    data = data.ffill().bfill()
+    data.index = pd.to_datetime(data.index, errors='coerce')
 
-        data = data.ffill().bfill()
-        data.index = pd.to_datetime(data.index, errors='coerce')
+    if data.index.isnull().any() or len(data) < 20:
+        logger.warning("Insufficient data or incorrect date index for %s.", ticker)
+        return None
 
-        if data.index.isnull().any() or len(data) < 20:
-            print(f"Insufficient data or incorrect date index for {ticker}.")
-            return
+    logger.debug("Processing %s data, %d rows found.", ticker, len(data))
+    df = format_data(data)
 
-        print(f"Processing {ticker} data, {len(data)} rows found.")
-        df = format_data(data)
+    if df is None:
+        logger.warning("Data formatting failed for %s.", ticker)
+    return df
 
+# Analyze Individual Stock or ETF (df holds precomputed indicators when given)
+@tracing.traced('analyze', 'ticker')
+def analyze_ticker(ticker, category, df=None):
+    try:
         if df is None:
-            print(f"Data formatting failed for {ticker}.")
-            return
+            df = load_ticker_data(ticker)
+            if df is None:
+                return
 
-        df = calculate_advanced_indicators(df)
+            df = calculate_advanced_indicators(df)
 
-        if df is None:
-            print(f"Indicator calculation failed for {ticker}.")
-            return
+            if df is None:
+                logger.warning("Indicator calculation failed for %s.", ticker)
+                return
 
         output_file = f'results_stock_analysis/{category}/{ticker}/{ticker}_advanced_indicators.csv'
         ensure_directory(f'results_stock_analysis/{category}/{ticker}')
-        df.to_csv(output_file, index=True)
-        print(f"Analysis complete for {ticker}, results saved to {output_file}")
+        with tracing.span('write', ticker):
+            df.to_csv(output_file, index=True)
+        tracing.count('bytes_written', os.path.getsize(output_file), ticker)
+        logger.debug("Analysis complete for %s, results saved to %s", ticker, output_file)
 
         plot_advanced_indicators(ticker, df, category)
-        print(f"Chart generated for {ticker}.")
+        logger.debug("Chart generated for %s.", ticker)
+        return df
 
     except Exception as e:
-        print(f"Error analyzing {ticker}: {e}")
-
-# Main Function
-def main():
-    etfs = get_us_etf_tickers()
-    stocks = get_us_stock_tickers()
-
-    print(f"Number of ETFs to analyze: {len(etfs)}")
-    for etf in etfs:
-        analyze_ticker(etf, "ETF")
-
-    print(f"Number of stocks to analyze: {len(stocks)}")
-    for stock in stocks:
-        analyze_ticker(stock, "Stocks")
+        logger.error("Error analyzing %s: %s", ticker, e)
+
+# Main Function (max_workers: size of the process pool, defaults to the CPU count;
+# force: redraw every artifact even when its inputs are unchanged)
+def main(max_workers=None, force=False, shard=None):
+    etfs, stocks = shard_lists(shard, get_us_etf_tickers(), get_us_stock_tickers())
+
+    # Tickers whose outputs already cover the last trading day are skipped, so an
+    # interrupted run resumes from the first unfinished ticker
+    run = RunManifest('enhanced_us_stock', shard)
+    todo, current = run.split(etfs + stocks, 'outputs', force)
+    logger.info("%d tickers are already current", len(current))
+    if not todo:
+        return
+
+    # Refresh the local bar cache in batched requests before the per-ticker loop
+    _, errors = refresh_many(etfs + stocks, '2024-01-01')
+    for ticker, error in errors.items():
+        logger.warning("Download failed for %s: %s", ticker, error)
+
+    # Compute indicators once across the universe; each ticker only slices its columns
+    indicators = calculate_universe_indicators(etfs + stocks)
+    computed = set(indicators.columns.get_level_values('Ticker'))
+
+    # Also append this run to the consolidated columnar results dataset
+    write_results('enhanced_us_stock', indicators, {"ETF": etfs, "Stocks": stocks}, shard=shard)
+
+    logger.info("Number of ETFs to analyze: %d", len(etfs))
+    logger.info("Number of stocks to analyze: %d", len(stocks))
+    jobs = []
+    data_dates = {}
+    for category, tickers in (("ETF", etfs), ("Stocks", stocks)):
+        for ticker in tickers:
+            if ticker in computed and ticker in todo:
+                df = ticker_frame(indicators, ticker)
+                key = f"{category}/{ticker}"
+                data_dates[key] = df.index[-1]
+                jobs.append((key, (ticker, category, df), df, output_paths(ticker, category)))
+    manifest = ArtifactManifest('enhanced_us_stock', shard=shard)
+    jobs, skipped = manifest.plan(jobs, [ADVANCED_SPECS, PLOT_STYLE_VERSION], force)
+    logger.info("Skipping %d tickers with unchanged inputs", len(skipped))
+    for key in skipped:
+        run.mark(key.split('/', 1)[1], 'outputs', data_dates[key], save=False)
+    run.save()
+    results, failures = run_batch(analyze_ticker, jobs, max_workers, on_done=checkpoint(run, manifest, data_dates))
+    print_summary("Advanced indicators", results, failures)
 
 if __name__ == "__main__":
-    main()
+    args = run_arguments("Advanced indicator analysis of US ETFs and stocks")
+    with tracing.session('enhanced_us_stock'):
+        if args.merge:
+            merge_shards('enhanced_us_stock', get_us_etf_tickers() + get_us_stock_tickers())
+        else:
+            main(args.workers, args.force, args.shard)
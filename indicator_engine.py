@@ -0,0 +1,356 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Declared indicator sets: (output columns, indicator, parameters)
+# us_stock.calculate_technical_indicators
+TECHNICAL_SPECS = [
+    (('MA10',), 'SMA', {'timeperiod': 10}),
+    (('MA20',), 'SMA', {'timeperiod': 20}),
+    (('RSI',), 'RSI', {'timeperiod': 14}),
+    (('MACD', 'MACD_signal', 'MACD_hist'), 'MACD', {'fastperiod': 12, 'slowperiod': 26, 'signalperiod': 9}),
+    (('Upper_BB', 'Middle_BB', 'Lower_BB'), 'BBANDS', {'timeperiod': 20}),
+    (('ATR',), 'ATR', {'timeperiod': 14}),
+    (('ADX',), 'ADX', {'timeperiod': 14}),
+]
+
+# enhanced_us_stock.calculate_advanced_indicators
+ADVANCED_SPECS = [
+    (('STOCH_K', 'STOCH_D'), 'STOCH', {'fastk_period': 14, 'slowk_period': 3, 'slowd_period': 3}),
+    (('CCI',), 'CCI', {'timeperiod': 20}),
+    (('WILLIAMS_R',), 'WILLR', {'timeperiod': 14}),
+    (('MFI',), 'MFI', {'timeperiod': 14}),
+    (('ROC',), 'ROC', {'timeperiod': 10}),
+]
+
+# stock_analyzer.analyze_stock (talib defaults; the BBANDS default period differs
+# between talib releases, so it is pinned to 20 like us_stock)
+ANALYZER_SPECS = [
+    (('MA10',), 'SMA', {'timeperiod': 10}),
+    (('MA20',), 'SMA', {'timeperiod': 20}),
+    (('RSI',), 'RSI', {'timeperiod': 14}),
+    (('MACD', 'MACD_signal', 'MACD_hist'), 'MACD', {'fastperiod': 12, 'slowperiod': 26, 'signalperiod': 9}),
+    (('Upper_BB', 'Middle_BB', 'Lower_BB'), 'BBANDS', {'timeperiod': 20}),
+    (('ATR',), 'ATR', {'timeperiod': 14}),
+    (('ADX',), 'ADX', {'timeperiod': 14}),
+]
+
+# trend.plot_candlestick_chart moving averages
+TREND_SPECS = [
+    (('MA5',), 'SMA', {'timeperiod': 5}),
+    (('MA20',), 'SMA', {'timeperiod': 20}),
+    (('MA60',), 'SMA', {'timeperiod': 60}),
+]
+
+
+# Same tolerance as TA-Lib's TA_IS_ZERO
+def _is_zero(x):
+    return (x > -1e-14) & (x < 1e-14)
+
+
+def _nan_like(x):
+    return np.full(x.shape, np.nan)
+
+
+# Array building blocks below (rolling_window, shift_rows, seeded_ema, compact_panel) are
+# public for param_sweep and return_stats; x is a (dates x tickers) float array.
+
+# Rolling reduction along the date axis, e.g. rolling_window(high, 14, np.max);
+# rows before the first full window are NaN
+def rolling_window(x, n, reducer):
+    out = _nan_like(x)
+    if len(x) >= n:
+        out[n - 1:] = reducer(sliding_window_view(x, n, axis=0), axis=-1)
+    return out
+
+
+# x lagged by n >= 1 rows (x[t - n] at row t); the first n rows are NaN
+def shift_rows(x, n):
+    out = _nan_like(x)
+    if len(x) > n:
+        out[n:] = x[:-n]
+    return out
+
+
+# TA-Lib style EMA: seeded with the mean of x[seed_start:seed_start + n]
+def seeded_ema(x, n, seed_start=0):
+    out = _nan_like(x)
+    seed = seed_start + n - 1
+    if len(x) <= seed:
+        return out
+    k = 2.0 / (n + 1)
+    prev = x[seed_start:seed + 1].mean(axis=0)
+    out[seed] = prev
+    for i in range(seed + 1, len(x)):
+        prev = (x[i] - prev) * k + prev
+        out[i] = prev
+    return out
+
+
+# Wilder smoothing seeded with the mean of x[first:first + n]
+def _wilder(x, n, first):
+    out = _nan_like(x)
+    seed = first + n - 1
+    if len(x) <= seed:
+        return out
+    prev = x[first:seed + 1].mean(axis=0)
+    out[seed] = prev
+    for i in range(seed + 1, len(x)):
+        prev = (prev * (n - 1) + x[i]) / n
+        out[i] = prev
+    return out
+
+
+def _true_range(high, low, close):
+    prev_close = shift_rows(close, 1)
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    tr[0] = np.nan
+    return tr
+
+
+def sma(close, timeperiod=30):
+    return rolling_window(close, timeperiod, np.mean)
+
+
+def ema(close, timeperiod=30):
+    return seeded_ema(close, timeperiod)
+
+
+def rsi(close, timeperiod=14):
+    delta = close - shift_rows(close, 1)
+    gain = _wilder(np.where(delta > 0, delta, 0.0), timeperiod, 1)
+    loss = _wilder(np.where(delta < 0, -delta, 0.0), timeperiod, 1)
+    total = gain + loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(_is_zero(total), 0.0, 100.0 * gain / total)
+    out[np.isnan(total)] = np.nan
+    return out
+
+
+def macd(close, fastperiod=12, slowperiod=26, signalperiod=9):
+    if slowperiod < fastperiod:
+        fastperiod, slowperiod = slowperiod, fastperiod
+    # TA-Lib seeds the fast EMA so that it starts on the same bar as the slow one
+    fast = seeded_ema(close, fastperiod, seed_start=slowperiod - fastperiod)
+    slow = seeded_ema(close, slowperiod)
+    line = fast - slow
+    signal = _nan_like(close)
+    if len(close) > slowperiod - 1:
+        signal[slowperiod - 1:] = seeded_ema(line[slowperiod - 1:], signalperiod)
+    line[np.isnan(signal)] = np.nan
+    return line, signal, line - signal
+
+
+def bbands(close, timeperiod=5, nbdevup=2.0, nbdevdn=2.0):
+    middle = sma(close, timeperiod)
+    variance = rolling_window(close * close, timeperiod, np.mean) - middle * middle
+    std = np.where(variance < 1e-14, 0.0, np.sqrt(np.abs(variance)))
+    std[np.isnan(variance)] = np.nan
+    return middle + nbdevup * std, middle, middle - nbdevdn * std
+
+
+def atr(high, low, close, timeperiod=14):
+    return _wilder(_true_range(high, low, close), timeperiod, 1)
+
+
+def adx(high, low, close, timeperiod=14):
+    n = timeperiod
+    out = _nan_like(close)
+    if len(close) < 2 * n:
+        return out
+    diff_p = high - shift_rows(high, 1)
+    diff_m = shift_rows(low, 1) - low
+    minus_dm = np.where((diff_m > 0) & (diff_p < diff_m), diff_m, 0.0)
+    plus_dm = np.where((diff_p > 0) & (diff_p > diff_m), diff_p, 0.0)
+    tr = _true_range(high, low, close)
+
+    plus_s = plus_dm[1:n].sum(axis=0)
+    minus_s = minus_dm[1:n].sum(axis=0)
+    tr_s = tr[1:n].sum(axis=0)
+
+    def step(i, plus_s, minus_s, tr_s):
+        plus_s = plus_s - plus_s / n + plus_dm[i]
+        minus_s = minus_s - minus_s / n + minus_dm[i]
+        tr_s = tr_s - tr_s / n + tr[i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            plus_di = 100.0 * plus_s / tr_s
+            minus_di = 100.0 * minus_s / tr_s
+            di_sum = plus_di + minus_di
+            dx = 100.0 * np.abs(minus_di - plus_di) / di_sum
+        valid = ~_is_zero(tr_s) & ~_is_zero(di_sum)
+        return plus_s, minus_s, tr_s, dx, valid
+
+    sum_dx = np.zeros(close.shape[1:])
+    for i in range(n, 2 * n):
+        plus_s, minus_s, tr_s, dx, valid = step(i, plus_s, minus_s, tr_s)
+        sum_dx = sum_dx + np.where(valid, dx, 0.0)
+    prev = sum_dx / n
+    out[2 * n - 1] = prev
+    for i in range(2 * n, len(close)):
+        plus_s, minus_s, tr_s, dx, valid = step(i, plus_s, minus_s, tr_s)
+        prev = np.where(valid, (prev * (n - 1) + dx) / n, prev)
+        out[i] = prev
+    return out
+
+
+def stoch(high, low, close, fastk_period=5, slowk_period=3, slowd_period=3):
+    highest = rolling_window(high, fastk_period, np.max)
+    lowest = rolling_window(low, fastk_period, np.min)
+    diff = (highest - lowest) / 100.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fast_k = np.where(diff != 0, (close - lowest) / diff, 0.0)
+    fast_k[np.isnan(diff)] = np.nan
+    slow_k = sma(fast_k, slowk_period)
+    slow_d = sma(slow_k, slowd_period)
+    slow_k[np.isnan(slow_d)] = np.nan
+    return slow_k, slow_d
+
+
+def cci(high, low, close, timeperiod=14):
+    tp = (high + low + close) / 3.0
+    out = _nan_like(tp)
+    if len(tp) < timeperiod:
+        return out
+    windows = sliding_window_view(tp, timeperiod, axis=0)
+    mean = windows.mean(axis=-1)
+    mean_dev = np.abs(windows - mean[..., None]).mean(axis=-1)
+    last = tp[timeperiod - 1:] - mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = np.where((last != 0) & (mean_dev != 0), last / (0.015 * mean_dev), 0.0)
+    value[np.isnan(mean_dev)] = np.nan
+    out[timeperiod - 1:] = value
+    return out
+
+
+def willr(high, low, close, timeperiod=14):
+    highest = rolling_window(high, timeperiod, np.max)
+    lowest = rolling_window(low, timeperiod, np.min)
+    diff = (highest - lowest) / -100.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(diff != 0, (highest - close) / diff, 0.0)
+    out[np.isnan(diff)] = np.nan
+    return out
+
+
+def mfi(high, low, close, volume, timeperiod=14):
+    tp = (high + low + close) / 3.0
+    prev_tp = shift_rows(tp, 1)
+    flow = tp * volume
+    pos = rolling_window(np.where(tp > prev_tp, flow, 0.0)[1:], timeperiod, np.sum)
+    neg = rolling_window(np.where(tp < prev_tp, flow, 0.0)[1:], timeperiod, np.sum)
+    total = pos + neg
+    out = _nan_like(tp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[1:] = np.where(total < 1.0, 0.0, 100.0 * pos / total)
+    out[1:][np.isnan(total)] = np.nan
+    return out
+
+
+def roc(close, timeperiod=10):
+    prev = shift_rows(close, timeperiod)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(prev != 0, (close / prev - 1.0) * 100.0, 0.0)
+    out[np.isnan(prev)] = np.nan
+    return out
+
+
+# indicator name -> (function, input fields)
+INDICATORS = {
+    'SMA': (sma, ['Close']),
+    'EMA': (ema, ['Close']),
+    'RSI': (rsi, ['Close']),
+    'MACD': (macd, ['Close']),
+    'BBANDS': (bbands, ['Close']),
+    'ATR': (atr, ['High', 'Low', 'Close']),
+    'ADX': (adx, ['High', 'Low', 'Close']),
+    'STOCH': (stoch, ['High', 'Low', 'Close']),
+    'CCI': (cci, ['High', 'Low', 'Close']),
+    'WILLR': (willr, ['High', 'Low', 'Close']),
+    'MFI': (mfi, ['High', 'Low', 'Close', 'Volume']),
+    'ROC': (roc, ['Close']),
+}
+
+
+# Align per-ticker frames on the union of their dates into (dates x tickers) arrays
+def build_panel(frames, fields=PRICE_FIELDS):
+    tickers = [t for t, df in frames.items() if df is not None and not df.empty]
+    dates = pd.DatetimeIndex([])
+    for ticker in tickers:
+        dates = dates.union(frames[ticker].index)
+    panel = {'dates': dates, 'tickers': tickers}
+    for field in fields:
+        arr = np.full((len(dates), len(tickers)), np.nan)
+        for j, ticker in enumerate(tickers):
+            df = frames[ticker]
+            arr[dates.get_indexer(df.index), j] = df[field].to_numpy(dtype=np.float64)
+        panel[field] = arr
+    return panel
+
+
+# Move every ticker's valid rows to the top of its column so all tickers share the
+# same warm-up offsets (late listings and missing days do not break the recursions).
+# Returns ({field: compacted array}, order, valid): order[i, j] is the panel row that
+# compacted row i of ticker j came from, valid marks the rows where every field is present.
+def compact_panel(panel, fields):
+    valid = np.ones(panel[fields[0]].shape, dtype=bool)
+    for field in fields:
+        valid &= ~np.isnan(panel[field])
+    order = np.argsort(~valid, axis=0, kind='stable')
+    compact = {field: np.take_along_axis(panel[field], order, axis=0) for field in fields}
+    counts = valid.sum(axis=0)
+    rows = np.arange(valid.shape[0])[:, None]
+    for field in fields:
+        compact[field][rows >= counts] = np.nan
+    return compact, order, valid
+
+
+def _expand(values, order, valid):
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=0)
+    out[~valid] = np.nan
+    return out
+
+
+# Compute a declared indicator set for every ticker of the panel in one pass.
+# Returns a wide DataFrame with (Ticker, Field) columns holding the price fields
+# and every indicator output.
+def compute_indicators(panel, specs):
+    fields = [f for f in PRICE_FIELDS if f in panel]
+    compact, order, valid = compact_panel(panel, fields)
+    outputs = {field: panel[field] for field in fields}
+    for names, indicator, params in specs:
+        func, inputs = INDICATORS[indicator]
+        result = func(*[compact[field] for field in inputs], **params)
+        if not isinstance(result, tuple):
+            result = (result,)
+        for name, values in zip(names, result):
+            outputs[name] = _expand(values, order, valid)
+
+    columns = list(outputs)
+    stacked = np.stack([outputs[c] for c in columns], axis=2)
+    tickers = panel['tickers']
+    return pd.DataFrame(
+        stacked.reshape(len(panel['dates']), len(tickers) * len(columns)),
+        index=pd.DatetimeIndex(panel['dates'], name='Date'),
+        columns=pd.MultiIndex.from_product([tickers, columns], names=['Ticker', 'Field']),
+    )
+
+
+# Slice one ticker's frame out of a compute_indicators result
+def ticker_frame(result, ticker):
+    df = result[ticker]
+    df.columns.name = None
+    return df[df['Close'].notna()]
+
+
+# Single-ticker convenience: compute specs on one OHLCV frame and return it with the new columns
+def compute_frame(df, specs):
+    panel = build_panel({'_': df}, [f for f in PRICE_FIELDS if f in df.columns])
+    result = ticker_frame(compute_indicators(panel, specs), '_')
+    df = df.copy()
+    for column in result.columns:
+        if column not in df.columns:
+            df[column] = result[column].reindex(df.index)
+    return df
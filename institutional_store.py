@@ -0,0 +1,262 @@
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import re
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Whole-market daily institutional trading (TWSE T86 "三大法人買賣超日報"):
+# raw downloads in {INSTITUTIONAL_ROOT}/raw/T86_YYYYMMDD.csv, ingested rows in
+# {INSTITUTIONAL_ROOT}/institutional.parquet sorted by (ticker, date), so reading one
+# ticker only touches the row groups holding it
+INSTITUTIONAL_ROOT = 'data_cache/institutional'
+
+T86_URL = 'https://www.twse.com.tw/rwd/zh/fund/T86?date={date}&selectType=ALL&response=csv'
+
+# TWSE's answer for a day without a report (holiday, typhoon closure). Throttled or failed
+# requests return other pages without the table, which are retried instead.
+NO_DATA_MESSAGE = '很抱歉，沒有符合條件的資料'
+
+# Share counts per institution, named like stock_analyzer's institutional_trading frame
+FIELDS = ['Foreign_Investor_Buy', 'Foreign_Investor_Sell', 'Investment_Trust_Buy', 'Investment_Trust_Sell',
+          'Dealer_Buy', 'Dealer_Sell', 'Net_Buy']
+
+# T86 column prefixes summed into each field. The layout changed over the years (foreign
+# dealers split out in 2017, dealers split into proprietary/hedging in 2014), so every
+# column starting with the prefix and containing the action is added up.
+_COLUMN_GROUPS = {
+    'Foreign_Investor_Buy': (('外陸資', '外資'), '買進'),
+    'Foreign_Investor_Sell': (('外陸資', '外資'), '賣出'),
+    'Investment_Trust_Buy': (('投信',), '買進'),
+    'Investment_Trust_Sell': (('投信',), '賣出'),
+    'Dealer_Buy': (('自營商',), '買進'),
+    'Dealer_Sell': (('自營商',), '賣出'),
+}
+
+# Listed securities: 4-digit stocks, 5-6 character ETFs, warrants and preferred shares (2881A)
+_CODE = r'^[0-9A-Z]{4,6}$'
+
+_SCHEMA = pa.schema([('ticker', pa.string()), ('date', pa.timestamp('ns'))] + [(f, pa.int64()) for f in FIELDS])
+
+
+def store_path(root=INSTITUTIONAL_ROOT):
+    return os.path.join(root, 'institutional.parquet')
+
+
+def raw_path(date, root=INSTITUTIONAL_ROOT):
+    return os.path.join(root, 'raw', f"T86_{pd.Timestamp(date):%Y%m%d}.csv")
+
+
+# Weekdays the exchange published no report for (holidays, typhoon closures), so they are
+# not requested again on every run
+def no_report_path(root=INSTITUTIONAL_ROOT):
+    return os.path.join(root, 'raw', 'no_report.json')
+
+
+def _read_no_report(root):
+    path = no_report_path(root)
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return set(json.load(f))
+
+
+def _write_no_report(days, root):
+    path = no_report_path(root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(sorted(days), f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+def _decode(data):
+    for encoding in ('utf-8-sig', 'cp950'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('cp950', errors='replace')
+
+
+# Report date from the file name (T86_20241016.csv) or the title line (113年10月16日, ROC years)
+def _report_date(text, name):
+    match = re.search(r'(\d{8})', os.path.basename(name or ''))
+    if match:
+        return pd.Timestamp(match.group(1))
+    match = re.search(r'(\d{2,3})年(\d{1,2})月(\d{1,2})日', text)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        return pd.Timestamp(year + 1911, month, day)
+    raise ValueError(f"Cannot tell the report date of {name or 'T86 data'}")
+
+
+# Parse one T86 CSV (path, bytes or text) into rows of ticker, date and FIELDS.
+# Codes become Yahoo symbols (2330 -> 2330.TW); Net_Buy is the three institutions' total.
+def parse_t86(source, date=None, suffix='.TW'):
+    name = source if isinstance(source, str) and os.path.exists(source) else None
+    if name is not None:
+        with open(source, 'rb') as f:
+            source = f.read()
+    text = _decode(source) if isinstance(source, bytes) else source
+    lines = text.splitlines()
+    header = next((i for i, line in enumerate(lines) if '證券代號' in line), None)
+    if header is None:
+        return pd.DataFrame(columns=['ticker', 'date'] + FIELDS)
+    date = pd.Timestamp(date) if date is not None else _report_date(text, name)
+    # Data rows are the quoted lines after the header; notes ("說明") follow the table
+    rows = [line for line in lines[header + 1:] if line.startswith(('"', '='))]
+    table = pd.read_csv(io.StringIO('\n'.join([lines[header]] + rows)), dtype=str)
+    table.columns = [str(c).strip() for c in table.columns]
+    table = table.loc[:, ~table.columns.str.startswith('Unnamed')]
+
+    codes = table['證券代號'].str.replace(r'[="\s]', '', regex=True)
+    # Quoted note lines after the table ("說明:", "1.本資料…") parse as rows too
+    keep = codes.str.match(_CODE).fillna(False).to_numpy()
+    table, codes = table[keep].reset_index(drop=True), codes[keep].reset_index(drop=True)
+    numbers = table.drop(columns=[c for c in ('證券代號', '證券名稱') if c in table.columns])
+    numbers = numbers.apply(lambda column: pd.to_numeric(column.str.replace(r'[,\s]', '', regex=True), errors='coerce'))
+    numbers = numbers.fillna(0).astype(np.int64)
+
+    frame = pd.DataFrame({'ticker': codes + suffix, 'date': date})
+    for field, (prefixes, action) in _COLUMN_GROUPS.items():
+        columns = [c for c in numbers.columns if c.startswith(prefixes) and action in c]
+        frame[field] = numbers[columns].sum(axis=1) if columns else 0
+    total = [c for c in numbers.columns if c.startswith('三大法人買賣超')]
+    frame['Net_Buy'] = numbers[total[0]] if total else (
+        frame['Foreign_Investor_Buy'] - frame['Foreign_Investor_Sell'] + frame['Investment_Trust_Buy']
+        - frame['Investment_Trust_Sell'] + frame['Dealer_Buy'] - frame['Dealer_Sell'])
+    return frame
+
+
+def load_store(root=INSTITUTIONAL_ROOT, tickers=None, start=None):
+    path = store_path(root)
+    if not os.path.exists(path):
+        return pd.DataFrame({field.name: pd.Series(dtype=field.type.to_pandas_dtype()) for field in _SCHEMA})
+    filters = []
+    if tickers is not None:
+        filters.append(('ticker', 'in', list(tickers)))
+    if start is not None:
+        filters.append(('date', '>=', pd.Timestamp(start)))
+    return pq.read_table(path, filters=filters or None).to_pandas()
+
+
+def stored_dates(root=INSTITUTIONAL_ROOT):
+    path = store_path(root)
+    if not os.path.exists(path):
+        return set()
+    dates = pq.read_table(path, columns=['date']).column('date').unique().to_pandas()
+    return set(pd.DatetimeIndex(dates).normalize())
+
+
+# Bulk-load T86 files into the store: every file is parsed, the rows are merged with the
+# stored ones (a re-ingested day replaces that day) and the store is rewritten once, sorted
+# by (ticker, date). Returns the number of rows ingested.
+@tracing.traced('write')
+def ingest(paths, root=INSTITUTIONAL_ROOT):
+    frames = []
+    for path in paths:
+        with tracing.span('parse', os.path.basename(path)):
+            frame = parse_t86(path)
+        if frame.empty:
+            logger.warning("No institutional rows in %s", path)
+            continue
+        frames.append(frame)
+    if not frames:
+        return 0
+    fresh = pd.concat(frames, ignore_index=True)
+    stored = load_store(root)
+    stored = stored[~stored['date'].isin(fresh['date'].unique())]
+    merged = pd.concat([stored, fresh], ignore_index=True)
+    merged = merged.drop_duplicates(['ticker', 'date'], keep='last').sort_values(['ticker', 'date'], kind='stable')
+    path = store_path(root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(merged, schema=_SCHEMA, preserve_index=False)
+    pq.write_table(table, f"{path}.tmp", row_group_size=65536)
+    os.replace(f"{path}.tmp", path)
+    tracing.count('rows_ingested', len(fresh))
+    logger.info("Ingested %d rows from %d files into %s", len(fresh), len(frames), path)
+    return len(fresh)
+
+
+# T86 files of the weekdays in [start, end] that are not in the store yet: raw files left
+# by an earlier run that stopped before ingesting are returned as they are, the other days
+# are downloaded. A failed request only skips its day (retried on the next run); past days
+# TWSE explicitly reports as having no data (holidays) are recorded so they are not
+# requested again.
+def download(start, end=None, root=INSTITUTIONAL_ROOT, pause=3.0):
+    paths = []
+    known = stored_dates(root)
+    no_report = _read_no_report(root)
+    today = pd.Timestamp('today').normalize()
+    for day in pd.bdate_range(start, end or today):
+        path = raw_path(day, root)
+        if day in known or str(day.date()) in no_report:
+            continue
+        if os.path.exists(path):
+            paths.append(path)
+            continue
+        try:
+            with tracing.span('fetch', str(day.date())):
+                with urllib.request.urlopen(T86_URL.format(date=f"{day:%Y%m%d}"), timeout=30) as response:
+                    data = response.read()
+        except Exception as e:
+            logger.warning("T86 download failed for %s: %s", day.date(), e)
+            continue
+        finally:
+            time.sleep(pause)  # the exchange throttles rapid requests
+        text = _decode(data)
+        if '證券代號' not in text:
+            # Today's report may simply not be published yet
+            if NO_DATA_MESSAGE in text and day < today:
+                no_report.add(str(day.date()))
+                _write_no_report(no_report, root)
+            else:
+                logger.warning("T86 download for %s returned no table, retrying on the next run", day.date())
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        tracing.count('bytes_downloaded', len(data))
+        paths.append(path)
+    return paths
+
+
+# Institutional trading of one ticker over its last `days` reported days, in the frame
+# layout analyze_stock uses (Date + FIELDS). Only the row groups holding the ticker are read.
+def institutional_trading(ticker, days=30, root=INSTITUTIONAL_ROOT):
+    rows = load_store(root, tickers=[ticker])
+    if rows.empty:
+        return pd.DataFrame(columns=['Date'] + FIELDS)
+    rows = rows.sort_values('date', kind='stable').tail(days)
+    return rows.drop(columns=['ticker']).rename(columns={'date': 'Date'}).reset_index(drop=True)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest TWSE T86 institutional trading files')
+    parser.add_argument('files', nargs='*', help='T86 CSV files or directories to ingest')
+    parser.add_argument('--download', metavar='START', help='first date to download (YYYY-MM-DD)')
+    parser.add_argument('--end', help='last date to download (default: today)')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    with tracing.session('institutional_store'):
+        files = []
+        for item in args.files:
+            files += sorted(glob.glob(os.path.join(item, '*.csv'))) if os.path.isdir(item) else [item]
+        if args.download:
+            files += download(args.download, args.end)
+        ingest(files)
@@ -0,0 +1,290 @@
+import itertools
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_runner import run_batch
+from indicator_engine import build_panel, compact_panel, rsi, rolling_window, seeded_ema, shift_rows
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+# Default grids: strategy -> {parameter: values}; invalid combinations are skipped by the rule
+SWEEP_GRIDS = {
+    'sma_cross': {'fast': range(5, 51), 'slow': range(10, 201, 5)},
+    'rsi': {'timeperiod': range(5, 31), 'lower': (20, 25, 30, 35, 40), 'upper': (55, 60, 65, 70, 75, 80)},
+    'macd': {'fastperiod': range(6, 17, 2), 'slowperiod': range(18, 41, 2), 'signalperiod': range(5, 14, 2)},
+    'stoch': {'fastk_period': range(5, 31), 'slowk_period': range(1, 6), 'slowd_period': range(1, 6)},
+}
+
+
+class SweepContext:
+    """Building blocks shared by every parameter combination of one chunk of tickers.
+
+    Arrays are compacted like indicator_engine (valid rows first), so every
+    ticker shares the same warm-up offsets. Prefix sums give any SMA in O(1)
+    per bar; EMAs, RSI and rolling extrema are cached by window.
+    """
+
+    def __init__(self, panel):
+        fields = [f for f in ('High', 'Low', 'Close') if f in panel]
+        compact, _, valid = compact_panel(panel, fields)
+        self.close = compact['Close']
+        self.high = compact.get('High', self.close)
+        self.low = compact.get('Low', self.close)
+        self.counts = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.returns = np.nan_to_num(self.close / shift_rows(self.close, 1) - 1)
+        self._cache = {}
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    # Prefix sums of the values and of their NaN count (NaNs are summed as 0)
+    def _prefix(self, name, values):
+        def build():
+            missing = np.isnan(values)
+            sums = np.zeros((values.shape[0] + 1, values.shape[1]))
+            gaps = np.zeros((values.shape[0] + 1, values.shape[1]), dtype=np.int64)
+            np.cumsum(np.where(missing, 0.0, values), axis=0, out=sums[1:])
+            np.cumsum(missing, axis=0, out=gaps[1:])
+            return sums, gaps
+        return self._cached(('prefix', name), build)
+
+    # Rolling mean from prefix sums; windows containing a NaN are NaN, like a rolling window
+    def _mean(self, name, values, n):
+        sums, gaps = self._prefix(name, values)
+        out = np.full(values.shape, np.nan)
+        if len(values) >= n:
+            out[n - 1:] = np.where(gaps[n:] - gaps[:-n] > 0, np.nan, (sums[n:] - sums[:-n]) / n)
+        return out
+
+    def sma(self, n):
+        return self._cached(('sma', n), lambda: self._mean('close', self.close, n))
+
+    def ema(self, n, seed_start=0):
+        return self._cached(('ema', n, seed_start), lambda: seeded_ema(self.close, n, seed_start))
+
+    def highest(self, n):
+        return self._cached(('highest', n), lambda: rolling_window(self.high, n, np.max))
+
+    def lowest(self, n):
+        return self._cached(('lowest', n), lambda: rolling_window(self.low, n, np.min))
+
+    def rsi(self, n):
+        return self._cached(('rsi', n), lambda: rsi(self.close, n))
+
+    def macd_line(self, fast, slow):
+        return self.ema(fast, seed_start=slow - fast) - self.ema(slow)
+
+    # MACD lines and signal lines for many (fast, slow) pairs sharing one signal period.
+    # Each line is shifted so its first value is on row 0 and all signal EMAs run in one pass.
+    def macd_batch(self, pairs, signal):
+        n_rows = len(self.close)
+        stacked = np.full((n_rows, len(pairs), self.close.shape[1]), np.nan)
+        for k, (fast, slow) in enumerate(pairs):
+            stacked[:n_rows - slow + 1, k] = self.macd_line(fast, slow)[slow - 1:]
+        smoothed = seeded_ema(stacked.reshape(n_rows, -1), signal).reshape(stacked.shape)
+        results = []
+        for k, (fast, slow) in enumerate(pairs):
+            out = np.full((n_rows, self.close.shape[1]), np.nan)
+            out[slow - 1:] = smoothed[:n_rows - slow + 1, k]
+            results.append((self.macd_line(fast, slow), out))
+        return results
+
+    def fast_k(self, n):
+        def build():
+            highest, lowest = self.highest(n), self.lowest(n)
+            diff = (highest - lowest) / 100.0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = np.where(diff != 0, (self.close - lowest) / diff, 0.0)
+            out[np.isnan(diff)] = np.nan
+            return out
+        return self._cached(('fast_k', n), build)
+
+    def stoch(self, fastk, slowk, slowd):
+        slow_k = self._cached(('slow_k', fastk, slowk),
+                              lambda: self._mean(('fast_k', fastk), self.fast_k(fastk), slowk))
+        slow_d = self._mean(('slow_k', fastk, slowk), slow_k, slowd)
+        return slow_k, slow_d
+
+
+# Hold a position between entry and exit signals (NaN keeps the previous state)
+def _hold(entry, exit_):
+    state = np.where(entry, 1.0, np.where(exit_, 0.0, np.nan))
+    rows = np.where(np.isnan(state), 0, np.arange(len(state))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    held = state[rows, np.arange(state.shape[1])]
+    return np.nan_to_num(held)
+
+
+# Strategy rules: (context, list of parameter dicts) -> yields (params, long/flat positions).
+# Invalid combinations (fast period not below the slow one) are skipped.
+def sma_cross(ctx, combos):
+    for params in combos:
+        if params['fast'] < params['slow']:
+            yield params, ctx.sma(params['fast']) > ctx.sma(params['slow'])
+
+
+def rsi_reversion(ctx, combos):
+    for params in combos:
+        value = ctx.rsi(params['timeperiod'])
+        yield params, _hold(value < params['lower'], value > params['upper'])
+
+
+def macd_cross(ctx, combos):
+    combos = [params for params in combos if params['fastperiod'] < params['slowperiod']]
+    for signal in sorted({params['signalperiod'] for params in combos}):
+        group = [params for params in combos if params['signalperiod'] == signal]
+        pairs = [(params['fastperiod'], params['slowperiod']) for params in group]
+        for params, (line, signal_line) in zip(group, ctx.macd_batch(pairs, signal)):
+            yield params, line > signal_line
+
+
+def stoch_cross(ctx, combos):
+    for params in combos:
+        slow_k, slow_d = ctx.stoch(params['fastk_period'], params['slowk_period'], params['slowd_period'])
+        yield params, slow_k > slow_d
+
+
+STRATEGIES = {
+    'sma_cross': sma_cross,
+    'rsi': rsi_reversion,
+    'macd': macd_cross,
+    'stoch': stoch_cross,
+}
+
+METRICS = ['total_return', 'sharpe', 'max_drawdown', 'trades', 'exposure']
+
+
+# Score long/flat positions decided at each close and held until the next close; one
+# score per column. valid marks each column's bars (compacted rows), cost is charged on
+# every change of position as a fraction of equity.
+def score_positions(positions, returns, valid, cost=0.001):
+    counts = valid.sum(axis=0)
+    held = np.empty(positions.shape)
+    held[0] = 0.0
+    held[1:] = positions[:-1]
+    held[~valid] = 0.0
+    changes = np.zeros(positions.shape, dtype=bool)
+    np.not_equal(held[1:], held[:-1], out=changes[1:])
+    changes &= valid
+    last_held = held[np.maximum(counts - 1, 0), np.arange(held.shape[1])]
+
+    strategy = held * returns
+    strategy[changes] -= cost
+    n = np.maximum(counts, 1)
+    mean = strategy.sum(axis=0) / n
+    std = np.sqrt(np.maximum(np.einsum('ij,ij->j', strategy, strategy) / n - mean ** 2, 0.0))
+
+    equity = np.add(strategy, 1.0, out=strategy)
+    np.cumprod(equity, axis=0, out=equity)
+    peak = np.maximum.accumulate(equity, axis=0)
+    np.maximum(peak, 1.0, out=peak)
+    worst = np.divide(equity, peak, out=peak).min(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan)
+    # held starts flat, so entries and exits alternate
+    return {
+        'total_return': (equity[-1] - 1) * 100,
+        'sharpe': sharpe,
+        'max_drawdown': (1 - worst) * 100,
+        'trades': ((changes.sum(axis=0) + last_held) // 2).astype(np.int64),
+        'exposure': held.sum(axis=0) / n * 100,
+    }
+
+
+def param_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def format_params(params):
+    return ' '.join(f"{name}={value}" for name, value in params.items())
+
+
+# Worker: sweep every strategy/parameter combination over one chunk of tickers.
+# Positions of several combinations are scored together as one wide array.
+def _sweep_chunk(panel, grids, cost, batch_columns=2048):
+    ctx = SweepContext(panel)
+    n_tickers = len(panel['tickers'])
+    per_batch = max(batch_columns // max(n_tickers, 1), 1)
+    returns = np.tile(ctx.returns, per_batch)
+    valid = np.tile(np.arange(len(ctx.returns))[:, None] < ctx.counts, per_batch)
+    labels = []
+    scores = {metric: [] for metric in METRICS}
+    pending = []
+
+    def flush():
+        stacked = np.concatenate(pending, axis=1)
+        width = stacked.shape[1]
+        batch = score_positions(stacked, returns[:, :width], valid[:, :width], cost)
+        for metric in METRICS:
+            scores[metric].append(batch[metric])
+        pending.clear()
+
+    for strategy, grid in grids.items():
+        for params, positions in STRATEGIES[strategy](ctx, param_grid(grid)):
+            labels.append((strategy, format_params(params)))
+            pending.append(positions)
+            if len(pending) == per_batch:
+                flush()
+    if pending:
+        flush()
+    if not labels:
+        return pd.DataFrame()
+
+    result = pd.DataFrame({
+        'strategy': np.repeat([strategy for strategy, _ in labels], n_tickers),
+        'params': np.repeat([params for _, params in labels], n_tickers),
+        'ticker': np.tile(panel['tickers'], len(labels)),
+    })
+    for metric in METRICS:
+        result[metric] = np.concatenate(scores[metric])
+    return result
+
+
+def _chunks(panel, chunk_size):
+    tickers = panel['tickers']
+    for start in range(0, len(tickers), chunk_size):
+        chunk = {'dates': panel['dates'], 'tickers': tickers[start:start + chunk_size]}
+        for field in ('High', 'Low', 'Close'):
+            if field in panel:
+                chunk[field] = panel[field][:, start:start + chunk_size]
+        yield chunk
+
+
+# Evaluate every parameter combination of the given strategies for every ticker.
+# frames maps ticker -> OHLC frame; grids defaults to SWEEP_GRIDS. Tickers are split
+# into chunks that run on a process pool. Returns one row per (strategy, params, ticker).
+def run_sweep(frames, grids=None, cost=0.001, chunk_size=25, max_workers=None, output=None):
+    grids = SWEEP_GRIDS if grids is None else grids
+    panel = build_panel(frames, [f for f in ('High', 'Low', 'Close') if all(f in df for df in frames.values())])
+    jobs = [(i, (chunk, grids, cost)) for i, chunk in enumerate(_chunks(panel, chunk_size))]
+    results, failures = run_batch(_sweep_chunk, jobs, max_workers)
+    for key, (error, _) in failures.items():
+        logger.warning("Sweep chunk %s failed: %s", key, error.strip().splitlines()[-1])
+    results = pd.concat([results[key] for key in sorted(results)], ignore_index=True) if results else pd.DataFrame()
+    if output is not None and not results.empty:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        results.to_parquet(output, index=False)
+    return results
+
+
+# Ranked table: best `top` settings per ticker (by='ticker') or for the whole universe
+# (by='universe', averaging the metric over tickers)
+def rank_results(results, metric='sharpe', by='ticker', top=10, ascending=False):
+    if by == 'universe':
+        table = results.groupby(['strategy', 'params'])[METRICS].mean()
+        table['tickers'] = results.groupby(['strategy', 'params']).size()
+        table = table.sort_values(metric, ascending=ascending).head(top).reset_index()
+    else:
+        table = results.sort_values(metric, ascending=ascending, na_position='last').groupby('ticker', sort=True).head(top)
+        table = table.sort_values(['ticker', metric], ascending=[True, ascending]).reset_index(drop=True)
+    table.insert(0, 'rank', table.groupby('ticker').cumcount() + 1 if by != 'universe' else np.arange(1, len(table) + 1))
+    return table
@@ -0,0 +1,119 @@
+import functools
+import glob
+import operator
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import tracing
+
+# Consolidated results: {DATASET_ROOT}/{source}/run_date=YYYY-MM-DD/category={category}/part.parquet
+# One table per producing script (source), flat typed columns keyed by (ticker, date)
+DATASET_ROOT = 'results_dataset'
+
+PARTITIONING = ds.partitioning(pa.schema([('run_date', pa.string()), ('category', pa.string())]), flavor='hive')
+
+
+# Turn a wide indicator_engine result into long rows: ticker, date, <fields...>
+def to_long(indicators, tickers=None):
+    if tickers is not None:
+        indicators = indicators.loc[:, indicators.columns.get_level_values('Ticker').isin(tickers)]
+    long = indicators.stack(level='Ticker', future_stack=True)
+    long = long[long['Close'].notna()].reset_index()
+    long.columns.name = None
+    long = long.rename(columns={'Date': 'date', 'Ticker': 'ticker'})
+    fields = [c for c in long.columns if c not in ('date', 'ticker')]
+    long[fields] = long[fields].astype('float64')
+    return long.sort_values(['ticker', 'date'], kind='stable')[['ticker', 'date'] + fields]
+
+
+# Write one run of a script's results, one file per category; rewriting the same
+# run_date replaces that partition instead of appending duplicates. A `--shard i/n` run
+# writes part.shard-{i}-of-{n}.parquet next to it until merge_parts folds it in.
+@tracing.traced('write')
+def write_results(source, indicators, categories, run_date=None, root=DATASET_ROOT, shard=None):
+    run_date = str(pd.Timestamp(run_date or 'today').date())
+    name = 'part.parquet' if shard is None else f"part.shard-{shard[0] + 1}-of-{shard[1]}.parquet"
+    paths = []
+    for category, tickers in categories.items():
+        long = to_long(indicators, tickers)
+        if long.empty:
+            continue
+        part_dir = os.path.join(root, source, f"run_date={run_date}", f"category={category}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, name)
+        table = pa.Table.from_pandas(long, preserve_index=False)
+        pq.write_table(table, f"{path}.tmp", row_group_size=16384)
+        os.replace(f"{path}.tmp", path)
+        tracing.count('bytes_written', os.path.getsize(path))
+        paths.append(path)
+    return paths
+
+
+# Fold shard files into part.parquet in every partition of source (or of one run_date).
+# Rows from shards replace the same (ticker, date) rows of an earlier full run.
+def merge_parts(source, run_date=None, root=DATASET_ROOT):
+    run_date = '*' if run_date is None else str(pd.Timestamp(run_date).date())
+    pattern = os.path.join(glob.escape(os.path.join(root, source)), f"run_date={run_date}", 'category=*')
+    paths = []
+    for part_dir in sorted(glob.glob(pattern)):
+        shard_paths = sorted(glob.glob(os.path.join(part_dir, 'part.shard-*.parquet')))
+        if not shard_paths:
+            continue
+        path = os.path.join(part_dir, 'part.parquet')
+        sources = ([path] if os.path.exists(path) else []) + shard_paths
+        long = pd.concat([pd.read_parquet(p) for p in sources], ignore_index=True)
+        long = long.drop_duplicates(['ticker', 'date'], keep='last').sort_values(['ticker', 'date'], kind='stable')
+        pq.write_table(pa.Table.from_pandas(long, preserve_index=False), f"{path}.tmp", row_group_size=16384)
+        os.replace(f"{path}.tmp", path)
+        for shard_path in shard_paths:
+            os.remove(shard_path)
+        paths.append(path)
+    return paths
+
+
+def list_run_dates(source, root=DATASET_ROOT):
+    base = os.path.join(root, source)
+    if not os.path.isdir(base):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(base) if name.startswith('run_date='))
+
+
+# Load a column subset / date range for many tickers.
+# run_date defaults to the latest run; pass run_date='all' to scan every run.
+def load_results(source, tickers=None, columns=None, start=None, end=None,
+                 run_date=None, category=None, root=DATASET_ROOT):
+    if run_date is None:
+        run_dates = list_run_dates(source, root)
+        if not run_dates:
+            return pd.DataFrame()
+        run_date = run_dates[-1]
+    dataset = ds.dataset(os.path.join(root, source), format='parquet', partitioning=PARTITIONING)
+
+    filters = []
+    if run_date != 'all':
+        filters.append(ds.field('run_date') == str(pd.Timestamp(run_date).date()))
+    if category is not None:
+        filters.append(ds.field('category') == category)
+    if tickers is not None:
+        filters.append(ds.field('ticker').isin(list(tickers)))
+    if start is not None:
+        filters.append(ds.field('date') >= pd.Timestamp(start).to_pydatetime())
+    if end is not None:
+        filters.append(ds.field('date') < pd.Timestamp(end).to_pydatetime())
+    condition = functools.reduce(operator.and_, filters) if filters else None
+
+    if columns is not None:
+        keys = ['run_date', 'category', 'ticker', 'date'] if run_date == 'all' else ['ticker', 'date']
+        columns = keys + [c for c in columns if c not in keys]
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+# Point lookup of one value, e.g. the close of a ticker on a date (latest run by default)
+def get_value(source, ticker, date, column='Close', run_date=None, root=DATASET_ROOT):
+    df = load_results(source, tickers=[ticker], columns=[column], start=date,
+                      end=pd.Timestamp(date) + pd.Timedelta(days=1), run_date=run_date, root=root)
+    return df[column].iloc[0] if not df.empty else None
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from indicator_engine import build_panel, compact_panel
+
+TRADING_DAYS = 252
+
+# Trailing windows measured back from each ticker's last bar (inclusive, like df.loc[last - offset:])
+TRAILING_WINDOWS = {
+    'one_month': pd.DateOffset(months=1),
+    'six_months': pd.DateOffset(months=6),
+    'one_year': pd.DateOffset(years=1),
+}
+
+
+# Calendar bucket codes: weeks ending on Sunday (resample('W')) and calendar months
+def week_codes(dates):
+    days = dates.values.astype('datetime64[D]').astype(np.int64)
+    return (days - 4) // 7  # 1970-01-05 is a Monday
+
+
+def month_codes(dates):
+    return dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+
+
+# Average over buckets of the per-bucket mean of values[included]; buckets with no
+# included rows are skipped, like the NaN weeks of resample(...).mean()
+def _bucket_average(codes, values, included):
+    n_cols = codes.shape[1]
+    cols = np.broadcast_to(np.arange(n_cols), codes.shape)
+    base = codes[included].min() if included.any() else 0
+    keys = ((codes - base) * n_cols + cols)[included]
+    size = (int(keys.max()) + 1) if len(keys) else n_cols
+    size += (-size) % n_cols
+    sums = np.bincount(keys, weights=values[included], minlength=size).reshape(-1, n_cols)
+    counts = np.bincount(keys, minlength=size).reshape(-1, n_cols)
+    has = counts > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(has, sums / np.maximum(counts, 1), 0.0)
+        return means.sum(axis=0) / has.sum(axis=0)
+
+
+# Rolling max over the last `window` rows with partial windows at the start
+# (rolling(window, min_periods=1).max()), using block prefix/suffix maxima
+def rolling_max(values, window):
+    n_rows, n_cols = values.shape
+    padded_rows = -(-n_rows // window) * window
+    padded = np.full((padded_rows, n_cols), -np.inf)
+    padded[:n_rows] = np.where(np.isnan(values), -np.inf, values)
+    blocks = padded.reshape(-1, window, n_cols)
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(padded_rows, n_cols)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded_rows, n_cols)
+    rows = np.arange(n_rows)
+    start = np.maximum(rows - window + 1, 0)
+    out = np.maximum(suffix[start], prefix[rows])
+    # a window that starts at row 0 is covered by the prefix alone
+    out[rows < window] = prefix[rows[rows < window]]
+    return np.where(np.isinf(out), np.nan, out)
+
+
+# Return, win-rate, volatility, Sharpe and drawdown statistics for every column of a
+# (dates x tickers) close panel in one pass. Each ticker uses only its own bars.
+# Returns and win rates are in percent, as analyze_stock displays them;
+# sharpe_ratio matches stock_analysis.calculate_sharpe_ratio and max_drawdown
+# matches calculate_max_drawdown (a negative fraction against the 252-bar high).
+def compute_return_stats(close, risk_free_rate=0.02, drawdown_window=TRADING_DAYS):
+    if close.index.tz is not None:
+        close = close.tz_localize(None)  # bucket on local calendar days, not UTC
+    panel = {'dates': close.index, 'tickers': list(close.columns), 'Close': close.to_numpy(dtype=np.float64)}
+    compact, order, _ = compact_panel(panel, ['Close'])
+    prices = compact['Close']
+    counts = (~np.isnan(prices)).sum(axis=0)
+    rows = np.arange(len(prices))[:, None]
+    valid = rows < counts
+
+    returns = np.full(prices.shape, np.nan)
+    returns[1:] = prices[1:] / prices[:-1] - 1
+    has_return = ~np.isnan(returns)
+    filled = np.where(has_return, returns, 0.0)
+    n_returns = has_return.sum(axis=0)
+    positive = filled > 0
+    dates = close.index.values[order]
+    weeks = week_codes(close.index)[order]
+    last = dates[np.maximum(counts - 1, 0), np.arange(prices.shape[1])]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=0) / n_returns
+        std = np.sqrt(((filled - mean) ** 2 * has_return).sum(axis=0) / (n_returns - 1))
+        excess = mean - risk_free_rate / TRADING_DAYS
+        stats = {
+            'daily_return': mean * 100,
+            'weekly_return': _bucket_average(weeks, filled, has_return) * 100,
+            'daily_win_rate': positive.sum(axis=0) / counts * 100,
+            'weekly_win_rate': _bucket_average(weeks, positive, valid) * 100,
+            'monthly_win_rate': _bucket_average(month_codes(close.index)[order], positive, valid) * 100,
+        }
+        for name, offset in TRAILING_WINDOWS.items():
+            cutoff = np.array([np.datetime64(pd.Timestamp(day) - offset) for day in last], dtype=dates.dtype)
+            window = valid & (dates >= cutoff)
+            window_returns = window & has_return
+            stats[f"{name}_return"] = (filled * window_returns).sum(axis=0) / window_returns.sum(axis=0) * 100
+            stats[f"{name}_win_rate"] = (positive & window).sum(axis=0) / window.sum(axis=0) * 100
+        stats['volatility'] = std * np.sqrt(TRADING_DAYS) * 100
+        stats['sharpe_ratio'] = np.sqrt(TRADING_DAYS) * excess / std
+        stats['max_drawdown'] = np.nanmin(np.where(valid, prices / rolling_max(prices, drawdown_window) - 1, np.nan), axis=0)
+
+    columns = ['daily_return', 'weekly_return', 'one_month_return', 'six_months_return', 'one_year_return',
+               'daily_win_rate', 'weekly_win_rate', 'monthly_win_rate', 'six_months_win_rate', 'one_year_win_rate',
+               'one_month_win_rate', 'volatility', 'sharpe_ratio', 'max_drawdown']
+    result = pd.DataFrame(stats, index=pd.Index(close.columns, name='Ticker'))[columns]
+    return result[counts > 0] if (counts == 0).any() else result
+
+
+# Convenience: statistics straight from per-ticker OHLCV frames
+def stats_for_frames(frames, **kwargs):
+    panel = build_panel(frames, ['Close'])
+    close = pd.DataFrame(panel['Close'], index=panel['dates'], columns=panel['tickers'])
+    return compute_return_stats(close, **kwargs)
@@ -0,0 +1,168 @@
+import argparse
+import glob
+import json
+import logging
+import os
+
+import pandas as pd
+
+from artifact_cache import merge_manifests
+from data_provider import MARKET_HOURS, last_close, market_of
+from results_dataset import merge_parts
+from ticker_registry import shard as shard_symbols
+
+logger = logging.getLogger(__name__)
+
+# Per-script run checkpoints: data_cache/runs/{name}/all.json for full runs and
+# data_cache/runs/{name}/shard-{i}-of-{n}.json for `--shard i/n` runs
+RUN_ROOT = 'data_cache/runs'
+
+
+# "2/4" -> (1, 4): the second of four shards (1-based on the command line, 0-based inside)
+def parse_shard(text):
+    try:
+        index, count = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {text!r}") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {text!r}")
+    return index - 1, count
+
+
+def shard_label(shard):
+    return 'all' if shard is None else f"shard-{shard[0] + 1}-of-{shard[1]}"
+
+
+# Local date of the most recent completed session of a market, i.e. the newest bar a
+# result can be expected to include
+def last_trading_day(market, now=None):
+    return last_close(market, now).tz_convert(MARKET_HOURS[market][0]).date().isoformat()
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+class RunManifest:
+    """Per-ticker stage completion of one script's runs, checkpointed as each ticker finishes.
+
+    entries: {ticker: {stage: {'data_date': 'YYYY-MM-DD', 'completed_at': ...}}}, where
+    data_date is the last bar the stage was computed from. A stage is current when its
+    data_date has reached the market's last trading day. Shard runs write their own file
+    (never shared between processes) and also read the merged all.json.
+    """
+
+    def __init__(self, name, shard=None, root=RUN_ROOT):
+        self.name = name
+        self.shard = shard
+        self.path = os.path.join(root, name, f"{shard_label(shard)}.json")
+        self.entries = _read(os.path.join(root, name, 'all.json')) if shard is not None else {}
+        for ticker, stages in _read(self.path).items():
+            self.entries.setdefault(ticker, {}).update(stages)
+
+    def data_date(self, ticker, stage):
+        return self.entries.get(ticker, {}).get(stage, {}).get('data_date')
+
+    def is_current(self, ticker, stage, now=None):
+        data_date = self.data_date(ticker, stage)
+        return data_date is not None and data_date >= last_trading_day(market_of(ticker), now)
+
+    # Tickers still to do for stage (in their original order, so a rerun resumes at the
+    # first incomplete ticker) and the ones already current for the last trading day
+    def split(self, tickers, stage, force=False, now=None):
+        todo, current = [], []
+        for ticker in tickers:
+            (current if not force and self.is_current(ticker, stage, now) else todo).append(ticker)
+        return todo, current
+
+    # A bar dated after the last completed session is a partial intraday bar, so it is
+    # recorded as that session: a rerun after today's close still finds the ticker stale
+    def mark(self, ticker, stage, data_date, save=True, now=None):
+        data_date = min(str(pd.Timestamp(data_date).date()), last_trading_day(market_of(ticker), now))
+        self.entries.setdefault(ticker, {})[stage] = {
+            'data_date': data_date,
+            'completed_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        }
+        if save:
+            self.save()
+
+    def save(self):
+        _write(self.path, self.entries)
+
+
+# Restrict each ticker list (e.g. ETFs, stocks) to one shard of their combined universe
+def shard_lists(shard, *lists):
+    if shard is None:
+        return lists
+    members = set(shard_symbols([ticker for tickers in lists for ticker in tickers], *shard))
+    return tuple([ticker for ticker in tickers if ticker in members] for tickers in lists)
+
+
+# run_batch on_done callback: record a finished "{category}/{ticker}" job in the artifact
+# manifest and checkpoint its ticker, so an interrupted run resumes after the last one done.
+# data_dates maps job key -> last bar the job was computed from.
+def checkpoint(run, manifest, data_dates, stage='outputs'):
+    def on_done(key, result, error):
+        if error is None:
+            manifest.commit([key])
+            run.mark(key.split('/', 1)[1], stage, data_dates[key])
+    return on_done
+
+
+# Fold every shard manifest of a script into all.json, keeping the newest data date per
+# (ticker, stage), and remove the shard files. Returns the merged entries.
+def merge_run_manifests(name, root=RUN_ROOT):
+    base = os.path.join(root, name)
+    merged = _read(os.path.join(base, 'all.json'))
+    shard_paths = sorted(glob.glob(os.path.join(glob.escape(base), 'shard-*.json')))
+    for path in shard_paths:
+        for ticker, stages in _read(path).items():
+            for stage, entry in stages.items():
+                known = merged.setdefault(ticker, {}).get(stage)
+                if known is None or entry['data_date'] >= known['data_date']:
+                    merged[ticker][stage] = entry
+    _write(os.path.join(base, 'all.json'), merged)
+    for path in shard_paths:
+        os.remove(path)
+    return merged
+
+
+# Merge step after `--shard i/N` runs: fold the shards' results-dataset files, artifact
+# manifests and run manifests into the single-run layout, then report tickers that are
+# still incomplete. Charts and CSVs are per-ticker files, so shards sharing one working
+# tree (or synced into one) already form the combined output.
+def merge_shards(name, tickers=None, stage='outputs', root=RUN_ROOT):
+    parts = merge_parts(name)
+    merge_manifests(name)
+    entries = merge_run_manifests(name, root)
+    logger.info("Merged %d result partitions and %d ticker checkpoints for %s", len(parts), len(entries), name)
+    if tickers is None:
+        return []
+    manifest = RunManifest(name, root=root)
+    incomplete = [ticker for ticker in tickers if not manifest.is_current(ticker, stage)]
+    if incomplete:
+        logger.warning("%d tickers are not current yet: %s", len(incomplete), ', '.join(incomplete))
+    return incomplete
+
+
+# Command line shared by the batch scripts:
+#   python us_stock.py [--workers N] [--force] [--shard i/N] [--merge]
+def run_arguments(description, argv=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='recompute tickers even when their outputs are current')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                        help='only process the i-th of N deterministic slices of the universe')
+    parser.add_argument('--merge', action='store_true',
+                        help='assemble the outputs of finished shard runs instead of running')
+    return parser.parse_args(argv)
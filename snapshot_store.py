@@ -0,0 +1,164 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import tracing
+from results_dataset import DATASET_ROOT
+
+# Daily win-rate snapshots: {SNAPSHOT_ROOT}/{name}/run_date=YYYY-MM-DD/part.parquet
+# One row per (run_date, ticker); earlier runs are never rewritten, a rerun on the same
+# run_date replaces only that day's partition
+SNAPSHOT_ROOT = os.path.join(DATASET_ROOT, 'snapshots')
+
+PARTITIONING = ds.partitioning(pa.schema([('run_date', pa.string())]), flavor='hive')
+
+# Columns of weighted_win_rates.csv
+WIN_RATE_FIELDS = ['daily_return', 'weekly_return', 'one_month_return', 'six_months_return', 'one_year_return',
+                   'daily_win_rate', 'weekly_win_rate', 'monthly_win_rate', 'six_months_win_rate', 'one_year_win_rate',
+                   'additional_win_rate', 'total_win_rate']
+
+# The components summed into total_win_rate by the notebooks
+TOTAL_PARTS = ['daily_win_rate', 'weekly_win_rate', 'monthly_win_rate', 'six_months_win_rate', 'one_year_win_rate',
+               'additional_win_rate']
+
+
+# Normalize analysis results (a list of analyze_stock dicts or a weighted_win_rates frame)
+# into snapshot rows: ticker, close, <fields...>. current_price is taken as the close and
+# total_win_rate is derived like the notebooks when it is missing.
+def snapshot_frame(results):
+    if isinstance(results, list):
+        keys = ['ticker', 'close', 'current_price'] + WIN_RATE_FIELDS
+        results = [{key: result[key] for key in keys if key in result} for result in results]
+    frame = pd.DataFrame(results).copy()
+    if 'close' not in frame.columns and 'current_price' in frame.columns:
+        frame['close'] = frame['current_price']
+    if 'total_win_rate' not in frame.columns and set(TOTAL_PARTS) <= set(frame.columns):
+        frame['total_win_rate'] = frame[TOTAL_PARTS].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+    fields = ['close'] + [c for c in WIN_RATE_FIELDS if c in frame.columns]
+    frame = frame[['ticker'] + [c for c in fields if c in frame.columns]]
+    frame[frame.columns[1:]] = frame[frame.columns[1:]].apply(pd.to_numeric, errors='coerce').astype('float64')
+    return frame.drop_duplicates('ticker', keep='last').sort_values('ticker', kind='stable').reset_index(drop=True)
+
+
+@tracing.traced('write')
+def write_snapshot(name, results, run_date=None, root=SNAPSHOT_ROOT):
+    run_date = str(pd.Timestamp(run_date or 'today').date())
+    frame = snapshot_frame(results)
+    part_dir = os.path.join(root, name, f"run_date={run_date}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, 'part.parquet')
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def list_snapshots(name, root=SNAPSHOT_ROOT):
+    base = os.path.join(root, name)
+    if not os.path.isdir(base):
+        return []
+    return sorted(entry.split('=', 1)[1] for entry in os.listdir(base) if entry.startswith('run_date='))
+
+
+# All snapshots in [start, end] indexed by (ticker, run_date), sorted
+def load_snapshots(name, tickers=None, start=None, end=None, columns=None, root=SNAPSHOT_ROOT):
+    if not list_snapshots(name, root):
+        return pd.DataFrame()
+    dataset = ds.dataset(os.path.join(root, name), format='parquet', partitioning=PARTITIONING)
+    condition = None
+    for expression in [
+        ds.field('ticker').isin(list(tickers)) if tickers is not None else None,
+        ds.field('run_date') >= str(pd.Timestamp(start).date()) if start is not None else None,
+        ds.field('run_date') <= str(pd.Timestamp(end).date()) if end is not None else None,
+    ]:
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    if columns is not None:
+        columns = ['ticker', 'run_date'] + [c for c in columns if c not in ('ticker', 'run_date')]
+    frame = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    frame['run_date'] = pd.to_datetime(frame['run_date'])
+    return frame.set_index(['ticker', 'run_date']).sort_index()
+
+
+# Win-rate change against the realized price change between consecutive run dates, for
+# every ticker at once (tickers missing on either date are skipped, like the notebooks).
+# next_price_return is the move over the following interval, i.e. what the new win
+# rate was trying to predict.
+def snapshot_changes(snapshots, win_rate='total_win_rate'):
+    if snapshots.empty:
+        return pd.DataFrame()
+    win = snapshots[win_rate].unstack('run_date')
+    close = snapshots['close'].unstack('run_date')
+    dates = win.columns
+    win_values, close_values = win.to_numpy(), close.to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price_return = (close_values[:, 1:] / close_values[:, :-1] - 1) * 100
+    next_return = np.full(price_return.shape, np.nan)
+    next_return[:, :-1] = price_return[:, 1:]
+    changes = pd.DataFrame({
+        'ticker': np.repeat(win.index.to_numpy(), len(dates) - 1),
+        'date_before': np.tile(dates[:-1], len(win)),
+        'date_after': np.tile(dates[1:], len(win)),
+        'win_rate_before': win_values[:, :-1].ravel(),
+        'win_rate_after': win_values[:, 1:].ravel(),
+        'win_rate_change': (win_values[:, 1:] - win_values[:, :-1]).ravel(),
+        'close_before': close_values[:, :-1].ravel(),
+        'close_after': close_values[:, 1:].ravel(),
+        'price_change': (close_values[:, 1:] - close_values[:, :-1]).ravel(),
+        'price_return': price_return.ravel(),
+        'next_price_return': next_return.ravel(),
+    })
+    return changes.dropna(subset=['win_rate_change', 'price_change']).reset_index(drop=True)
+
+
+# The notebooks' comparison_results for one pair of run dates
+def compare_snapshots(name, before, after, win_rate='total_win_rate', root=SNAPSHOT_ROOT):
+    before, after = pd.Timestamp(before), pd.Timestamp(after)
+    snapshots = load_snapshots(name, start=min(before, after), end=max(before, after),
+                               columns=['close', win_rate], root=root)
+    if snapshots.empty:
+        return pd.DataFrame()
+    snapshots = snapshots[snapshots.index.get_level_values('run_date').isin([before, after])]
+    return snapshot_changes(snapshots, win_rate)
+
+
+# Rolling evaluation over a range of snapshots: every consecutive pair plus a per-day summary of
+# how well win-rate changes lined up with price moves (correlation and sign agreement)
+def evaluate_snapshots(name, start=None, end=None, win_rate='total_win_rate', root=SNAPSHOT_ROOT):
+    changes = snapshot_changes(load_snapshots(name, start=start, end=end, columns=['close', win_rate], root=root),
+                               win_rate)
+    if changes.empty:
+        return changes, pd.DataFrame()
+    agree = np.sign(changes['win_rate_change']) == np.sign(changes['price_change'])
+    grouped = changes.assign(agree=agree).groupby('date_after')
+    summary = pd.DataFrame({
+        'tickers': grouped.size(),
+        'correlation': grouped[['win_rate_change', 'price_return']].corr().xs('win_rate_change', level=1)['price_return'],
+        'hit_rate': grouped['agree'].mean() * 100,
+        'mean_win_rate_change': grouped['win_rate_change'].mean(),
+        'mean_price_return': grouped['price_return'].mean(),
+    })
+    return changes, summary
+
+
+# Backfill one of the old results_* folders (weighted_win_rates.csv plus {ticker}/{ticker}_stock_data.csv)
+# as the snapshot of run_date; each ticker's csv is read once
+def import_results_folder(name, base_path, run_date, root=SNAPSHOT_ROOT):
+    run_date = pd.Timestamp(run_date)
+    win_rates = pd.read_csv(os.path.join(base_path, 'weighted_win_rates.csv'))
+    closes = {}
+    for ticker in win_rates['ticker']:
+        path = os.path.join(base_path, f"{ticker}", f"{ticker}_stock_data.csv")
+        if not os.path.exists(path):
+            continue
+        data = pd.read_csv(path)
+        data.columns = data.columns.str.strip()
+        data['Date'] = pd.to_datetime(data['Date'], errors='coerce')
+        close = pd.to_numeric(data.set_index('Date')['Close'], errors='coerce')
+        if run_date in close.index:
+            closes[ticker] = close.loc[run_date]
+    win_rates['close'] = win_rates['ticker'].map(closes)
+    return write_snapshot(name, win_rates, run_date, root)
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_runner import run_batch
+from data_provider import safe_name
+
+# 預測快取：data_cache/forecasts/{backend}/{ticker}.parquet (+ .json 記錄輸入雜湊與模型參數)
+FORECAST_ROOT = 'data_cache/forecasts'
+FORECAST_PERIODS = 30
+
+# 便宜後端使用的歷史長度 (交易日)
+TREND_WINDOW = 120
+HOLT_ALPHA = 0.3
+HOLT_BETA = 0.1
+
+BACKENDS = ('prophet', 'linear', 'holt')
+
+
+def series_hash(series, backend, periods):
+    h = hashlib.sha256(f"{backend}:{periods}".encode())
+    h.update(pd.util.hash_pandas_object(series.dropna(), index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _paths(ticker, backend, root):
+    base = os.path.join(root, backend, safe_name(ticker))
+    return f"{base}.parquet", f"{base}.json"
+
+
+def _read_meta(ticker, backend, root):
+    _, meta_path = _paths(ticker, backend, root)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _store(ticker, backend, digest, forecast, model_json, root):
+    data_path, meta_path = _paths(ticker, backend, root)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    forecast.to_parquet(f"{data_path}.tmp")
+    os.replace(f"{data_path}.tmp", data_path)
+    with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'hash': digest, 'model': model_json}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+# 讀取快取的預測；輸入序列改變時回傳 None
+def load_cached(ticker, series, backend='prophet', periods=FORECAST_PERIODS, root=FORECAST_ROOT):
+    meta = _read_meta(ticker, backend, root)
+    if meta.get('hash') != series_hash(series, backend, periods):
+        return None
+    data_path, _ = _paths(ticker, backend, root)
+    return pd.read_parquet(data_path) if os.path.exists(data_path) else None
+
+
+def _future_dates(last_date, periods):
+    return pd.date_range(last_date + pd.Timedelta(days=1), periods=periods, freq='D')
+
+
+# Prophet 權重暖啟動：沿用上次擬合的參數作為初始值
+def _stan_init(params):
+    return {
+        'k': params['k'][0][0],
+        'm': params['m'][0][0],
+        'sigma_obs': params['sigma_obs'][0][0],
+        'delta': params['delta'][0],
+        'beta': params['beta'][0],
+    }
+
+
+def _fit_prophet(series, periods, previous_model):
+    from prophet import Prophet
+    from prophet.serialize import model_from_json, model_to_json
+
+    prophet_df = series.dropna().rename_axis('ds').reset_index(name='y')
+    model = Prophet()
+    fit_kwargs = {}
+    if previous_model:
+        try:
+            fit_kwargs['init'] = _stan_init(model_from_json(previous_model).params)
+        except Exception as e:
+            logging.warning(f"Ignoring unusable warm-start parameters: {e}")
+    model.fit(prophet_df, **fit_kwargs)
+    future = model.make_future_dataframe(periods=periods)
+    return model.predict(future), model_to_json(model)
+
+
+# 對齊多檔序列的最後 window 筆 (右對齊，不足者前面補 NaN)
+def _tail_panel(series_by_ticker, window):
+    tickers = list(series_by_ticker)
+    panel = np.full((window, len(tickers)), np.nan)
+    for j, ticker in enumerate(tickers):
+        values = series_by_ticker[ticker].dropna().to_numpy(dtype=np.float64)[-window:]
+        if len(values):
+            panel[-len(values):, j] = values
+    return tickers, panel
+
+
+# 向量化線性趨勢：一次對所有標的的最近 window 筆做最小平方法
+def linear_trend_panel(panel, periods):
+    t = np.arange(panel.shape[0], dtype=np.float64)[:, None]
+    mask = ~np.isnan(panel)
+    n = mask.sum(axis=0)
+    y = np.where(mask, panel, 0.0)
+    tm = np.where(mask, t, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = tm.sum(axis=0) / n
+        y_mean = y.sum(axis=0) / n
+        cov = (np.where(mask, (t - t_mean) * (panel - y_mean), 0.0)).sum(axis=0)
+        var = (np.where(mask, (t - t_mean) ** 2, 0.0)).sum(axis=0)
+        slope = np.where(var > 0, cov / var, 0.0)
+    intercept = y_mean - slope * t_mean
+    steps = np.arange(panel.shape[0] + periods, dtype=np.float64)[:, None]
+    return intercept + slope * steps
+
+
+# 向量化 Holt 線性指數平滑 (level + trend)，NaN 的時點保持原狀態
+def holt_panel(panel, periods, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+    fitted = np.full((panel.shape[0] + periods, panel.shape[1]), np.nan)
+    level = np.full(panel.shape[1], np.nan)
+    trend = np.zeros(panel.shape[1])
+    for i, y in enumerate(panel):
+        start = np.isnan(level) & ~np.isnan(y)
+        level = np.where(start, y, level)
+        update = ~np.isnan(y) & ~start
+        prev_level = level
+        level = np.where(update, alpha * y + (1 - alpha) * (level + trend), level)
+        trend = np.where(update, beta * (level - prev_level) + (1 - beta) * trend, trend)
+        fitted[i] = level
+    fitted[panel.shape[0]:] = level + trend * np.arange(1, periods + 1)[:, None]
+    return fitted
+
+
+def _panel_forecasts(series_by_ticker, backend, periods):
+    window = TREND_WINDOW
+    tickers, panel = _tail_panel(series_by_ticker, window)
+    if backend == 'linear':
+        fitted = linear_trend_panel(panel, periods)
+    else:
+        fitted = holt_panel(panel, periods)
+    forecasts = {}
+    for j, ticker in enumerate(tickers):
+        history = series_by_ticker[ticker].dropna().index[-window:]
+        if history.empty:
+            continue
+        dates = history.append(_future_dates(history[-1], periods))
+        forecasts[ticker] = pd.DataFrame({'ds': dates, 'yhat': fitted[-len(dates):, j]})
+    return forecasts
+
+
+# 擬合單檔並寫入快取 (可於工作行程中執行)
+def fit_forecast(ticker, series, backend='prophet', periods=FORECAST_PERIODS, root=FORECAST_ROOT):
+    digest = series_hash(series, backend, periods)
+    if backend == 'prophet':
+        previous_model = _read_meta(ticker, backend, root).get('model')
+        forecast, model_json = _fit_prophet(series, periods, previous_model)
+    else:
+        forecast, model_json = _panel_forecasts({ticker: series}, backend, periods)[ticker], None
+    _store(ticker, backend, digest, forecast, model_json, root)
+    return forecast
+
+
+# 取得預測：輸入序列未變就讀快取，否則重新擬合
+def get_forecast(ticker, series, backend='prophet', periods=FORECAST_PERIODS, root=FORECAST_ROOT):
+    forecast = load_cached(ticker, series, backend, periods, root)
+    if forecast is None:
+        forecast = fit_forecast(ticker, series, backend, periods, root)
+    return forecast
+
+
+# 批次預測：只重新擬合輸入有變的標的；Prophet 分散到多個行程，便宜後端一次向量化計算
+def forecast_many(series_by_ticker, backend='prophet', periods=FORECAST_PERIODS, max_workers=None, root=FORECAST_ROOT,
+                  mp_context=None):
+    forecasts = {}
+    stale = {}
+    for ticker, series in series_by_ticker.items():
+        cached = load_cached(ticker, series, backend, periods, root)
+        if cached is None:
+            stale[ticker] = series
+        else:
+            forecasts[ticker] = cached
+    failures = {}
+    if stale and backend == 'prophet':
+        jobs = [(ticker, (ticker, series, backend, periods, root)) for ticker, series in stale.items()]
+        fitted, failures = run_batch(fit_forecast, jobs, max_workers, mp_context=mp_context)
+        forecasts.update(fitted)
+    elif stale:
+        for ticker, forecast in _panel_forecasts(stale, backend, periods).items():
+            _store(ticker, backend, series_hash(stale[ticker], backend, periods), forecast, None, root)
+            forecasts[ticker] = forecast
+    return forecasts, failures
@@ -0,0 +1,154 @@
+import collections
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+
+class ChartCache:
+    """已繪製圖表的 LRU 快取，鍵為 (ticker, chart_type, version)。
+
+    每張圖只在離屏的 Agg 畫布上繪製一次並保存像素；顯示時把圖表換到同一個
+    FigureCanvasTkAgg 上、直接貼回像素，不再重建 Figure 或 Tk 畫布。
+    資料版本改變時同一檔、同一種圖的舊版本會被移除。
+    """
+
+    def __init__(self, render, max_size=48):
+        self.render = render
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.pending = collections.OrderedDict()
+        self.canvas = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticker, chart_type, version):
+        key = (ticker, chart_type, version)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        for stale in [k for k in self.entries if k[:2] == key[:2]]:
+            del self.entries[stale]
+        figure = self.render(ticker, chart_type)
+        if self.canvas is not None:
+            # 以目前畫布的尺寸繪製，顯示時才能直接貼回像素 (create_chart 的固定尺寸幾乎不會相符)
+            figure.set_dpi(self.canvas.figure.dpi)
+            figure.set_size_inches(self.canvas.figure.get_size_inches(), forward=False)
+        agg = FigureCanvasAgg(figure)
+        agg.draw()
+        entry = {'figure': figure, 'region': agg.copy_from_bbox(figure.bbox), 'size': agg.get_width_height()}
+        self.entries[key] = entry
+        self.pending.pop(key, None)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    # 在 tk_canvas 上顯示；第一次呼叫時建立唯一的 FigureCanvasTkAgg
+    def show(self, tk_canvas, ticker, chart_type, version):
+        entry = self.get(ticker, chart_type, version)
+        figure = entry['figure']
+        if self.canvas is None:
+            self.canvas = FigureCanvasTkAgg(figure, tk_canvas)
+            self.canvas.get_tk_widget().pack(side='top', fill='both', expand=1)
+            self.canvas.draw()
+            return
+        # 視窗縮放過時，沿用目前的尺寸並重畫一次
+        figure.set_size_inches(self.canvas.figure.get_size_inches(), forward=False)
+        self.canvas.figure = figure
+        figure.set_canvas(self.canvas)
+        if self.canvas.get_width_height() == entry['size']:
+            self.canvas.restore_region(entry['region'])
+            self.canvas.blit()
+        else:
+            self.canvas.draw()
+            entry['region'] = self.canvas.copy_from_bbox(figure.bbox)
+            entry['size'] = self.canvas.get_width_height()
+
+    # 排入閒置時預先繪製的圖表
+    def prefetch(self, keys):
+        for key in keys:
+            if key not in self.entries:
+                self.pending[key] = True
+                self.pending.move_to_end(key)
+
+    # 閒置時呼叫：繪製一張排隊中的圖表 (最新排入的優先)
+    def render_next(self):
+        if not self.pending:
+            return False
+        key, _ = self.pending.popitem(last=True)
+        self.get(*key)
+        return True
+
+
+class TableRows:
+    """sg.Table 的列快取。
+
+    只重新產生有變動的列；顯示順序不變時直接更新那幾列的 Treeview 項目，
+    順序改變 (排序欄位的值變了或有新標的) 才整張表重設一次。
+    """
+
+    def __init__(self, element, make_row):
+        self.element = element
+        self.make_row = make_row
+        self.tickers = []
+        self.rows = {}
+        self.order = []
+        self.sort_column = None
+        self.reverse = False
+
+    def set_tickers(self, tickers):
+        self.tickers = list(tickers)
+        self.rows = {}
+        self.refresh(self.tickers, full=True)
+
+    def _sorted(self):
+        order = [ticker for ticker in self.tickers if ticker in self.rows]
+        if self.sort_column is None:
+            return order
+        column = self.sort_column
+        return sorted(order, key=lambda t: self.rows[t][column] if self.rows[t][column] != 'N/A' else -float('inf'),
+                      reverse=self.reverse)
+
+    # 以變動的標的更新表格；回傳實際改變的標的
+    def refresh(self, changed, full=False):
+        updated = []
+        for ticker in changed:
+            if ticker not in self.tickers:
+                continue
+            row = self.make_row(ticker)
+            if row is None or row == self.rows.get(ticker):
+                continue
+            self.rows[ticker] = row
+            updated.append(ticker)
+        order = self._sorted()
+        if full or order != self.order:
+            self.order = order
+            self.element.update(values=[self.rows[ticker] for ticker in order])
+        else:
+            positions = {ticker: i for i, ticker in enumerate(self.order)}
+            for ticker in updated:
+                self._set_row(positions[ticker], self.rows[ticker])
+        return updated
+
+    def _set_row(self, position, row):
+        tree = getattr(self.element, 'TKTreeview', None)
+        ids = getattr(self.element, 'tree_ids', None)
+        if tree is None or ids is None or position >= len(ids):
+            self.element.update(values=[self.rows[ticker] for ticker in self.order])
+            return
+        tree.item(ids[position], values=row)
+        self.element.Values[position] = row
+
+    # 點擊表頭：同一欄再點一次反向排序
+    def sort(self, column):
+        if column == self.sort_column:
+            self.reverse = not self.reverse
+        else:
+            self.sort_column = column
+            self.reverse = False
+        self.refresh([], full=True)
+
+    def ticker_at(self, position):
+        return self.order[position] if 0 <= position < len(self.order) else None
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+# 新聞快取：data_cache/news/{url 雜湊}.json，超過 TTL 才重新下載
+NEWS_CACHE_ROOT = 'data_cache/news'
+NEWS_TTL = 1800
+
+GOOGLE_NEWS_RSS = 'https://news.google.com/rss/search'
+
+
+def google_news_url(query, base_url=GOOGLE_NEWS_RSS):
+    return f"{base_url}?q={quote_plus(query)}&hl=en-US&gl=US&ceid=US:en"
+
+
+class NewsClient:
+    """共用連線池的非同步新聞下載器。
+
+    同一次 fetch 中重複的網址只下載一次 (同時進行的多次 fetch 之間不共用請求)，
+    每個主機的同時連線數受 per_host 限制，結果依網址快取在磁碟上。
+    """
+
+    def __init__(self, ttl=NEWS_TTL, root=NEWS_CACHE_ROOT, per_host=4, total=16, timeout=15, retries=2):
+        self.ttl = ttl
+        self.root = root
+        self.per_host = per_host
+        self.total = total
+        self.timeout = timeout
+        self.retries = retries
+        self.errors = {}
+
+    def _cache_path(self, url):
+        return os.path.join(self.root, f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+    def load_cached(self, url):
+        path = self._cache_path(url)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+        if time.time() - entry['fetched_at'] > self.ttl:
+            return None
+        return entry['body']
+
+    def _store(self, url, body):
+        path = self._cache_path(url)
+        os.makedirs(self.root, exist_ok=True)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'fetched_at': time.time(), 'body': body}, f)
+        os.replace(f"{path}.tmp", path)
+
+    async def _get(self, session, url):
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    body = await response.text()
+                self._store(url, body)
+                return body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    self.errors[url] = str(e) or type(e).__name__
+                    logging.warning(f"News download failed for {urlsplit(url).netloc}: {self.errors[url]}")
+                    return None
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    # 下載多個網址，回傳 {url: 內容}；失敗者為 None
+    async def fetch_async(self, urls):
+        bodies = {}
+        stale = []
+        for url in dict.fromkeys(urls):
+            cached = self.load_cached(url)
+            if cached is None:
+                stale.append(url)
+            else:
+                bodies[url] = cached
+        if stale:
+            connector = aiohttp.TCPConnector(limit=self.total, limit_per_host=self.per_host)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                results = await asyncio.gather(*(self._get(session, url) for url in stale))
+            bodies.update(zip(stale, results))
+        return bodies
+
+    # 同步介面；在已有事件迴圈的環境 (如 Jupyter) 改在另一個執行緒執行
+    def fetch(self, urls):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_async(urls))
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.fetch_async(urls)).result()
+
+
+# 解析 RSS 項目
+def parse_rss(body, limit=50):
+    if not body:
+        return []
+    soup = BeautifulSoup(body, features='xml')
+    items = []
+    for item in soup.find_all('item')[:limit]:
+        items.append({
+            'title': item.title.text if item.title else '',
+            'description': item.description.text if item.description else '',
+            'link': item.link.text if item.link else '',
+        })
+    return items
+
+
+# 批次抓取 Google News RSS：查詢字串相同者只下載一次，回傳 {query: [項目]}
+def fetch_rss_many(queries, client=None, base_url=GOOGLE_NEWS_RSS, limit=50):
+    client = client or NewsClient()
+    urls = {query: google_news_url(query, base_url) for query in dict.fromkeys(queries)}
+    bodies = client.fetch(urls.values())
+    return {query: parse_rss(bodies.get(url), limit) for query, url in urls.items()}
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+import yfinance as yf
+
+import tracing
+from data_provider import safe_name
+
+# 參考資料快取：data_cache/reference/{kind}/{key}.parquet (+ .json 記錄下載時間)
+# 財報每季、總經數據每月才更新，超過各自的 TTL 才重新下載
+REFERENCE_ROOT = 'data_cache/reference'
+
+DAY = 86400
+FINANCIALS_TTL = 7 * DAY
+
+# 年度財報在會計期間結束後約 90 天內公告，公告前不可使用 (避免前視偏差)
+FINANCIALS_LAG = pd.Timedelta(days=90)
+
+# 總經序列：名稱 -> (FRED 代碼, TTL 秒數, 公布延遲)
+# FRED 以期間起始日標記觀測值 (例如 1 月 CPI 標為 1/1、2 月中才公布)；此處使用最新修正值，
+# 不追溯當時的初值
+MACRO_SERIES = {
+    'GDP': ('GDP', 30 * DAY, pd.Timedelta(days=120)),
+    'CPI': ('CPIAUCSL', 7 * DAY, pd.Timedelta(days=45)),
+    'Unemployment Rate': ('UNRATE', 7 * DAY, pd.Timedelta(days=36)),
+}
+
+FRED_CSV_URL = 'https://fred.stlouisfed.org/graph/fredgraph.csv?id={series}'
+
+
+class ReferenceCache:
+    """依序列各自 TTL 保存在磁碟上的參考資料 (財報、總經)。
+
+    快取未過期時完全不連網；下載失敗時沿用過期的快取並記錄警告。
+    offline=True 時只讀磁碟 (例如把 root 指向測試用的固定資料目錄)。
+    """
+
+    def __init__(self, root=REFERENCE_ROOT, offline=False):
+        self.root = root
+        self.offline = offline
+
+    def _paths(self, kind, key):
+        base = os.path.join(self.root, kind, safe_name(key))
+        return f"{base}.parquet", f"{base}.json"
+
+    def load(self, kind, key):
+        data_path, meta_path = self._paths(kind, key)
+        if not os.path.exists(data_path):
+            return None, None
+        fetched_at = None
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                fetched_at = json.load(f).get('fetched_at')
+        return pd.read_parquet(data_path), fetched_at
+
+    def store(self, kind, key, frame):
+        data_path, meta_path = self._paths(kind, key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        frame.to_parquet(f"{data_path}.tmp")
+        os.replace(f"{data_path}.tmp", data_path)
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'fetched_at': time.time()}, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    # 取得一個序列：快取未超過 ttl 時直接回傳，否則呼叫 fetch() 重新下載並寫回
+    def get(self, kind, key, fetch, ttl):
+        cached, fetched_at = self.load(kind, key)
+        if cached is not None and (self.offline or (fetched_at is not None and time.time() - fetched_at <= ttl)):
+            tracing.count('reference_hits', ticker=key)
+            return cached
+        if self.offline:
+            return None
+        tracing.count('reference_misses', ticker=key)
+        try:
+            with tracing.span('fetch', key, kind=kind):
+                frame = fetch()
+        except Exception as e:
+            if cached is None:
+                logging.warning(f"Reference download failed for {kind}/{key}: {e}")
+                return None
+            logging.warning(f"Reference download failed for {kind}/{key}, using the cached copy: {e}")
+            return cached
+        self.store(kind, key, frame)
+        return frame
+
+
+# 年度財報 (yfinance 的 financials，列為科目、欄為會計期間) 轉成每期一列
+def fetch_financials(ticker):
+    financials = yf.Ticker(ticker).financials
+    frame = financials.T.apply(pd.to_numeric, errors='coerce')
+    frame.index = pd.to_datetime(frame.index)
+    frame.index.name = 'period_end'
+    frame.columns = [str(column) for column in frame.columns]
+    return frame.sort_index()
+
+
+def fetch_fred(series):
+    frame = pd.read_csv(FRED_CSV_URL.format(series=series), index_col=0, parse_dates=True, na_values='.')
+    frame.index.name = 'date'
+    return frame.iloc[:, :1].set_axis([series], axis=1).astype('float64')
+
+
+# 多檔標的的財報，整理成 ticker, period_end, available_date, <科目...> 的長表
+def get_financials(tickers, cache=None, ttl=FINANCIALS_TTL, lag=FINANCIALS_LAG):
+    cache = cache or ReferenceCache()
+    frames = []
+    for ticker in dict.fromkeys(tickers):
+        frame = cache.get('financials', ticker, lambda: fetch_financials(ticker), ttl)
+        if frame is None or frame.empty:
+            continue
+        frame = frame.reset_index()
+        frame.insert(0, 'ticker', ticker)
+        frame.insert(2, 'available_date', frame['period_end'] + lag)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['ticker', 'period_end', 'available_date'])
+    return pd.concat(frames, ignore_index=True).sort_values(['ticker', 'available_date'], kind='stable')
+
+
+# 總經序列合併成一張以公布日為索引的表：每個日期為當時已公布的最新值 (向前填補)
+def get_macro(series=None, cache=None):
+    cache = cache or ReferenceCache()
+    columns = {}
+    for name in series or MACRO_SERIES:
+        code, ttl, lag = MACRO_SERIES[name]
+        frame = cache.get('macro', code, lambda: fetch_fred(code), ttl)
+        if frame is None or frame.empty:
+            continue
+        values = frame.iloc[:, 0].dropna()
+        values.index = values.index + lag
+        columns[name] = values
+    if not columns:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='available_date'))
+    macro = pd.DataFrame(columns).sort_index().ffill()
+    macro.index.name = 'available_date'
+    return macro
+
+
+# 時間點一致的 as-of 合併：每一列 (ticker, date) 取 available_date <= date 的最新財報與總經值，
+# 不會用到當天之後才公布的資料。panel 可為含 ticker/date 欄的長表 (results_dataset 格式)，
+# 或以 (Ticker, Date) 為索引的特徵表 (stack_features 格式)；回傳相同形狀與列順序。
+def asof_join(panel, financials=None, macro=None, fields=None):
+    indexed = isinstance(panel.index, pd.MultiIndex)
+    long = panel.reset_index() if indexed else panel
+    ticker_col, date_col = ('Ticker', 'Date') if indexed else ('ticker', 'date')
+    keys = long[[ticker_col, date_col]].rename(columns={ticker_col: 'ticker', date_col: 'date'})
+    # yfinance history() dates are tz-aware (exchange time); compare on the naive calendar date
+    dates = pd.to_datetime(keys['date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    keys['date'] = dates.astype('datetime64[ns]')
+    keys['_row'] = range(len(keys))
+    keys = keys.sort_values('date', kind='stable')
+    joined = keys
+    if financials is not None and not financials.empty:
+        right = financials.drop(columns=['period_end'])
+        if fields is not None:
+            right = right[['ticker', 'available_date'] + [f for f in fields if f in right.columns]]
+        right = right.astype({'available_date': 'datetime64[ns]'}).sort_values('available_date', kind='stable')
+        joined = pd.merge_asof(joined, right, left_on='date', right_on='available_date', by='ticker',
+                               direction='backward').drop(columns=['available_date'])
+    if macro is not None and not macro.empty:
+        right = macro.reset_index().astype({'available_date': 'datetime64[ns]'})
+        joined = pd.merge_asof(joined, right, left_on='date', right_on='available_date',
+                               direction='backward').drop(columns=['available_date'])
+    joined = joined.sort_values('_row').drop(columns=['ticker', 'date', '_row'])
+    joined.index = panel.index
+    return pd.concat([panel, joined], axis=1)
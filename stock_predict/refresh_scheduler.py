@@ -0,0 +1,166 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_provider import MARKET_HOURS, is_market_open, last_close, market_of
+
+
+class RefreshScheduler:
+    """背景更新排程器。
+
+    refresh(tickers, cancelled) 在有上限的執行緒池中處理一批標的，回傳成功更新的標的；
+    cancelled() 為 True 時應盡快結束 (停止或這批標的已不在觀察清單中)。
+    挑選順序：手動要求的、畫面上看得到的，再依資料由舊到新。
+    開盤中的市場每 interval 秒更新一次；收盤後只在收盤價還沒抓到時再抓一次，不輪詢休市的市場。
+    """
+
+    def __init__(self, refresh, interval=300, max_workers=2, batch_size=8, on_update=None,
+                 close_grace=900, poll_seconds=1.0):
+        self.refresh = refresh
+        self.interval = interval
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.on_update = on_update
+        self.close_grace = close_grace
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Condition()
+        self.watchlist = []
+        self.visible = set()
+        self.forced = set()
+        self.in_flight = set()
+        self.last_refresh = {}  # 最後一次成功更新的時間 (資料年齡)
+        self.last_attempt = {}  # 最後一次嘗試的時間 (失敗時隔 interval 再試)
+        self.errors = {}
+        self.queue_depth = 0
+        self.running = 0
+        self.stopped = threading.Event()
+        self.pool = None
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='refresh')
+        self.thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+        self.thread.start()
+
+    # 停止排程；執行中的批次會收到 cancelled() == True，尚未開始的批次直接取消
+    def stop(self, wait=True):
+        self.stopped.set()
+        with self.lock:
+            self.lock.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
+
+    # 更換觀察清單：不在新清單中的標的不再排入，執行中的批次若已全部移除則中止
+    def set_watchlist(self, tickers):
+        with self.lock:
+            self.watchlist = list(dict.fromkeys(tickers))
+            self.forced &= set(self.watchlist)
+            self.lock.notify_all()
+
+    def set_visible(self, tickers):
+        with self.lock:
+            self.visible = set(tickers)
+            self.lock.notify_all()
+
+    # 立即更新 (預設整個觀察清單)
+    def request(self, tickers=None):
+        with self.lock:
+            self.forced |= set(self.watchlist if tickers is None else tickers) & set(self.watchlist)
+            self.lock.notify_all()
+
+    # 每個市場目前是否開盤、最近一次收盤 (秒)
+    def _sessions(self, now):
+        return {market: (is_market_open(market, now), last_close(market, now).timestamp()) for market in MARKET_HOURS}
+
+    def _due(self, ticker, now, sessions):
+        if ticker in self.forced or ticker not in self.last_attempt:
+            return True
+        is_open, closed_at = sessions[market_of(ticker)]
+        if is_open or now < closed_at + self.close_grace:
+            return now - self.last_attempt[ticker] >= self.interval
+        # 休市中：只要收盤後 (含寬限時間) 已成功抓過一次就不再輪詢
+        return (self.last_refresh.get(ticker, 0.0) < closed_at + self.close_grace
+                and now - self.last_attempt[ticker] >= self.interval)
+
+    def _queue(self, now):
+        sessions = self._sessions(pd.Timestamp(now, unit='s', tz='UTC'))
+        due = [t for t in self.watchlist if t not in self.in_flight and self._due(t, now, sessions)]
+        due.sort(key=lambda t: (t not in self.forced, t not in self.visible, self.last_refresh.get(t, 0.0)))
+        return due
+
+    def _run(self):
+        with self.lock:
+            while not self.stopped.is_set():
+                due = self._queue(time.time())
+                while due and self.running < self.max_workers:
+                    batch, due = due[:self.batch_size], due[self.batch_size:]
+                    self.in_flight |= set(batch)
+                    self.forced -= set(batch)
+                    self.running += 1
+                    self.pool.submit(self._work, batch)
+                self.queue_depth = len(due)
+                self.lock.wait(timeout=self.poll_seconds)
+
+    def _cancelled(self, batch):
+        return self.stopped.is_set() or not set(batch) & set(self.watchlist)
+
+    def _work(self, batch):
+        started = time.time()
+        error = None
+        try:
+            updated = list(self.refresh(batch, lambda: self._cancelled(batch)) or [])
+        except Exception as e:
+            updated = []
+            error = str(e)
+        with self.lock:
+            for ticker in batch:
+                self.in_flight.discard(ticker)
+                self.last_attempt[ticker] = started
+            for ticker in updated:
+                self.last_refresh[ticker] = started
+                self.errors.pop(ticker, None)
+            reason = error or ('cancelled' if self._cancelled(batch) else 'no result')
+            for ticker in set(batch) - set(updated):
+                self.errors[ticker] = reason
+            self.running -= 1
+            watched = set(self.watchlist)
+            self.lock.notify_all()
+        if self.on_update is not None:
+            for ticker in updated:
+                if ticker in watched and not self.stopped.is_set():
+                    self.on_update(ticker)
+
+    # 每檔的資料年齡與狀態
+    def status(self):
+        now = time.time()
+        with self.lock:
+            sessions = self._sessions(pd.Timestamp(now, unit='s', tz='UTC'))
+            due = set(self._queue(now))
+            rows = [{
+                'ticker': ticker,
+                'age_seconds': now - self.last_refresh[ticker] if ticker in self.last_refresh else np.nan,
+                'state': 'running' if ticker in self.in_flight else 'queued' if ticker in due else 'idle',
+                'visible': ticker in self.visible,
+                'market_open': sessions[market_of(ticker)][0],
+                'error': self.errors.get(ticker),
+            } for ticker in self.watchlist]
+        return pd.DataFrame(rows, columns=['ticker', 'age_seconds', 'state', 'visible', 'market_open', 'error']).set_index('ticker')
+
+    # 佇列深度與最舊資料的年齡 (秒)，供畫面顯示
+    def summary(self):
+        now = time.time()
+        with self.lock:
+            ages = [now - self.last_refresh[t] if t in self.last_refresh else np.inf for t in self.watchlist]
+            return {
+                'queue_depth': self.queue_depth,
+                'in_flight': len(self.in_flight),
+                'loaded': sum(t in self.last_refresh for t in self.watchlist),
+                'tickers': len(self.watchlist),
+                'oldest_age': max(ages) if ages else 0.0,
+            }
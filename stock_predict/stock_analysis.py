@@ -10,22 +10,35 @@ import seaborn as sns
 import mplfinance as mpf
 import logging
 import datetime
-import requests
-from bs4 import BeautifulSoup
+import os
+import sys
 from textblob import TextBlob
-import time
+from news_client import fetch_rss_many
+from walk_forward import WalkForwardTrainer, stack_features
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from return_stats import stats_for_frames
+from reference_data import asof_join, get_macro
+from ticker_registry import TW_INDUSTRIES, get_universe
+import tracing
+
+def news_query(ticker):
+    return f"{ticker} stock"
+
+# Download every ticker/keyword feed concurrently; get_news then reads the cache
+@tracing.traced('download')
+def prefetch_news(terms):
+    return fetch_rss_many([news_query(term) for term in terms])
+
+@tracing.traced('news', 'ticker')
 def get_news(ticker):
-    # Simulated news fetching function
-    url = f"https://news.google.com/rss/search?q={ticker}+stock&hl=en-US&gl=US&ceid=US:en"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, features='xml')
-    news_items = soup.findAll('item')
+    query = news_query(ticker)
+    news_items = fetch_rss_many([query])[query]
     
     news_list = []
     for item in news_items[:50]:  # Get top 20 news
-        title = item.title.text
-        description = item.description.text
+        title = item['title']
+        description = item['description']
         sentiment = TextBlob(title + " " + description).sentiment.polarity
         news_list.append({
             'title': title,
@@ -42,11 +55,14 @@ def analyze_news(news_list):
     avg_sentiment = sum(news['sentiment'] for news in news_list) / len(news_list)
     return avg_sentiment
 
+@tracing.traced('download', 'ticker')
 def get_stock_data(ticker, start_date, end_date):
     stock = yf.Ticker(ticker)
     df = stock.history(start=start_date, end=end_date)
+    tracing.count('rows', len(df), ticker)
     return df
 
+@tracing.traced('indicators')
 def calculate_technical_indicators(df):
     df['SMA_20'] = df['Close'].rolling(window=20).mean()
     df['SMA_50'] = df['Close'].rolling(window=50).mean()
@@ -67,8 +83,7 @@ def calculate_sharpe_ratio(returns, risk_free_rate=0.02):
 def calculate_max_drawdown(df):
     roll_max = df['Close'].rolling(window=252, min_periods=1).max()
     daily_drawdown = df['Close'] / roll_max - 1.0
-    max_daily_drawdown = daily_drawdown.rolling(window=252, min_periods=1).min()
-    return max_daily_drawdown.min()
+    return daily_drawdown.min()
 
 def prepare_features(df):
     df = df.copy()  # Create a distinct copy
@@ -79,13 +94,15 @@ def prepare_features(df):
     y = df['Target']
     return X, y
 
+# Single-ticker fallback: hold out the most recent 20% instead of a random split
+@tracing.traced('model')
 def train_model(X, y):
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
     model.fit(X_train_scaled, y_train)
     
     y_pred = model.predict(X_test_scaled)
@@ -93,17 +110,44 @@ def train_model(X, y):
     
     return model, scaler, accuracy, classification_report(y_test, y_pred)
 
-def analyze_stock(ticker, start_date, end_date, industry_keywords):
+# One walk-forward model for the whole universe; only days after the last run are trained.
+# macro (reference_data.get_macro) adds the macro values known on each day as features; that
+# model is kept under its own name since its feature set differs.
+@tracing.traced('model')
+def train_universe(frames, name='stock_analysis', macro=None):
+    X, y = stack_features({ticker: prepare_features(df.dropna()) for ticker, df in frames.items()})
+    if macro is not None and not macro.empty and not X.empty:
+        X = asof_join(X, macro=macro).dropna()
+        y = y.loc[X.index]
+        name = f"{name}_macro"
+    trainer = WalkForwardTrainer(name)
+    folds = trainer.update(X, y)
+    for fold in folds.itertuples():
+        logging.info(f"Fold {fold.fold} ({fold.test_start} - {fold.test_end}): accuracy {fold.score:.3f}, "
+                     f"{fold.trees} trees, fit {fold.fit_seconds:.2f}s")
+    return trainer
+
+# stats: universe-wide stats_for_frames output; without it the ratios are computed for this ticker only
+@tracing.traced('analyze', 'ticker')
+def analyze_stock(ticker, start_date, end_date, industry_keywords, df=None, trainer=None, stats=None):
     try:
-        df = get_stock_data(ticker, start_date, end_date)
-        df = calculate_technical_indicators(df)
+        if df is None:
+            df = calculate_technical_indicators(get_stock_data(ticker, start_date, end_date))
         
-        returns = df['Close'].pct_change().dropna()
-        sharpe_ratio = calculate_sharpe_ratio(returns)
-        max_drawdown = calculate_max_drawdown(df)
+        if stats is not None and ticker in stats.index:
+            sharpe_ratio = stats.at[ticker, 'sharpe_ratio']
+            max_drawdown = stats.at[ticker, 'max_drawdown']
+        else:
+            returns = df['Close'].pct_change().dropna()
+            sharpe_ratio = calculate_sharpe_ratio(returns)
+            max_drawdown = calculate_max_drawdown(df)
         
-        X, y = prepare_features(df.dropna())
-        model, scaler, accuracy, report = train_model(X, y)
+        evaluation = trainer.ticker_report(ticker) if trainer is not None else None
+        if evaluation is not None:
+            accuracy, report = evaluation
+        else:
+            X, y = prepare_features(df.dropna())
+            model, scaler, accuracy, report = train_model(X, y)
         
         technical_score = 0
         if df['Close'].iloc[-1] > df['SMA_20'].iloc[-1]:
@@ -152,15 +196,9 @@ def generate_report(results, start_date, end_date):
     report += f"   - 平均情感得分: {avg_sentiment:.2f}\n\n"
     
     # 2. 行業分析
-    industries = {
-        '半導體': ['2330.TW', '2303.TW', '2454.TW'],
-        '電子零組件': ['2317.TW', '2354.TW', '2382.TW'],
-        '金融': ['2882.TW', '2881.TW', '2891.TW'],
-        '通訊網路': ['2412.TW', '3045.TW', '4904.TW']
-    }
-    
     report += "2. 行業分析\n"
-    for industry, tickers in industries.items():
+    for industry in TW_INDUSTRIES:
+        tickers = get_universe(f"tw_industry:{industry}")
         industry_results = [r for r in results if r['ticker'] in tickers]
         avg_tech_score = np.mean([r['technical_score'] for r in industry_results])
         avg_sharpe = np.mean([r['sharpe_ratio'] for r in industry_results])
@@ -220,9 +258,7 @@ def main():
     start_date = '2022-01-01'
     end_date = datetime.datetime.now().strftime('%Y-%m-%d')
     
-    tickers = ['2330.TW', '2317.TW', '2454.TW', '2412.TW', '2308.TW', 
-               '2881.TW', '1303.TW', '2882.TW', '2303.TW', '2002.TW',
-               '0050.TW', '0056.TW', '00878.TW', '00881.TW']
+    tickers = get_universe('tw_analysis')
     
     industry_keywords = {
         '半導體': ['semiconductor', 'chip', '半導體'],
@@ -231,19 +267,36 @@ def main():
         '通訊網路': ['communication', 'network', '通訊網路']
     }
     
-    results = []
+    # industry_keywords is keyed by industry; each ticker gets the keywords of its industry
+    ticker_keywords = {ticker: industry_keywords.get(industry, [])
+                       for industry in TW_INDUSTRIES for ticker in get_universe(f"tw_industry:{industry}")}
+
+    # Identical keyword queries are downloaded once for the whole run
+    prefetch_news(tickers + [keyword for ticker in tickers for keyword in ticker_keywords.get(ticker, [])])
+    
+    frames = {}
     for ticker in tickers:
+        try:
+            frames[ticker] = calculate_technical_indicators(get_stock_data(ticker, start_date, end_date))
+        except Exception as e:
+            logging.error(f"Error downloading {ticker}: {str(e)}")
+    # Macro series are cached per series TTL, so most runs read them from disk
+    trainer = train_universe(frames, macro=get_macro())
+    stats = stats_for_frames(frames)
+    
+    results = []
+    for ticker in frames:
         logging.info(f"分析股票 {ticker}")
-        result = analyze_stock(ticker, start_date, end_date, industry_keywords.get(ticker, []))
+        result = analyze_stock(ticker, start_date, end_date, ticker_keywords.get(ticker, []),
+                               df=frames[ticker], trainer=trainer, stats=stats)
         if result:
             results.append(result)
         logging.info(f"{ticker} 分析完成")
-        time.sleep(1)  # Avoid too frequent requests
     
     if results:
         report = generate_report(results, start_date, end_date)
         
-        with open('stock_analysis_report.txt', 'w', encoding='utf-8') as f:
+        with tracing.span('write'), open('stock_analysis_report.txt', 'w', encoding='utf-8') as f:
             f.write(report)
         
         logging.info("報告已生成並保存為 stock_analysis_report.txt")
@@ -251,4 +304,5 @@ def main():
         logging.error("沒有成功分析任何股票，無法生成報告。")
         
 if __name__ == "__main__":
-    main()
+    with tracing.session('stock_analysis'):
+        main()
@@ -1,31 +1,46 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from prophet import Prophet
-import talib
-import requests
 from bs4 import BeautifulSoup
 import os
 import PySimpleGUI as sg
 import threading
+import multiprocessing
 import queue
 import time
 from datetime import datetime, timedelta
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.font_manager as fm
+from matplotlib.figure import Figure
+import sys
 # 设置日志
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 共用模組位於專案根目錄
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bar_store import get_bars, refresh_many
+from data_provider import is_market_open, market_of, safe_name
+from indicator_engine import ANALYZER_SPECS, compute_frame
+from institutional_store import institutional_trading
+from return_stats import compute_return_stats
+from snapshot_store import write_snapshot
+from streaming_indicators import IndicatorSet
+from ticker_registry import get_universe
+import tracing
+from forecasting import forecast_many, get_forecast
+from news_client import NewsClient
+from gui_cache import ChartCache, TableRows
+from stock_cache import StockDataCache
+from refresh_scheduler import RefreshScheduler
+
+tracing.configure_logging()  # 等級由 STOCK_LOG_LEVEL 設定，預設 INFO
 
 # 設置Seaborn樣式
 sns.set(style='whitegrid')
 
 font_path = "/Users/tangjiahong/Dropbox/Pytorch/stock_env/TaipeiSansTCBeta-Regular.ttf"
 if not os.path.exists(font_path):
-    print(f"Font file not found: {font_path}")
+    logging.warning(f"Font file not found: {font_path}")
     # 如果找不到字体文件，可以尝试使用系统默认字体
     font_path = None
 
@@ -42,25 +57,59 @@ else:
 plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']  # 使用一个通用的中文字体
 plt.rcParams['axes.unicode_minus'] = False
 
-# 定義股票列表
-STOCKS = ["2330.TW", "2317.TW", "2382.TW", "2303.TW", "1216.TW", "3711.TW", "1303.TW", "2002.TW", "1301.TW", "3231.TW",
-          "3045.TW", "2542.TW", "2449.TW", "5388.TW", "2376.TW", "2603.TW", "3035.TW", "2356.TW", "2357.TW", "2383.TW",
-          "2360.TW", "2454.TW", "6505.TW", "2412.TW", "2308.TW", "2881.TW", "3017.TW", "3006.TW", "2408.TW", "2344.TW",
-          "8046.TW", "3037.TW", "2891.TW", "2882.TW", "2353.TW", "1513.TW", "8996.TW", "6282.TW", "1795.TW", "2388.TW"]
+# 定義股票列表 (由 ticker_registry 統一維護)
+STOCKS = get_universe('tw_analyzer_stocks')
 
-ETFS = ["00929.TW", "00712.TW", "00637L.TW", "2884.TW", "00650L.TW", "2886.TW", "2892.TW", "00893.TW", "00706L.TW", "2880.TW", 
-        "00830.TW", "00900.TW", "0050.TW", "5880.TW", "00673R.TW", "00715L.TW", "00633L.TW", "2812.TW", "00885.TW", "00895.TW", 
-        "00662.TW", "00888.TW", "00646.TW", "00903.TW", "00683L.TW", "00642U.TW", "00770.TW", "00762.TW", "0051.TW", "00851.TW", 
-        "006203.TW", "00660.TW"]
+ETFS = get_universe('tw_analyzer_etfs')
 
-# 全局變量
-stock_data = {}
+# 全局變量 (分析結果快取：摘要常駐，歷史資料壓縮後溢出到磁碟，常駐的整表不超過 STOCK_DATA_BUDGET)
+STOCK_DATA_BUDGET = 64 * 1024 * 1024
+stock_data = StockDataCache(memory_budget=STOCK_DATA_BUDGET)
+data_versions = {}  # 每次更新 stock_data[ticker] 加一，圖表快取以此判斷是否過期
 data_queue = queue.Queue()
 
+# 圖表下拉選單對應 create_chart 的 chart_type
+CHART_TYPES = {'價格走勢': 'price', '成交量': 'volume', 'MACD': 'macd', 'RSI': 'rsi',
+               '布林通道': 'bollinger', '三大法人買賣': 'institutional'}
+
+TABLE_KEYS = ['current_price', 'daily_change', 'weekly_change', 'MA10', 'MA20', 'RSI', 'MACD', 'additional_win_rate', 'volume']
+
+# 更新事件合併後每個畫面最多刷新一次表格
+FRAME_MS = 100
+
+# 背景更新：開盤中每檔每 5 分鐘一次，表格前 VISIBLE_ROWS 列與選取的標的優先
+REFRESH_INTERVAL = 300
+REFRESH_WORKERS = 2
+VISIBLE_ROWS = 15
+snapshot_lock = threading.Lock()
+
+# 增量指標狀態 (可序列化，重新啟動後續用)
+INDICATOR_STATE_DIR = 'data_cache/indicator_state'
+indicator_states = {}
+indicator_history = {}
+
+# 預測後端：'prophet' 較準但慢；'linear'、'holt' 為向量化的快速替代
+# 開盤中收盤價每 5 分鐘就變，改用快速後端，Prophet 只在收盤後擬合一次
+FORECAST_BACKEND = 'prophet'
+INTRADAY_FORECAST_BACKEND = 'linear'
+
+# 收盤後的 Prophet 擬合分散到有上限的行程池：以 spawn 啟動 (從多執行緒的 Tk 行程 fork
+# 可能死鎖)，並以 forecast_lock 確保兩個更新執行緒同時只有一個行程池
+FORECAST_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+forecast_context = multiprocessing.get_context('spawn')
+forecast_lock = threading.Lock()
+
+def forecast_backend(ticker):
+    return INTRADAY_FORECAST_BACKEND if is_market_open(market_of(ticker)) else FORECAST_BACKEND
+
+news_client = NewsClient()
+
+def news_url(ticker):
+    return f"https://tw.stock.yahoo.com/q/h?s={ticker}"
+
 def fetch_news(ticker):
-    url = f"https://tw.stock.yahoo.com/q/h?s={ticker}"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    url = news_url(ticker)
+    soup = BeautifulSoup(news_client.fetch([url])[url] or '', 'html.parser')
     news_items = soup.find_all('li', class_='js-stream-content')
 
     news_list = []
@@ -71,26 +120,46 @@ def fetch_news(ticker):
     
     return news_list
 
+# 三大法人買賣超：讀取 institutional_store 匯入的證交所 T86 全市場日報 (近 30 個交易日)；
+# 未匯入或非上市股票時為空表
 def fetch_institutional_trading(ticker):
-    # 模擬機構交易數據
-    dates = pd.date_range(end=pd.Timestamp('today'), periods=30)
-    data = {
-        'Date': dates,
-        'Foreign_Investor_Buy': np.random.randint(100, 1000, size=30),
-        'Foreign_Investor_Sell': np.random.randint(100, 1000, size=30),
-        'Investment_Trust_Buy': np.random.randint(100, 1000, size=30),
-        'Investment_Trust_Sell': np.random.randint(100, 1000, size=30),
-        'Dealer_Buy': np.random.randint(100, 1000, size=30),
-        'Dealer_Sell': np.random.randint(100, 1000, size=30)
-    }
-    df = pd.DataFrame(data)
-    return df
-
-def analyze_stock(ticker):
+    return institutional_trading(ticker, days=30)
+
+@tracing.traced('indicators', 'ticker')
+def update_indicators(ticker, df):
+    # 只把上次處理之後的新K棒餵進增量指標，回傳完整歷史的指標欄位
+    bars = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+    path = os.path.join(INDICATOR_STATE_DIR, f"{safe_name(ticker)}.json")
+    state = indicator_states.get(ticker) or IndicatorSet.load(path)
+    history = indicator_history.get(ticker)
+
+    if state is None or state.last_date not in bars.index or not state.matches(bars):
+        # 沒有可用狀態，或 bar_store 在分割/除息後重新下載了調整後的歷史：從頭逐筆建立
+        state = IndicatorSet(ANALYZER_SPECS)
+        history = state.update_frame(bars)
+    else:
+        if history is None:
+            # 重新啟動後狀態可續用，舊的歷史欄位以向量化引擎一次補齊
+            history = compute_frame(bars[bars.index < state.last_date], ANALYZER_SPECS)[state.columns]
+        history = pd.concat([history[history.index < state.last_date], state.update_frame(bars)])
+
+    indicator_states[ticker] = state
+    indicator_history[ticker] = history
+    state.save(path)
+    return history.reindex(df.index)
+
+# 讀取4年歷史資料 (analyze_stock 與預先擬合共用，確保預測快取的輸入一致)
+@tracing.traced('download', 'ticker')
+def load_history(ticker):
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=365*4)  # 获取4年的数据
+    return get_bars(ticker, start=start_date, end=end_date, max_age=300)
+
+# stats: compute_return_stats 對整個清單一次算好的結果；沒有時只算這一檔
+@tracing.traced('analyze', 'ticker')
+def analyze_stock(ticker, stats=None):
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365*4)  # 获取4年的数据
-        data = yf.download(ticker, start=start_date, end=end_date)
+        data = load_history(ticker)
         
         if data.empty:
             logging.warning(f"No data available for {ticker}")
@@ -99,14 +168,8 @@ def analyze_stock(ticker):
         df = data.copy()
         df['Return'] = df['Close'].pct_change()
 
-        # 計算技術指標
-        df['MA10'] = df['Close'].rolling(window=10).mean()
-        df['MA20'] = df['Close'].rolling(window=20).mean()
-        df['RSI'] = talib.RSI(df['Close'])
-        df['MACD'], df['MACD_signal'], df['MACD_hist'] = talib.MACD(df['Close'])
-        df['Upper_BB'], df['Middle_BB'], df['Lower_BB'] = talib.BBANDS(df['Close'])
-        df['ATR'] = talib.ATR(df['High'], df['Low'], df['Close'])
-        df['ADX'] = talib.ADX(df['High'], df['Low'], df['Close'])
+        # 計算技術指標 (增量更新，每次只處理新K棒)
+        df = df.join(update_indicators(ticker, df))
 
         # 計算額外勝率
         additional_win_rate = 0
@@ -123,39 +186,23 @@ def analyze_stock(ticker):
         if df['MACD'].iloc[-1] > 1 and df['MACD'].iloc[-1] > df['MACD'].iloc[-2]:
             additional_win_rate += 30
 
-        # Prophet預測
-        prophet_df = df[['Close']].reset_index().rename(columns={'Date': 'ds', 'Close': 'y'})
-        model = Prophet()
-        model.fit(prophet_df)
-        future = model.make_future_dataframe(periods=30)
-        forecast = model.predict(future)
+        # Prophet預測 (收盤價未變時直接讀快取)
+        forecast = get_forecast(ticker, df['Close'], backend=forecast_backend(ticker))
         if forecast['yhat'].iloc[-1] > forecast['yhat'].iloc[-2]:
             additional_win_rate += 20
 
-        # 獲取機構交易數據
+        # 獲取機構交易數據 (Net_Buy 為三大法人合計買賣超股數)
         institutional_trading_df = fetch_institutional_trading(ticker)
-        institutional_trading_df['Net_Buy'] = (
-            institutional_trading_df['Foreign_Investor_Buy'] - institutional_trading_df['Foreign_Investor_Sell'] +
-            institutional_trading_df['Investment_Trust_Buy'] - institutional_trading_df['Investment_Trust_Sell'] +
-            institutional_trading_df['Dealer_Buy'] - institutional_trading_df['Dealer_Sell']
-        )
-        if (institutional_trading_df['Net_Buy'].tail(3) > 0).all() and (institutional_trading_df['Net_Buy'].iloc[-1] > institutional_trading_df['Net_Buy'].iloc[-2]):
+        net_buy = institutional_trading_df['Net_Buy']
+        if len(net_buy) >= 3 and (net_buy.tail(3) > 0).all() and net_buy.iloc[-1] > net_buy.iloc[-2]:
             additional_win_rate += 15
 
-        # 計算各種收益率和勝率
-        daily_return = df['Return'].mean() * 100
-        weekly_return = df['Return'].resample('W').mean().mean() * 100
-        one_month_return = df.loc[df.index[-1] - pd.DateOffset(months=1):, 'Return'].mean() * 100
-        six_months_return = df.loc[df.index[-1] - pd.DateOffset(months=6):, 'Return'].mean() * 100
-        one_year_return = df.loc[df.index[-1] - pd.DateOffset(years=1):, 'Return'].mean() * 100
-
-        daily_win_rate = (df['Return'].apply(lambda x: x > 0).mean()) * 100
-        weekly_win_rate = (df['Return'].resample('W').apply(lambda x: (x > 0).mean()) * 100).mean()
-        monthly_win_rate = (df['Return'].resample('M').apply(lambda x: (x > 0).mean()) * 100).mean()
-        six_months_win_rate = (df.loc[df.index[-1] - pd.DateOffset(months=6):, 'Return'].apply(lambda x: (x > 0)).mean() * 100) if not df.loc[df.index[-1] - pd.DateOffset(months=6):, 'Return'].empty else None
-        one_year_win_rate = (df.loc[df.index[-1] - pd.DateOffset(years=1):, 'Return'].apply(lambda x: (x > 0)).mean() * 100) if not df.loc[df.index[-1] - pd.DateOffset(years=1):, 'Return'].empty else None
+        # 各種收益率和勝率
+        if stats is None or ticker not in stats.index:
+            stats = compute_return_stats(df[['Close']].rename(columns={'Close': ticker}))
+        row = stats.loc[ticker]
 
-        logging.info(f"Successfully analyzed {ticker}")
+        logging.debug(f"Successfully analyzed {ticker}")
         return {
             'ticker': ticker,
             'current_price': round(df['Close'].iloc[-1], 2),
@@ -166,16 +213,16 @@ def analyze_stock(ticker):
             'RSI': round(df['RSI'].iloc[-1], 2),
             'MACD': round(df['MACD'].iloc[-1], 2),
             'additional_win_rate': round(additional_win_rate, 2),
-            'daily_return': round(daily_return, 2),
-            'weekly_return': round(weekly_return, 2),
-            'one_month_return': round(one_month_return, 2),
-            'six_months_return': round(six_months_return, 2),
-            'one_year_return': round(one_year_return, 2),
-            'daily_win_rate': round(daily_win_rate, 2),
-            'weekly_win_rate': round(weekly_win_rate, 2),
-            'monthly_win_rate': round(monthly_win_rate, 2),
-            'six_months_win_rate': round(six_months_win_rate, 2) if six_months_win_rate is not None else None,
-            'one_year_win_rate': round(one_year_win_rate, 2) if one_year_win_rate is not None else None,
+            'daily_return': round(row['daily_return'], 2),
+            'weekly_return': round(row['weekly_return'], 2),
+            'one_month_return': round(row['one_month_return'], 2),
+            'six_months_return': round(row['six_months_return'], 2),
+            'one_year_return': round(row['one_year_return'], 2),
+            'daily_win_rate': round(row['daily_win_rate'], 2),
+            'weekly_win_rate': round(row['weekly_win_rate'], 2),
+            'monthly_win_rate': round(row['monthly_win_rate'], 2),
+            'six_months_win_rate': round(row['six_months_win_rate'], 2) if pd.notna(row['six_months_win_rate']) else None,
+            'one_year_win_rate': round(row['one_year_win_rate'], 2) if pd.notna(row['one_year_win_rate']) else None,
             'volume': int(df['Volume'].iloc[-1] / 1000),  # 转换为张数,
             'historical_data': df,
             'institutional_trading': institutional_trading_df,
@@ -186,20 +233,61 @@ def analyze_stock(ticker):
         logging.error(f"Error processing {ticker}: {str(e)}")
         return None
 
-def update_stock_data(tickers, window):
-    while True:
-        for ticker in tickers:
-            try:
-                result = analyze_stock(ticker)
-                if result is not None:
-                    stock_data[ticker] = result
-                    window.write_event_value('-STOCK-UPDATED-', ticker)
-                    logging.info(f"Updated data for {ticker}")
-                else:
-                    logging.warning(f"Failed to get data for {ticker}")
-            except Exception as e:
-                logging.error(f"Error processing {ticker}: {str(e)}")
-        time.sleep(300)  # 每5分鐘更新一次
+def store_result(ticker, result):
+    stock_data[ticker] = result
+    data_versions[ticker] = data_versions.get(ticker, 0) + 1
+
+def table_row(ticker):
+    data = stock_data.get(ticker)
+    if data is None:
+        return None
+    return [ticker] + [data.get(key, 'N/A') for key in TABLE_KEYS]
+
+# 背景更新的一批標的 (由 RefreshScheduler 在執行緒池中呼叫)；回傳成功更新的標的
+@tracing.traced('refresh')
+def update_stock_data(tickers, cancelled=lambda: False):
+    # 先批次更新快取，analyze_stock 逐檔讀取時不再發出請求
+    _, errors = refresh_many(tickers, datetime.now() - timedelta(days=365*4), max_age=60)
+    for ticker, error in errors.items():
+        logging.warning(f"Download failed for {ticker}: {error}")
+    if cancelled():
+        return []
+    # 只重新擬合收盤價有變的標的 (開盤中的標的用快速後端)
+    closes = {ticker: load_history(ticker)['Close'] for ticker in tickers if ticker not in errors}
+    closes = {t: s for t, s in closes.items() if not s.empty}
+    by_backend = {}
+    for ticker, series in closes.items():
+        by_backend.setdefault(forecast_backend(ticker), {})[ticker] = series
+    for backend, series_by_ticker in by_backend.items():
+        with forecast_lock, tracing.span('model', tickers=len(series_by_ticker), backend=backend):
+            _, failures = forecast_many(series_by_ticker, backend, max_workers=FORECAST_WORKERS,
+                                        mp_context=forecast_context)
+        for ticker, (error, _) in failures.items():
+            logging.warning(f"Forecast failed for {ticker}: {error.strip().splitlines()[-1]}")
+    # 整批的收益率/勝率一次算完
+    with tracing.span('stats', tickers=len(closes)):
+        stats = compute_return_stats(pd.DataFrame(closes)) if closes else None
+    updated = []
+    for ticker in tickers:
+        if cancelled():
+            break
+        try:
+            result = analyze_stock(ticker, stats)
+            if result is not None:
+                store_result(ticker, result)
+                updated.append(ticker)
+                logging.info(f"Updated data for {ticker}")
+            else:
+                logging.warning(f"Failed to get data for {ticker}")
+        except Exception as e:
+            logging.error(f"Error processing {ticker}: {str(e)}")
+    # 當日勝率快照 (同一天重跑只覆寫當天)，供 snapshot_store 比較逐日變化
+    if updated:
+        with snapshot_lock:
+            write_snapshot('stock_analyzer', list(stock_data.values()))
+    return updated
+
+@tracing.traced('plot', 'ticker')
 def create_chart(ticker, chart_type='price'):
     try:
         data = stock_data.get(ticker)
@@ -210,8 +298,8 @@ def create_chart(ticker, chart_type='price'):
         if df.empty:
             return create_error_chart("Empty dataset")
         
-        plt.close('all')  # 关闭所有现有图表
-        fig, ax = plt.subplots(figsize=(16, 9))
+        # 不經過 pyplot，快取中的圖表不受 plt.close 影響
+        fig = Figure(figsize=(16, 9))
         ax = fig.add_subplot(111)
         
         if chart_type == 'price':
@@ -262,14 +350,15 @@ def create_chart(ticker, chart_type='price'):
         else:
             return create_error_chart("Unknown chart type")
         
-        plt.tight_layout()
+        fig.tight_layout()
         return fig
     except Exception as e:
         logging.error(f"Error creating chart: {str(e)}")
         return create_error_chart(str(e))
 
 def create_error_chart(error_message):
-    fig, ax = plt.subplots(figsize=(16, 9))
+    fig = Figure(figsize=(16, 9))
+    ax = fig.add_subplot(111)
     ax.text(0.5, 0.5, f"Error: {error_message}", ha='center', va='center')
     ax.set_axis_off()
     return fig
@@ -284,10 +373,11 @@ def create_gui():
     layout = [
         [sg.Text('股票分析器', font=(font_path, 24), justification='center', expand_x=True)],
         [sg.Combo(['Stocks', 'ETFs'], default_value='Stocks', key='-ASSET_TYPE-', enable_events=True),
-         sg.Button('刷新', font=(font_path, 12)), sg.Button('退出', font=(font_path, 12))],
+         sg.Button('刷新', font=(font_path, 12)), sg.Button('退出', font=(font_path, 12)),
+         sg.Text('', key='-STATUS-', font=(font_path, 11), expand_x=True)],
         [sg.Table(values=[], headings=['代碼', '當前價格', '漲跌幅(日)', '漲跌幅(週)', 'MA10', 'MA20', 'RSI', 'MACD', '額外勝率', '成交量'],
                   auto_size_columns=False, col_widths=[10, 10, 10, 10, 10, 10, 10, 10, 10, 12],
-                  justification='right', key='-TABLE-', enable_events=True, 
+                  justification='right', key='-TABLE-', enable_events=True, enable_click_events=True,
                   font=(font_path, 11), header_font=(font_path, 12, 'bold'))],
         [sg.Combo(['價格走勢', '成交量', 'MACD', 'RSI', '布林通道', '三大法人買賣'], default_value='價格走勢', key='-CHART_TYPE-', enable_events=True)],
         [sg.Canvas(key='-CANVAS-', size=(2400, 1200))],
@@ -300,106 +390,86 @@ def create_gui():
 def main():
     window = create_gui()
     current_tickers = STOCKS
-    current_sort_column = None
-    reverse_sort = False
-    fig_canvas_agg = None
-    table_data = []
-
-    # 初始化一些數據
-    for ticker in current_tickers[:5]:  # 只處理前5個股票作為初始數據
-        try:
-            result = analyze_stock(ticker)
-            if result is not None:
-                stock_data[ticker] = result
-                logging.info(f"Initialized data for {ticker}")
-        except Exception as e:
-            logging.error(f"Error initializing {ticker}: {str(e)}")
-
-    update_thread = threading.Thread(target=update_stock_data, args=(current_tickers, window), daemon=True)
-    update_thread.start()
+    table = TableRows(window['-TABLE-'], table_row)
+    charts = ChartCache(create_chart)
+    selected_ticker = None
+    pending_rows = set()
+    last_refresh = 0.0
+    last_status = 0.0
+    visible = ()
+    table.set_tickers(current_tickers)
+
+    # 背景更新：畫面上的列先更新，其餘依資料新舊排隊；切換清單時只改目標，不另開執行緒
+    scheduler = RefreshScheduler(update_stock_data, interval=REFRESH_INTERVAL, max_workers=REFRESH_WORKERS,
+                                 on_update=lambda ticker: window.write_event_value('-STOCK-UPDATED-', ticker))
+    scheduler.set_watchlist(current_tickers)
+    scheduler.set_visible(current_tickers[:VISIBLE_ROWS])
+    scheduler.start()
+
+    def show_chart(ticker, chart_label):
+        chart_type = CHART_TYPES.get(chart_label, chart_label.lower().replace(' ', '_'))
+        version = data_versions.get(ticker, 0)
+        charts.show(window['-CANVAS-'].TKCanvas, ticker, chart_type, version)
+        # 閒置時先畫好同一檔的其他圖與上下相鄰標的的同一種圖
+        position = table.order.index(ticker) if ticker in table.order else -1
+        neighbours = [table.ticker_at(position + step) for step in (1, -1)] if position >= 0 else []
+        charts.prefetch([(t, chart_type, data_versions.get(t, 0)) for t in neighbours if t is not None] +
+                        [(ticker, other, version) for other in CHART_TYPES.values() if other != chart_type])
 
     while True:
-        event, values = window.read(timeout=100)
+        event, values = window.read(timeout=FRAME_MS)
 
         if event in (sg.WINDOW_CLOSED, '退出'):
             break
 
         if event == '-STOCK-UPDATED-':
-            # 更新表格
-            update_table(window, current_tickers, current_sort_column, reverse_sort)
+            pending_rows.add(values[event])
 
-        # ... 其他事件处理 ...
-        if event == '-STOCK-UPDATED-' or event == '刷新':
-            update_table(window, current_tickers, current_sort_column, reverse_sort)
+        if event == '刷新':
+            table.refresh(current_tickers, full=True)
+            scheduler.request(current_tickers)
+            logging.info(f"Updated table with {len(table.order)} rows")
 
         if event == '-ASSET_TYPE-':
             current_tickers = STOCKS if values['-ASSET_TYPE-'] == 'Stocks' else ETFS
-            update_thread.join(timeout=0.1)
-            update_thread = threading.Thread(target=update_stock_data, args=(current_tickers,), daemon=True)
-            update_thread.start()
-
-        if event == '刷新' or not data_queue.empty():
-            table_data = [[ticker] + [stock_data[ticker].get(key, 'N/A') for key in ['current_price', 'daily_change', 'weekly_change', 'MA10', 'MA20', 'RSI', 'MACD', 'additional_win_rate', 'volume']]
-                          for ticker in current_tickers if ticker in stock_data]
-            
-            if current_sort_column is not None:
-                table_data.sort(key=lambda x: x[current_sort_column] if x[current_sort_column] != 'N/A' else -float('inf'), reverse=reverse_sort)
-            
-            window['-TABLE-'].update(values=table_data)
-            logging.info(f"Updated table with {len(table_data)} rows")
-
-        if event == '-TABLE-':
-            if len(values['-TABLE-']) > 0:
-                selected_row = values['-TABLE-'][0]
-                selected_ticker = table_data[selected_row][0]
-                chart_type = values['-CHART_TYPE-']
-                fig = create_chart(selected_ticker, chart_type.lower().replace(' ', '_'))
-                
-                if fig_canvas_agg:
-                    delete_figure_agg(fig_canvas_agg)
-                fig_canvas_agg = draw_figure(window['-CANVAS-'].TKCanvas, fig)
-            elif isinstance(event, tuple) and event[0] == '-TABLE-' and event[2][0] == 'column':  # 点击表头
-                clicked_column = event[2][1]
-                if clicked_column == current_sort_column:
-                    reverse_sort = not reverse_sort
-                else:
-                    current_sort_column = clicked_column
-                    reverse_sort = False
-                
-                table_data.sort(key=lambda x: x[clicked_column] if x[clicked_column] != 'N/A' else -float('inf'), reverse=reverse_sort)
-                window['-TABLE-'].update(values=table_data)
-
-        if event == '-CHART_TYPE-':
-            if len(values['-TABLE-']) > 0:
-                selected_row = values['-TABLE-'][0]
-                selected_ticker = table_data[selected_row][0]
-                chart_type = values['-CHART_TYPE-']
-                fig = create_chart(selected_ticker, chart_type.lower().replace(' ', '_'))
-                
-                if fig_canvas_agg:
-                    delete_figure_agg(fig_canvas_agg)
-                fig_canvas_agg = draw_figure(window['-CANVAS-'].TKCanvas, fig)
-
+            table.set_tickers(current_tickers)
+            scheduler.set_watchlist(current_tickers)
+
+        if isinstance(event, tuple) and event[0] == '-TABLE-' and event[2][0] == -1:  # 点击表头
+            table.sort(event[2][1])
+
+        if event in ('-TABLE-', '-CHART_TYPE-') and len(values['-TABLE-']) > 0:
+            selected_ticker = table.ticker_at(values['-TABLE-'][0])
+            if selected_ticker is not None:
+                show_chart(selected_ticker, values['-CHART_TYPE-'])
+
+        # 一連串的更新事件合併成一次刷新，只改有變動的列
+        if pending_rows and time.monotonic() - last_refresh >= FRAME_MS / 1000:
+            updated = table.refresh(pending_rows)
+            pending_rows.clear()
+            last_refresh = time.monotonic()
+            if selected_ticker in updated:
+                show_chart(selected_ticker, values['-CHART_TYPE-'])
+        elif event == sg.TIMEOUT_KEY:
+            charts.render_next()
+
+        rows = table.order if table.order else current_tickers
+        now_visible = tuple(rows[:VISIBLE_ROWS]) + ((selected_ticker,) if selected_ticker else ())
+        if now_visible != visible:
+            visible = now_visible
+            scheduler.set_visible(visible)
+
+        if time.monotonic() - last_status >= 1:
+            last_status = time.monotonic()
+            summary = scheduler.summary()
+            oldest = f"{summary['oldest_age']:.0f} 秒" if np.isfinite(summary['oldest_age']) else '尚未載入'
+            resident = stock_data.resident_bytes() / 1024 / 1024
+            window['-STATUS-'].update(f"已載入 {summary['loaded']}/{summary['tickers']}，排隊 {summary['queue_depth']}，"
+                                      f"更新中 {summary['in_flight']}，最舊資料 {oldest}，快取 {resident:.1f} MB")
+
+    scheduler.stop(wait=False)
     window.close()
-def update_table(window, current_tickers, current_sort_column, reverse_sort):
-    table_data = [[ticker] + [stock_data[ticker].get(key, 'N/A') for key in ['current_price', 'daily_change', 'weekly_change', 'MA10', 'MA20', 'RSI', 'MACD', 'additional_win_rate', 'volume']]
-                  for ticker in current_tickers if ticker in stock_data]
-    
-    if current_sort_column is not None:
-        table_data.sort(key=lambda x: x[current_sort_column] if x[current_sort_column] != 'N/A' else -float('inf'), reverse=reverse_sort)
-    
-    window['-TABLE-'].update(values=table_data)
-    logging.info(f"Updated table with {len(table_data)} rows")
-    
-def draw_figure(canvas, figure):
-    figure_canvas_agg = FigureCanvasTkAgg(figure, canvas)
-    figure_canvas_agg.draw()
-    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
-    return figure_canvas_agg
-
-def delete_figure_agg(figure_agg):
-    figure_agg.get_tk_widget().pack_forget()
-    plt.close('all')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with tracing.session('stock_analyzer'):
+        main()
\ No newline at end of file
@@ -0,0 +1,202 @@
+import collections
+import glob
+import os
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from data_provider import safe_name
+
+# 溢出檔：data_cache/stock_data/{ticker}.{版本}.{表名}.npy，每張表一個結構化陣列 (索引 + 各欄)
+# (第一次寫入時清空上次留下的檔案；同一檔更新後舊版本即刪除。不在建立時清空：
+# spawn 的工作行程會重新匯入 stock_analyzer，不能刪掉主行程正在用的檔案)
+SPILL_ROOT = 'data_cache/stock_data'
+MEMORY_BUDGET = 64 * 1024 * 1024
+TAIL_ROWS = 5
+
+# 結構化陣列中索引欄的名稱前綴 (其後接原本的索引名稱)
+INDEX_FIELD = '__index__'
+
+
+# 壓縮欄位型別：float64 -> float32，整數、布林與日期維持原型別；有其他型別 (字串等) 時回傳 None
+def compact_frame(df):
+    columns = {}
+    for name, column in df.items():
+        values = column.to_numpy()
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float32)
+        elif values.dtype.kind not in 'iub' and not np.issubdtype(values.dtype, np.datetime64):
+            return None
+        columns[name] = values
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.index.name = df.index.name
+    return compact
+
+
+def _frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class CachedResult(Mapping):
+    """一檔標的的分析結果：摘要欄位常駐記憶體，歷史資料等大表在取用時才向快取讀取。"""
+
+    def __init__(self, cache, ticker, summary, frame_keys):
+        self.cache = cache
+        self.ticker = ticker
+        self.summary = summary
+        self.frame_keys = frame_keys
+
+    def __getitem__(self, key):
+        if key in self.frame_keys:
+            return self.cache.frame(self.ticker, key)
+        return self.summary[key]
+
+    def __iter__(self):
+        yield from self.summary
+        yield from self.frame_keys
+
+    def __len__(self):
+        return len(self.summary) + len(self.frame_keys)
+
+
+class StockDataCache:
+    """取代 stock_data 全域 dict、記憶體有上限的分析結果快取。
+
+    每檔只有摘要欄位 (表格與快照用) 與歷史資料的最後 tail_rows 列常駐；
+    DataFrame 欄位 (historical_data、forecast、institutional_trading) 壓縮成 float32 後
+    寫入記憶體映射的 .npy 溢出檔，最近用過的整表依 LRU 保留在記憶體，
+    總量超過 memory_budget 時淘汰最久未用的，之後再從溢出檔讀回。
+    更新在背景執行緒、讀取在 GUI 執行緒，所有狀態以同一把鎖保護。
+    """
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, tail_rows=TAIL_ROWS, root=SPILL_ROOT):
+        self.memory_budget = memory_budget
+        self.tail_rows = tail_rows
+        self.root = root
+        self.lock = threading.RLock()
+        self.summaries = {}
+        self.tails = {}
+        self.frames = {}  # ticker -> {欄位: 'spilled' 或無法壓縮而常駐的原表}
+        self.versions = {}
+        self.resident = collections.OrderedDict()  # (ticker, 欄位) -> 壓縮後的表，LRU 順序
+        self.resident_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.cleared = False
+
+    def _spill_base(self, ticker, version):
+        return os.path.join(self.root, f"{safe_name(ticker)}.{version}")
+
+    def _remove_spill(self, ticker, version=None):
+        pattern = f"{safe_name(ticker) if ticker != '*' else '*'}.{'*' if version is None else version}.*"
+        for path in glob.glob(os.path.join(glob.escape(self.root), pattern)):
+            os.remove(path)
+
+    def _spill(self, ticker, version, key, df):
+        names = [f"{INDEX_FIELD}{df.index.name or ''}"] + [str(c) for c in df.columns]
+        arrays = [df.index.to_numpy()] + [column.to_numpy() for _, column in df.items()]
+        os.makedirs(self.root, exist_ok=True)
+        np.save(f"{self._spill_base(ticker, version)}.{key}.npy", np.rec.fromarrays(arrays, names=names))
+
+    # 以 mmap 開啟，逐欄複製成連續陣列後即釋放映射 (Windows 上才能刪除舊版本的檔案)
+    def _load(self, ticker, version, key):
+        records = np.load(f"{self._spill_base(ticker, version)}.{key}.npy", mmap_mode='r')
+        index_field, *names = records.dtype.names
+        index = pd.Index(np.array(records[index_field]), name=index_field[len(INDEX_FIELD):] or None)
+        columns = {name: np.array(records[name]) for name in names}
+        del records
+        return pd.DataFrame(columns, index=index)
+
+    def _keep(self, ticker, key, df):
+        self.resident[(ticker, key)] = df
+        self.resident_size += _frame_bytes(df)
+        while self.resident_size > self.memory_budget and len(self.resident) > 1:
+            _, evicted = self.resident.popitem(last=False)
+            self.resident_size -= _frame_bytes(evicted)
+
+    def _drop(self, ticker):
+        for key in [k for k in self.resident if k[0] == ticker]:
+            self.resident_size -= _frame_bytes(self.resident.pop(key))
+
+    def __setitem__(self, ticker, result):
+        summary = {k: v for k, v in result.items() if not isinstance(v, pd.DataFrame)}
+        frames = {k: v for k, v in result.items() if isinstance(v, pd.DataFrame)}
+        with self.lock:
+            if not self.cleared:
+                self._remove_spill('*')
+                self.cleared = True
+            version = self.versions.get(ticker, 0) + 1
+            self._drop(ticker)
+            stored = {}
+            for key, df in frames.items():
+                compact = compact_frame(df)
+                if compact is None:
+                    stored[key] = df
+                    continue
+                self._spill(ticker, version, key, compact)
+                stored[key] = 'spilled'
+                self._keep(ticker, key, compact)
+            history = frames.get('historical_data')
+            self.tails[ticker] = compact_frame(history.tail(self.tail_rows)) if history is not None else None
+            self.summaries[ticker] = summary
+            self.frames[ticker] = stored
+            self.versions[ticker] = version
+            self._remove_spill(ticker, version - 1)
+
+    # 一檔的一張大表：常駐時直接回傳，否則從溢出檔讀回並放回 LRU
+    def frame(self, ticker, key):
+        with self.lock:
+            stored = self.frames[ticker][key]
+            if not isinstance(stored, str):
+                return stored
+            df = self.resident.get((ticker, key))
+            if df is not None:
+                self.resident.move_to_end((ticker, key))
+                self.hits += 1
+                return df
+            self.misses += 1
+            df = self._load(ticker, self.versions[ticker], key)
+            self._keep(ticker, key, df)
+            return df
+
+    def tail(self, ticker):
+        return self.tails.get(ticker)
+
+    def get(self, ticker, default=None):
+        with self.lock:
+            if ticker not in self.summaries:
+                return default
+            return CachedResult(self, ticker, self.summaries[ticker], list(self.frames[ticker]))
+
+    def __getitem__(self, ticker):
+        result = self.get(ticker)
+        if result is None:
+            raise KeyError(ticker)
+        return result
+
+    def __contains__(self, ticker):
+        return ticker in self.summaries
+
+    def __len__(self):
+        return len(self.summaries)
+
+    # 各檔的摘要 (供 write_snapshot 等只需要純量欄位的用途，不會載入大表)
+    def values(self):
+        with self.lock:
+            return [dict(summary) for summary in self.summaries.values()]
+
+    # 常駐記憶體的大小 (位元組)：LRU 中的整表、最後幾列與無法壓縮的原表
+    def resident_bytes(self):
+        with self.lock:
+            tails = sum(_frame_bytes(df) for df in self.tails.values() if df is not None)
+            unspilled = sum(_frame_bytes(df) for stored in self.frames.values()
+                            for df in stored.values() if not isinstance(df, str))
+            return self.resident_size + tails + unspilled
+
+    def stats(self):
+        with self.lock:
+            return {'tickers': len(self.summaries), 'resident_frames': len(self.resident),
+                    'resident_bytes': self.resident_bytes(), 'budget_bytes': self.memory_budget,
+                    'hits': self.hits, 'misses': self.misses}
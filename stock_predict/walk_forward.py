@@ -0,0 +1,214 @@
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, classification_report
+
+# 模型與訓練紀錄：data_cache/models/{name}/model.joblib、meta.json、folds.csv、predictions.parquet
+MODEL_ROOT = 'data_cache/models'
+
+MODELS = {
+    'classifier': RandomForestClassifier,
+    'regressor': RandomForestRegressor,
+}
+
+
+# 日期轉成不帶時區的交易所當地日期 (yfinance history() 為帶時區的日期；不同市場的標的
+# 也才能疊在一起)。保留當地日期而不轉 UTC，亞洲市場的日K才不會變成前一天。
+def _naive_dates(index):
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+# 將各標的的 (X, y) 疊成一個以 (Ticker, Date) 為索引的特徵矩陣。
+# 每檔最後一列的目標是「下一天」，尚未發生，因此不列入。
+def stack_features(features_by_ticker):
+    xs, ys = [], []
+    for ticker, (X, y) in features_by_ticker.items():
+        if len(X) < 2:
+            continue
+        dates = _naive_dates(X.index[:-1])
+        xs.append(X.iloc[:-1].set_axis(dates))
+        ys.append(y.iloc[:-1].set_axis(dates))
+    if not xs:
+        return pd.DataFrame(), pd.Series(dtype=float)
+    tickers = [ticker for ticker, (X, _) in features_by_ticker.items() if len(X) >= 2]
+    X = pd.concat(xs, keys=tickers, names=['Ticker', 'Date'])
+    y = pd.concat(ys, keys=tickers, names=['Ticker', 'Date'])
+    return X, y
+
+
+# 依日期切成 n_folds 個連續的測試區段，訓練集為每段之前的所有資料 (擴張視窗)
+def expanding_folds(dates, n_folds=5, min_train_fraction=0.5):
+    unique = np.unique(dates)
+    first_test = int(len(unique) * min_train_fraction)
+    bounds = np.linspace(first_test, len(unique), n_folds + 1).astype(int)
+    return [(unique[lo], unique[hi - 1]) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+class WalkForwardTrainer:
+    """跨標的的 walk-forward 隨機森林訓練。
+
+    第一次執行時以擴張的時間序列折疊建立模型；之後每次只處理上次訓練後的新日期：
+    先用現有模型預測新資料 (樣本外評分)，再以 warm_start 追加 trees_per_fold 棵樹，
+    新樹只看最近 train_window 個交易日，因此每日重訓的成本與歷史長度無關。
+    """
+
+    def __init__(self, name, kind='classifier', base_trees=100, trees_per_fold=20, max_trees=300,
+                 train_window=500, n_folds=5, n_jobs=-1, random_state=42, root=MODEL_ROOT):
+        self.name = name
+        self.kind = kind
+        self.base_trees = base_trees
+        self.trees_per_fold = trees_per_fold
+        self.max_trees = max_trees
+        self.train_window = train_window
+        self.n_folds = n_folds
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.dir = os.path.join(root, name)
+        self.model = None
+        self.meta = {}
+        self._load()
+
+    def _path(self, filename):
+        return os.path.join(self.dir, filename)
+
+    def _load(self):
+        if os.path.exists(self._path('model.joblib')) and os.path.exists(self._path('meta.json')):
+            self.model = joblib.load(self._path('model.joblib'))
+            with open(self._path('meta.json'), encoding='utf-8') as f:
+                self.meta = json.load(f)
+
+    def _save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        joblib.dump(self.model, self._path('model.joblib.tmp'))
+        os.replace(self._path('model.joblib.tmp'), self._path('model.joblib'))
+        with open(self._path('meta.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(self._path('meta.json.tmp'), self._path('meta.json'))
+
+    def _append(self, filename, frame):
+        path = self._path(filename)
+        os.makedirs(self.dir, exist_ok=True)
+        if filename.endswith('.csv'):
+            frame.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        else:
+            if os.path.exists(path):
+                frame = pd.concat([pd.read_parquet(path), frame], ignore_index=True)
+            frame.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+
+    def fold_log(self):
+        path = self._path('folds.csv')
+        return pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
+
+    def predictions(self):
+        path = self._path('predictions.parquet')
+        return pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+
+    # 追加樹：超過 max_trees 時先移除最舊的樹
+    def _grow(self, X, y, trees):
+        if self.model is None:
+            self.model = MODELS[self.kind](n_estimators=trees, warm_start=True,
+                                           n_jobs=self.n_jobs, random_state=self.random_state)
+        else:
+            keep = max(self.max_trees - trees, 0)
+            if len(self.model.estimators_) > keep:
+                self.model.estimators_ = self.model.estimators_[-keep:] if keep else []
+            self.model.n_estimators = len(self.model.estimators_) + trees
+        self.model.fit(X, y)
+
+    def _training_rows(self, dates, end):
+        rows = dates <= end
+        if self.train_window is not None:
+            unique = np.unique(dates[rows])
+            rows &= dates >= unique[max(len(unique) - self.train_window, 0)]
+        return rows
+
+    # 以新資料更新模型；回傳本次新增的折疊紀錄
+    def update(self, X, y):
+        if X.empty:
+            return pd.DataFrame()
+        dates = X.index.get_level_values('Date').to_numpy()
+        last = self.meta.get('last_date')
+        if self.model is None:
+            folds = expanding_folds(dates, self.n_folds)
+            if not folds:
+                return pd.DataFrame()
+            initial_end = np.unique(dates)[np.unique(dates) < folds[0][0]][-1]
+            start = time.perf_counter()
+            rows = self._training_rows(dates, initial_end)
+            self._grow(X[rows], y[rows], self.base_trees)
+            self.meta['initial_fit_seconds'] = round(time.perf_counter() - start, 3)
+        else:
+            new_dates = dates[dates > np.datetime64(pd.Timestamp(last))]
+            if len(new_dates) == 0:
+                return pd.DataFrame()
+            folds = [(new_dates.min(), new_dates.max())]
+
+        records = []
+        fold_index = int(self.meta.get('folds', 0))
+        for test_start, test_end in folds:
+            test = (dates >= test_start) & (dates <= test_end)
+            start = time.perf_counter()
+            pred = self.model.predict(X[test])
+            predict_seconds = time.perf_counter() - start
+
+            train = self._training_rows(dates, test_end)
+            start = time.perf_counter()
+            self._grow(X[train], y[train], self.trees_per_fold)
+            fit_seconds = time.perf_counter() - start
+
+            train_dates = dates[train]
+            records.append({
+                'fold': fold_index,
+                'test_start': pd.Timestamp(test_start).date(),
+                'test_end': pd.Timestamp(test_end).date(),
+                'n_test': int(test.sum()),
+                'score': self._score(y[test], pred),
+                'predict_seconds': round(predict_seconds, 4),
+                'train_start': pd.Timestamp(train_dates.min()).date(),
+                'train_end': pd.Timestamp(train_dates.max()).date(),
+                'n_train': int(train.sum()),
+                'trees': len(self.model.estimators_),
+                'fit_seconds': round(fit_seconds, 3),
+            })
+            index = X.index[test]
+            self._append('predictions.parquet', pd.DataFrame({
+                'fold': fold_index,
+                'ticker': index.get_level_values('Ticker'),
+                'date': index.get_level_values('Date'),
+                'actual': y[test].to_numpy(),
+                'predicted': pred,
+            }))
+            fold_index += 1
+
+        self.meta['folds'] = fold_index
+        self.meta['last_date'] = str(pd.Timestamp(dates.max()).date())
+        self._save()
+        records = pd.DataFrame(records)
+        self._append('folds.csv', records)
+        return records
+
+    def _score(self, actual, predicted):
+        if self.kind == 'classifier':
+            return float(accuracy_score(actual, predicted))
+        residual = ((actual - predicted) ** 2).sum()
+        total = ((actual - actual.mean()) ** 2).sum()
+        return float(1 - residual / total) if total > 0 else float('nan')
+
+    # 單一標的的樣本外評估 (所有折疊累積的預測)
+    def ticker_report(self, ticker):
+        predictions = self.predictions()
+        if predictions.empty:
+            return None
+        rows = predictions[predictions['ticker'] == ticker]
+        if rows.empty:
+            return None
+        score = self._score(rows['actual'], rows['predicted'])
+        report = classification_report(rows['actual'], rows['predicted'], zero_division=0) if self.kind == 'classifier' else None
+        return score, report
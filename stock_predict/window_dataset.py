@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# 滑動視窗 (不複製資料)：回傳 (樣本數, time_step, 特徵數) 的唯讀視圖
+def windows(features, time_step):
+    features = np.asarray(features)
+    if features.ndim == 1:
+        features = features[:, None]
+    return sliding_window_view(features, time_step, axis=0).transpose(0, 2, 1)
+
+
+# 與 notebook 原本的 create_dataset 相同的結果：X[i] = dataset[i:i+time_step, :]，Y[i] = dataset[i+time_step, 0]
+# X、Y 都是原陣列的視圖
+def create_dataset(dataset, time_step=1):
+    dataset = np.asarray(dataset)
+    if dataset.ndim == 1:
+        dataset = dataset[:, None]
+    n = len(dataset) - time_step
+    return windows(dataset, time_step)[:max(n, 0)], dataset[time_step:, 0]
+
+
+# 將多檔標的的特徵依序串接寫入 .npy (可記憶體映射)，旁邊的 .json 記錄各標的的起訖位置
+def save_features(path, frames, columns, dtype=np.float32):
+    tickers = list(frames)
+    lengths = [len(frames[ticker]) for ticker in tickers]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(int(offsets[-1]), len(columns)))
+    for ticker, start, end in zip(tickers, offsets[:-1], offsets[1:]):
+        array[start:end] = frames[ticker][columns].to_numpy(dtype=dtype)
+    array.flush()
+    with open(f"{os.path.splitext(path)[0]}.json", 'w', encoding='utf-8') as f:
+        json.dump({'tickers': tickers, 'offsets': offsets.tolist(), 'columns': list(columns)}, f)
+    return path
+
+
+def load_features(path):
+    features = np.load(path, mmap_mode='r')
+    with open(f"{os.path.splitext(path)[0]}.json", encoding='utf-8') as f:
+        meta = json.load(f)
+    return features, meta
+
+
+class WindowDataset:
+    """多檔標的的滑動視窗資料集。
+
+    features 為串接後的 (總列數, 特徵數) 陣列 (可為 memmap)，offsets 標示每檔的邊界；
+    視窗與目標都不會跨越兩檔之間。只保存每個樣本的起始位置，X 在取批次時才從視圖中取出。
+    """
+
+    def __init__(self, features, offsets, time_step=60, target_col=0, horizon=1, tickers=None):
+        self.features = features
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.time_step = time_step
+        self.target_col = target_col
+        self.horizon = horizon
+        self.tickers = list(tickers) if tickers is not None else list(range(len(self.offsets) - 1))
+        self.view = windows(features, time_step)
+        self.starts = self._valid_starts()
+
+    @classmethod
+    def from_file(cls, path, time_step=60, target_col=0, horizon=1):
+        features, meta = load_features(path)
+        if isinstance(target_col, str):
+            target_col = meta['columns'].index(target_col)
+        return cls(features, meta['offsets'], time_step, target_col, horizon, meta['tickers'])
+
+    # 每檔可用的起始位置：[start, end - time_step - horizon]
+    def _valid_starts(self, fraction=(0.0, 1.0)):
+        span = self.time_step + self.horizon - 1
+        parts = []
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            count = end - start - span
+            if count <= 0:
+                continue
+            lo, hi = int(count * fraction[0]), int(count * fraction[1])
+            parts.append(np.arange(start + lo, start + hi, dtype=np.int64))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    # 依時間切分：每檔前 train_fraction 的樣本為訓練集，其餘為測試集
+    def split(self, train_fraction=0.8):
+        train, test = [self._subset(fraction) for fraction in ((0.0, train_fraction), (train_fraction, 1.0))]
+        return train, test
+
+    def _subset(self, fraction):
+        subset = object.__new__(WindowDataset)
+        subset.__dict__.update(self.__dict__)
+        subset.starts = self._valid_starts(fraction)
+        return subset
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        start = self.starts[idx]
+        return self.view[start], self.features[start + self.time_step + self.horizon - 1, self.target_col]
+
+    # 取出指定樣本 (只複製這一批)
+    def take(self, idx):
+        starts = self.starts[idx]
+        return self.view[starts], self.features[starts + self.time_step + self.horizon - 1, self.target_col]
+
+    # 產生 mini-batch，shuffle 時每個 epoch 重新打亂
+    def batches(self, batch_size=32, shuffle=True, seed=None, epochs=1):
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+            for i in range(0, len(order), batch_size):
+                idx = order[i:i + batch_size]
+                if shuffle:
+                    idx = np.sort(idx)  # 依位置排序，memmap 讀取較連續
+                yield self.take(idx)
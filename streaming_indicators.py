@@ -0,0 +1,487 @@
+import json
+import math
+import os
+from collections import deque
+
+import pandas as pd
+
+NAN = float('nan')
+
+
+# Same tolerance as TA-Lib's TA_IS_ZERO
+def _is_zero(x):
+    return -1e-14 < x < 1e-14
+
+
+# Running sums over a sliding window: the value leaving a full window is subtracted, so an
+# update is O(1). A NaN input would poison the sum for good, so a non-finite sum is
+# rebuilt from the window (NaN only while the NaN is still inside it).
+def _slide(window, total, x):
+    if len(window) == window.maxlen:
+        total -= window[0]
+    window.append(x)
+    total += x
+    return total if math.isfinite(total) else sum(window)
+
+
+# Sliding-window extreme in O(1) amortized: [bar number, value] pairs kept monotonic
+# (decreasing for the max, increasing for the min) with the current extreme in front
+def _push_extreme(extremes, count, value, n, larger):
+    while extremes and (extremes[-1][1] <= value if larger else extremes[-1][1] >= value):
+        extremes.pop()
+    extremes.append([count, value])
+    if extremes[0][0] <= count - n:
+        extremes.popleft()
+    return extremes[0][1]
+
+
+class StreamingIndicator:
+    """Base class: indicators keep their own state and advance one bar per ``update``.
+
+    ``state_dict``/``from_state`` round-trip through plain JSON types so a restarted
+    process can resume exactly where it stopped.
+    """
+
+    def __init__(self, **params):
+        self.params = params
+
+    def update(self, bar):
+        raise NotImplementedError
+
+    def state_dict(self):
+        state = {}
+        for key, value in vars(self).items():
+            if key == 'params':
+                continue
+            if isinstance(value, StreamingIndicator):
+                value = value.state_dict()
+            elif isinstance(value, deque):
+                value = list(value)
+            state[key] = value
+        return {'type': type(self).__name__, 'params': self.params, 'state': state}
+
+    @staticmethod
+    def from_state(data):
+        obj = STREAMING_INDICATORS[data['type']](**data['params'])
+        for key, value in data['state'].items():
+            current = getattr(obj, key)
+            if isinstance(current, StreamingIndicator):
+                value = StreamingIndicator.from_state(value)
+            elif isinstance(current, deque):
+                value = deque(value, maxlen=current.maxlen)
+            setattr(obj, key, value)
+        missing = set(vars(obj)) - set(data['state']) - {'params'}
+        if missing:
+            raise ValueError(f"{data['type']} state is missing {', '.join(sorted(missing))}")
+        return obj
+
+
+class SMA(StreamingIndicator):
+    def __init__(self, timeperiod=30, field='Close'):
+        super().__init__(timeperiod=timeperiod, field=field)
+        self.window = deque(maxlen=timeperiod)
+        self.total = 0.0
+
+    def update(self, bar):
+        x = bar[self.params['field']] if isinstance(bar, dict) else bar
+        self.total = _slide(self.window, self.total, x)
+        if len(self.window) < self.params['timeperiod']:
+            return NAN
+        return self.total / self.params['timeperiod']
+
+
+class EMA(StreamingIndicator):
+    # skip drops the first values before seeding (TA-Lib's MACD fast-EMA alignment)
+    def __init__(self, timeperiod=30, skip=0, field='Close'):
+        super().__init__(timeperiod=timeperiod, skip=skip, field=field)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = None
+
+    def update(self, bar):
+        x = bar[self.params['field']] if isinstance(bar, dict) else bar
+        n = self.params['timeperiod']
+        self.count += 1
+        if self.value is not None:
+            self.value = (x - self.value) * (2.0 / (n + 1)) + self.value
+            return self.value
+        if self.count <= self.params['skip']:
+            return NAN
+        self.seed_sum += x
+        if self.count - self.params['skip'] == n:
+            self.value = self.seed_sum / n
+            return self.value
+        return NAN
+
+
+class MACD(StreamingIndicator):
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        super().__init__(fastperiod=fastperiod, slowperiod=slowperiod, signalperiod=signalperiod)
+        fastperiod, slowperiod = sorted((fastperiod, slowperiod))
+        self.fast = EMA(fastperiod, skip=slowperiod - fastperiod)
+        self.slow = EMA(slowperiod)
+        self.signal = EMA(signalperiod)
+
+    def update(self, bar):
+        x = bar['Close']
+        fast = self.fast.update(x)
+        slow = self.slow.update(x)
+        if math.isnan(slow):
+            return NAN, NAN, NAN
+        line = fast - slow
+        signal = self.signal.update(line)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+        return line, signal, line - signal
+
+
+class RSI(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_close = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, bar):
+        x = bar['Close']
+        n = self.params['timeperiod']
+        if self.prev_close is None:
+            self.prev_close = x
+            return NAN
+        delta = x - self.prev_close
+        self.prev_close = x
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        self.count += 1
+        if self.count < n:
+            self.gain += gain
+            self.loss += loss
+            return NAN
+        if self.count == n:
+            self.gain = (self.gain + gain) / n
+            self.loss = (self.loss + loss) / n
+        else:
+            self.gain = (self.gain * (n - 1) + gain) / n
+            self.loss = (self.loss * (n - 1) + loss) / n
+        total = self.gain + self.loss
+        return 0.0 if _is_zero(total) else 100.0 * self.gain / total
+
+
+class BBANDS(StreamingIndicator):
+    def __init__(self, timeperiod=5, nbdevup=2.0, nbdevdn=2.0):
+        super().__init__(timeperiod=timeperiod, nbdevup=nbdevup, nbdevdn=nbdevdn)
+        self.window = deque(maxlen=timeperiod)
+        self.squares = deque(maxlen=timeperiod)
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def update(self, bar):
+        n = self.params['timeperiod']
+        x = bar['Close']
+        self.total = _slide(self.window, self.total, x)
+        self.total_squares = _slide(self.squares, self.total_squares, x * x)
+        if len(self.window) < n:
+            return NAN, NAN, NAN
+        mean = self.total / n
+        variance = self.total_squares / n - mean * mean
+        std = 0.0 if variance < 1e-14 else math.sqrt(variance)
+        return mean + self.params['nbdevup'] * std, mean, mean - self.params['nbdevdn'] * std
+
+
+def _true_range(bar, prev_close):
+    return max(bar['High'] - bar['Low'], abs(bar['High'] - prev_close), abs(bar['Low'] - prev_close))
+
+
+class ATR(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_close = None
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, bar):
+        n = self.params['timeperiod']
+        if self.prev_close is None:
+            self.prev_close = bar['Close']
+            return NAN
+        tr = _true_range(bar, self.prev_close)
+        self.prev_close = bar['Close']
+        self.count += 1
+        if self.count < n:
+            self.value += tr
+            return NAN
+        if self.count == n:
+            self.value = (self.value + tr) / n
+        else:
+            self.value = (self.value * (n - 1) + tr) / n
+        return self.value
+
+
+class ADX(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev = None
+        self.count = 0
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.value = None
+
+    def update(self, bar):
+        n = self.params['timeperiod']
+        if self.prev is None:
+            self.prev = [bar['High'], bar['Low'], bar['Close']]
+            return NAN
+        prev_high, prev_low, prev_close = self.prev
+        diff_p = bar['High'] - prev_high
+        diff_m = prev_low - bar['Low']
+        plus_dm = diff_p if diff_p > 0 and diff_p > diff_m else 0.0
+        minus_dm = diff_m if diff_m > 0 and diff_p < diff_m else 0.0
+        tr = _true_range(bar, prev_close)
+        self.prev = [bar['High'], bar['Low'], bar['Close']]
+        self.count += 1
+
+        if self.count < n:
+            self.plus_dm += plus_dm
+            self.minus_dm += minus_dm
+            self.tr += tr
+            return NAN
+        self.plus_dm = self.plus_dm - self.plus_dm / n + plus_dm
+        self.minus_dm = self.minus_dm - self.minus_dm / n + minus_dm
+        self.tr = self.tr - self.tr / n + tr
+        dx = None
+        if not _is_zero(self.tr):
+            plus_di = 100.0 * self.plus_dm / self.tr
+            minus_di = 100.0 * self.minus_dm / self.tr
+            if not _is_zero(plus_di + minus_di):
+                dx = 100.0 * abs(minus_di - plus_di) / (plus_di + minus_di)
+
+        if self.value is None:
+            self.sum_dx += dx or 0.0
+            if self.count < 2 * n - 1:
+                return NAN
+            self.value = self.sum_dx / n
+        elif dx is not None:
+            self.value = (self.value * (n - 1) + dx) / n
+        return self.value
+
+
+class STOCH(StreamingIndicator):
+    def __init__(self, fastk_period=5, slowk_period=3, slowd_period=3):
+        super().__init__(fastk_period=fastk_period, slowk_period=slowk_period, slowd_period=slowd_period)
+        self.count = 0
+        self.highs = deque()
+        self.lows = deque()
+        self.slow_k = SMA(slowk_period)
+        self.slow_d = SMA(slowd_period)
+
+    def update(self, bar):
+        n = self.params['fastk_period']
+        self.count += 1
+        highest = _push_extreme(self.highs, self.count, bar['High'], n, larger=True)
+        lowest = _push_extreme(self.lows, self.count, bar['Low'], n, larger=False)
+        if self.count < n:
+            return NAN, NAN
+        diff = (highest - lowest) / 100.0
+        fast_k = (bar['Close'] - lowest) / diff if diff != 0 else 0.0
+        slow_k = self.slow_k.update(fast_k)
+        if math.isnan(slow_k):
+            return NAN, NAN
+        slow_d = self.slow_d.update(slow_k)
+        if math.isnan(slow_d):
+            return NAN, NAN
+        return slow_k, slow_d
+
+
+class CCI(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.window = deque(maxlen=timeperiod)
+        self.total = 0.0
+
+    def update(self, bar):
+        n = self.params['timeperiod']
+        tp = (bar['High'] + bar['Low'] + bar['Close']) / 3.0
+        self.total = _slide(self.window, self.total, tp)
+        if len(self.window) < n:
+            return NAN
+        mean = self.total / n
+        # The mean absolute deviation is taken around the current mean, so it has no
+        # running form and stays O(timeperiod) (TA-Lib loops over the window too)
+        mean_dev = sum(abs(x - mean) for x in self.window) / n
+        last = tp - mean
+        return last / (0.015 * mean_dev) if last != 0 and mean_dev != 0 else 0.0
+
+
+class WILLR(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.count = 0
+        self.highs = deque()
+        self.lows = deque()
+
+    def update(self, bar):
+        n = self.params['timeperiod']
+        self.count += 1
+        highest = _push_extreme(self.highs, self.count, bar['High'], n, larger=True)
+        lowest = _push_extreme(self.lows, self.count, bar['Low'], n, larger=False)
+        if self.count < n:
+            return NAN
+        diff = (highest - lowest) / -100.0
+        return (highest - bar['Close']) / diff if diff != 0 else 0.0
+
+
+class MFI(StreamingIndicator):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_tp = None
+        self.positive = deque(maxlen=timeperiod)
+        self.negative = deque(maxlen=timeperiod)
+        self.positive_total = 0.0
+        self.negative_total = 0.0
+
+    def update(self, bar):
+        tp = (bar['High'] + bar['Low'] + bar['Close']) / 3.0
+        if self.prev_tp is None:
+            self.prev_tp = tp
+            return NAN
+        flow = tp * bar['Volume']
+        self.positive_total = _slide(self.positive, self.positive_total, flow if tp > self.prev_tp else 0.0)
+        self.negative_total = _slide(self.negative, self.negative_total, flow if tp < self.prev_tp else 0.0)
+        self.prev_tp = tp
+        if len(self.positive) < self.params['timeperiod']:
+            return NAN
+        pos = self.positive_total
+        total = pos + self.negative_total
+        return 0.0 if total < 1.0 else 100.0 * pos / total
+
+
+class ROC(StreamingIndicator):
+    def __init__(self, timeperiod=10):
+        super().__init__(timeperiod=timeperiod)
+        self.window = deque(maxlen=timeperiod + 1)
+
+    def update(self, bar):
+        self.window.append(bar['Close'])
+        if len(self.window) <= self.params['timeperiod']:
+            return NAN
+        prev = self.window[0]
+        return (bar['Close'] / prev - 1.0) * 100.0 if prev != 0 else 0.0
+
+
+STREAMING_INDICATORS = {cls.__name__: cls for cls in
+                        [SMA, EMA, MACD, RSI, BBANDS, ATR, ADX, STOCH, CCI, WILLR, MFI, ROC]}
+
+
+class IndicatorSet:
+    """Streaming counterpart of ``indicator_engine.compute_indicators`` for one ticker.
+
+    Takes the same (output columns, indicator, parameters) specs. Feeding a bar with
+    the date of the last bar replaces it instead of appending, so intraday snapshots
+    of the current session can be refreshed repeatedly. Only a bar fed as revisable
+    snapshots the indicators' state (O(window)); the other bars stay O(1).
+    anchor is the date and close of the newest final bar, used by ``matches``.
+    """
+
+    def __init__(self, specs):
+        self.specs = [(list(names), indicator, dict(params)) for names, indicator, params in specs]
+        self.indicators = [STREAMING_INDICATORS[indicator](**params) for _, indicator, params in self.specs]
+        self.last_date = None
+        self.last_close = None
+        self.anchor = None
+        self.checkpoint = None
+
+    @property
+    def columns(self):
+        return [name for names, _, _ in self.specs for name in names]
+
+    def _apply(self, bar):
+        values = {}
+        for (names, _, _), indicator in zip(self.specs, self.indicators):
+            result = indicator.update(bar)
+            if not isinstance(result, tuple):
+                result = (result,)
+            values.update(zip(names, result))
+        return values
+
+    # Advance by one bar; returns {column: latest value}.
+    # revisable=False skips the rollback snapshot: the bar can then not be replaced.
+    def update(self, date, bar, revisable=True):
+        date = pd.Timestamp(date)
+        bar = {key: float(value) for key, value in bar.items()}
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError(f"Bar for {date.date()} is older than the last processed bar {self.last_date.date()}")
+        if self.last_date is not None and date == self.last_date:
+            # Revised bar for the current date: roll back to the state before it
+            if self.checkpoint is None:
+                raise ValueError(f"Bar for {date.date()} was fed as final and cannot be revised")
+            self.indicators = [StreamingIndicator.from_state(s) for s in self.checkpoint]
+        else:
+            if self.last_date is not None:
+                self.anchor = [str(self.last_date), self.last_close]
+            self.checkpoint = [indicator.state_dict() for indicator in self.indicators] if revisable else None
+        self.last_date = date
+        self.last_close = bar.get('Close')
+        return self._apply(bar)
+
+    # Feed every row of an OHLCV frame (newer than the last processed bar) and
+    # return the produced indicator values as a frame; only the last row stays revisable
+    def update_frame(self, df):
+        if self.last_date is not None:
+            df = df[df.index >= self.last_date]
+        fields = [c for c in ['Open', 'High', 'Low', 'Close', 'Volume'] if c in df.columns]
+        last = len(df) - 1
+        rows = [self.update(date, dict(zip(fields, values)), revisable=i == last)
+                for i, (date, values) in enumerate(zip(df.index, df[fields].itertuples(index=False)))]
+        return pd.DataFrame(rows, index=df.index, columns=self.columns)
+
+    # False when the bars no longer hold the anchor's close, i.e. the history was
+    # re-adjusted (split or dividend) after the state was built and must be rebuilt
+    def matches(self, bars, tolerance=1e-9):
+        if self.anchor is None:
+            return True
+        date, close = pd.Timestamp(self.anchor[0]), self.anchor[1]
+        if date not in bars.index:
+            return False
+        return abs(bars.at[date, 'Close'] - close) <= tolerance * abs(close)
+
+    def state_dict(self):
+        return {
+            'specs': self.specs,
+            'last_date': str(self.last_date) if self.last_date is not None else None,
+            'last_close': self.last_close,
+            'anchor': self.anchor,
+            'indicators': [indicator.state_dict() for indicator in self.indicators],
+            'checkpoint': self.checkpoint,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(state['specs'])
+        obj.indicators = [StreamingIndicator.from_state(s) for s in state['indicators']]
+        obj.last_date = pd.Timestamp(state['last_date']) if state['last_date'] else None
+        obj.last_close = state['last_close']
+        obj.anchor = state['anchor']
+        obj.checkpoint = state['checkpoint']
+        return obj
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state_dict(), f)
+        os.replace(tmp, path)
+
+    # None when there is no state or it was saved by an older layout of the indicators
+    # (the caller then rebuilds from the full history)
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        try:
+            return cls.from_state(state)
+        except (ValueError, KeyError, AttributeError):
+            return None
@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+# The scripts import each other as top-level modules (stock_predict's modules the same
+# way from their own directory), so the tests put both directories on the path
+for path in (ROOT, os.path.join(ROOT, 'stock_predict')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import bar_store
+from data_provider import FileProvider, market_of
+
+
+def _bars(dates, start=100.0):
+    close = np.linspace(start, start * 1.1, len(dates))
+    frame = pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                          'Volume': 1e6}, index=dates)
+    frame.index.name = 'Date'
+    return frame
+
+
+def _write(root, ticker, frame):
+    path = root / market_of(ticker)
+    path.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(path / f"{ticker}.parquet")
+
+
+class CountingProvider(FileProvider):
+    """FileProvider that records its chunks and fails every chunk holding BAD."""
+
+    def __init__(self, root, **kwargs):
+        super().__init__(root, retries=1, backoff=0, **kwargs)
+        self.chunks = []
+
+    def fetch_chunk(self, tickers, start, end, interval):
+        self.chunks.append(list(tickers))
+        if 'BAD' in tickers:
+            raise ValueError('bad symbol')
+        return super().fetch_chunk(tickers, start, end, interval)
+
+
+def test_fetch_batches_and_isolates_failures(tmp_path):
+    dates = pd.bdate_range('2024-01-01', periods=20)
+    for ticker in ['AAPL', 'MSFT', '2330.TW']:
+        _write(tmp_path, ticker, _bars(dates))
+    provider = CountingProvider(str(tmp_path), chunk_size=2, max_workers=2)
+
+    panel = provider.fetch(['AAPL', 'BAD', 'MSFT', '2330.TW', 'MISSING'], dates[0])
+    assert list(dict.fromkeys(panel.index.get_level_values('Ticker'))) == ['AAPL', 'MSFT', '2330.TW']
+    assert len(panel.loc['AAPL']) == 20
+    assert set(provider.errors) == {'BAD', 'MISSING'}
+    assert provider.errors['BAD'] == 'bad symbol'
+    # The chunk with BAD is retried ticker by ticker; the others stay batched
+    assert sorted(map(sorted, provider.chunks)) == [['2330.TW', 'MSFT'], ['AAPL'], ['AAPL', 'BAD'], ['BAD'], ['MISSING']]
+
+
+def test_refresh_appends_deltas_and_rebases_adjusted_history(tmp_path):
+    source, cache = tmp_path / 'source', str(tmp_path / 'cache')
+    dates = pd.bdate_range('2024-01-01', periods=30)
+    history = _bars(dates)
+    _write(source, 'AAPL', history.iloc[:25])
+    provider = FileProvider(str(source), retries=1)
+
+    assert len(bar_store.refresh_bars('AAPL', dates[0], max_age=0, root=cache, provider=provider)) == 25
+    _write(source, 'AAPL', history)
+    bars = bar_store.refresh_bars('AAPL', dates[0], max_age=0, root=cache, provider=provider)
+    pd.testing.assert_frame_equal(bars, history, check_freq=False)
+
+    # A 2:1 split re-adjusts the whole history; the stored bars must not keep the old basis
+    adjusted = history.copy()
+    adjusted[['Open', 'High', 'Low', 'Close']] /= 2
+    _write(source, 'AAPL', adjusted)
+    bars = bar_store.refresh_bars('AAPL', dates[0], max_age=0, root=cache, provider=provider)
+    pd.testing.assert_frame_equal(bars, adjusted, check_freq=False)
+    pd.testing.assert_frame_equal(bar_store.load_bars('AAPL', root=cache), adjusted, check_freq=False)
@@ -0,0 +1,110 @@
+import os
+import shutil
+
+import pandas as pd
+
+import institutional_store
+from conftest import FIXTURES
+
+SAMPLE = os.path.join(FIXTURES, 'T86_20241016.csv')
+
+
+def test_parse_t86_skips_note_lines():
+    frame = institutional_store.parse_t86(SAMPLE)
+    assert frame['ticker'].tolist() == ['2330.TW', '0050.TW', '2881A.TW']
+    assert (frame['date'] == pd.Timestamp('2024-10-16')).all()
+
+
+def test_parse_t86_sums_institution_columns():
+    row = institutional_store.parse_t86(SAMPLE).set_index('ticker').loc['2330.TW']
+    assert row['Foreign_Investor_Buy'] == 12000
+    assert row['Investment_Trust_Sell'] == 500
+    # Proprietary and hedging dealer columns are added up
+    assert row['Dealer_Buy'] == 600
+    assert row['Dealer_Sell'] == 300
+    assert row['Net_Buy'] == 4800
+
+
+def test_parse_t86_reads_roc_date_from_title():
+    with open(SAMPLE, 'rb') as f:
+        frame = institutional_store.parse_t86(f.read())
+    assert (frame['date'] == pd.Timestamp('2024-10-16')).all()
+
+
+def _revised_copy(directory, date, net_buy):
+    path = os.path.join(directory, f"T86_{date}.csv")
+    with open(SAMPLE, encoding='cp950') as f:
+        text = f.read()
+    with open(path, 'w', encoding='cp950') as f:
+        f.write(text.replace('"4,800"', f'"{net_buy:,}"'))
+    return path
+
+
+def test_ingest_replaces_a_reingested_day(tmp_path):
+    root = str(tmp_path / 'store')
+    assert institutional_store.ingest([SAMPLE], root=root) == 3
+    assert institutional_store.ingest([_revised_copy(tmp_path, '20241017', 100)], root=root) == 3
+    assert institutional_store.ingest([_revised_copy(tmp_path, '20241016', 999)], root=root) == 3
+
+    stored = institutional_store.load_store(root)
+    assert len(stored) == 6
+    assert stored[['ticker', 'date']].equals(stored[['ticker', 'date']].sort_values(['ticker', 'date']))
+    assert institutional_store.stored_dates(root) == {pd.Timestamp('2024-10-16'), pd.Timestamp('2024-10-17')}
+
+    tsmc = institutional_store.institutional_trading('2330.TW', root=root)
+    assert tsmc['Date'].tolist() == [pd.Timestamp('2024-10-16'), pd.Timestamp('2024-10-17')]
+    assert tsmc['Net_Buy'].tolist() == [999, 100]
+    assert institutional_store.institutional_trading('2330.TW', days=1, root=root)['Net_Buy'].tolist() == [100]
+    assert institutional_store.institutional_trading('9999.TW', root=root).empty
+
+
+def test_download_returns_raw_files_not_ingested_yet(tmp_path, monkeypatch):
+    root = str(tmp_path / 'store')
+    os.makedirs(os.path.join(root, 'raw'))
+    leftover = institutional_store.raw_path('2024-10-16', root)
+    shutil.copy(SAMPLE, leftover)
+    monkeypatch.setattr(institutional_store.urllib.request, 'urlopen', _no_network)
+    assert institutional_store.download('2024-10-16', '2024-10-16', root=root, pause=0) == [leftover]
+    institutional_store.ingest([leftover], root=root)
+    assert institutional_store.download('2024-10-16', '2024-10-16', root=root, pause=0) == []
+
+
+def _no_network(*args, **kwargs):
+    raise AssertionError('unexpected download')
+
+
+class _Response:
+    def __init__(self, text):
+        self.data = text.encode('utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def read(self):
+        return self.data
+
+
+def test_download_only_records_explicit_no_data_days(tmp_path, monkeypatch):
+    root = str(tmp_path / 'store')
+    pages = {
+        '20241009': '{"stat": "很抱歉，沒有符合條件的資料!"}',  # holiday
+        '20241010': '<html>Too many requests</html>',           # throttled
+    }
+    requested = []
+
+    def urlopen(url, timeout):
+        date = url.split('date=')[1][:8]
+        requested.append(date)
+        if date == '20241011':
+            raise TimeoutError('timed out')
+        return _Response(pages[date])
+
+    monkeypatch.setattr(institutional_store.urllib.request, 'urlopen', urlopen)
+    assert institutional_store.download('2024-10-09', '2024-10-11', root=root, pause=0) == []
+    requested.clear()
+    institutional_store.download('2024-10-09', '2024-10-11', root=root, pause=0)
+    # The holiday is not asked for again; the throttled and failed days are
+    assert requested == ['20241010', '20241011']
@@ -0,0 +1,93 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from news_client import NewsClient, fetch_rss_many, google_news_url
+
+RSS = """<?xml version="1.0"?><rss><channel>
+<item><title>{query} up</title><description>good</description><link>https://example.com/1</link></item>
+<item><title>{query} down</title><description>bad</description><link>https://example.com/2</link></item>
+</channel></rss>"""
+
+
+class FeedServer(ThreadingHTTPServer):
+    """Local stand-in for the news feeds: counts requests per path and the peak number of
+    requests in flight; paths containing "missing" answer 404."""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), FeedHandler)
+        self.delay = delay
+        self.requests = {}
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/rss"
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] = server.requests.get(self.path, 0) + 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        if 'missing' in self.path:
+            self.send_error(404)
+            return
+        body = RSS.format(query=self.path).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FeedServer(delay=0.1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_duplicate_queries_are_downloaded_once_then_cached(server, tmp_path):
+    client = NewsClient(root=str(tmp_path))
+    feeds = fetch_rss_many(['2330.TW stock', 'chip', '2330.TW stock'], client=client, base_url=server.url)
+    assert list(feeds) == ['2330.TW stock', 'chip']
+    assert [item['link'] for item in feeds['chip']] == ['https://example.com/1', 'https://example.com/2']
+    assert sorted(server.requests.values()) == [1, 1]
+
+    again = fetch_rss_many(['chip'], client=NewsClient(root=str(tmp_path)), base_url=server.url)
+    assert again['chip'] == feeds['chip']
+    assert sum(server.requests.values()) == 2
+
+
+def test_connections_per_host_are_bounded(server, tmp_path):
+    client = NewsClient(root=str(tmp_path), per_host=2)
+    urls = [google_news_url(f"q{i}", server.url) for i in range(6)]
+    bodies = client.fetch(urls)
+    assert all(bodies[url] for url in urls)
+    assert server.peak <= 2
+
+
+def test_failed_downloads_are_retried_and_reported(server, tmp_path):
+    client = NewsClient(root=str(tmp_path), retries=1)
+    url = f"{server.url}/missing"
+    assert client.fetch([url]) == {url: None}
+    assert server.requests['/rss/missing'] == 2
+    assert url in client.errors
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import reference_data
+from conftest import FIXTURES
+from reference_data import ReferenceCache, asof_join, get_financials, get_macro
+
+
+def _no_network():
+    raise AssertionError('unexpected download')
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # FRED downloads read the fixture CSVs; financials are stored from the fixture directly
+    monkeypatch.setattr(reference_data, 'FRED_CSV_URL', os.path.join(FIXTURES, 'fred', '{series}.csv'))
+    cache = ReferenceCache(root=str(tmp_path / 'reference'))
+    financials = pd.read_csv(os.path.join(FIXTURES, 'financials', 'AAPL.csv'), index_col=0, parse_dates=True)
+    cache.store('financials', 'AAPL', financials)
+    return cache
+
+
+def test_fresh_entries_are_not_downloaded_again(cache):
+    frame = cache.get('financials', 'AAPL', _no_network, ttl=3600)
+    assert frame['Net Income'].tolist() == [99803000000, 96995000000]
+
+
+def test_offline_cache_reads_disk_only(cache):
+    get_macro(['CPI'], cache=cache)
+    offline = ReferenceCache(root=cache.root, offline=True)
+    # Expired entries are still served offline, missing ones come back as None
+    assert offline.get('macro', 'CPIAUCSL', _no_network, ttl=0) is not None
+    assert offline.get('macro', 'GDP', _no_network, ttl=0) is None
+
+
+def test_macro_is_indexed_by_publication_date(cache):
+    macro = get_macro(['CPI'], cache=cache)
+    lag = reference_data.MACRO_SERIES['CPI'][2]
+    assert macro.index[0] == pd.Timestamp('2024-01-01') + lag
+    # The missing March value ('.') is forward-filled with February's
+    assert macro['CPI'].tolist() == [308.4, 310.3, 313.0]
+
+
+def test_asof_join_uses_only_published_values(cache):
+    financials = get_financials(['AAPL'], cache=cache)
+    macro = get_macro(['CPI'], cache=cache)
+    published = pd.Timestamp('2023-09-30') + reference_data.FINANCIALS_LAG
+    dates = [published - pd.Timedelta(days=1), published, pd.Timestamp('2024-02-15'), pd.Timestamp('2024-03-20')]
+    panel = pd.DataFrame({'ticker': 'AAPL', 'date': dates, 'close': 1.0})
+
+    joined = asof_join(panel, financials, macro, fields=['Net Income'])
+    assert joined['Net Income'].tolist() == [99803000000, 96995000000, 96995000000, 96995000000]
+    # January CPI is published on 2024-02-15 (lag 45 days), February's on 2024-03-17
+    assert np.isnan(joined['CPI'].iloc[1])
+    assert joined['CPI'].tolist()[2:] == [308.4, 310.3]
+    assert joined.index.equals(panel.index)
+
+
+def test_asof_join_keeps_a_feature_index(cache):
+    financials = get_financials(['AAPL'], cache=cache)
+    index = pd.MultiIndex.from_tuples([('AAPL', pd.Timestamp('2023-12-28')), ('AAPL', pd.Timestamp('2022-06-30'))],
+                                      names=['Ticker', 'Date'])
+    features = pd.DataFrame({'RSI': [55.0, 45.0]}, index=index)
+
+    joined = asof_join(features, financials, fields=['Total Revenue'])
+    assert joined.index.equals(index)
+    assert joined['Total Revenue'].iloc[0] == 394328000000
+    assert np.isnan(joined['Total Revenue'].iloc[1])
+
+
+def test_asof_join_accepts_tz_aware_dates(cache):
+    financials = get_financials(['AAPL'], cache=cache)
+    dates = pd.DatetimeIndex(['2023-12-28', '2023-12-29'], tz='America/New_York')
+    features = pd.DataFrame({'RSI': [55.0, 60.0]},
+                            index=pd.MultiIndex.from_product([['AAPL'], dates], names=['Ticker', 'Date']))
+
+    joined = asof_join(features, financials, fields=['Total Revenue'])
+    assert joined.index.equals(features.index)
+    assert joined['Total Revenue'].tolist() == [394328000000, 383285000000]
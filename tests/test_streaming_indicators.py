@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_engine import ANALYZER_SPECS, compute_frame
+from streaming_indicators import IndicatorSet
+
+
+def _bars(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                         'Volume': rng.integers(100_000, 1_000_000, n).astype(float)},
+                        index=pd.bdate_range('2024-01-01', periods=n))
+
+
+def test_stream_matches_the_vectorized_engine():
+    bars = _bars()
+    state = IndicatorSet(ANALYZER_SPECS)
+    streamed = state.update_frame(bars)
+    expected = compute_frame(bars, ANALYZER_SPECS)[state.columns]
+    np.testing.assert_allclose(streamed.to_numpy(), expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+def test_only_the_last_bar_is_revisable(tmp_path):
+    bars = _bars()
+    state = IndicatorSet(ANALYZER_SPECS)
+    final = state.update_frame(bars).iloc[-1]
+
+    # An intraday snapshot of the last bar, then the final bar again: same values as before
+    snapshot = bars.iloc[[-1]] * 1.05
+    state.update_frame(snapshot)
+    path = str(tmp_path / 'state.json')
+    state.save(path)
+    resumed = IndicatorSet.load(path)
+    pd.testing.assert_series_equal(resumed.update_frame(bars).iloc[-1], final)
+
+    with pytest.raises(ValueError):
+        state.update(bars.index[-2], bars.iloc[-2].to_dict())
+    other = IndicatorSet(ANALYZER_SPECS)
+    other.update(bars.index[0], bars.iloc[0].to_dict(), revisable=False)
+    with pytest.raises(ValueError):
+        other.update(bars.index[0], bars.iloc[0].to_dict())
+
+
+def test_split_adjusted_history_invalidates_the_state():
+    bars = _bars()
+    state = IndicatorSet(ANALYZER_SPECS)
+    state.update_frame(bars.iloc[:-1])
+    assert state.matches(bars)
+
+    # bar_store re-downloads the whole history after a 2:1 split
+    adjusted = bars.copy()
+    adjusted[['Open', 'High', 'Low', 'Close']] /= 2
+    assert not state.matches(adjusted)
+
+    rebuilt = IndicatorSet(ANALYZER_SPECS).update_frame(adjusted)
+    expected = compute_frame(adjusted, ANALYZER_SPECS)[rebuilt.columns]
+    np.testing.assert_allclose(rebuilt.to_numpy(), expected.to_numpy(), rtol=1e-9, equal_nan=True)
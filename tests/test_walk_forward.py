@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from walk_forward import WalkForwardTrainer, stack_features
+
+
+def _features(dates, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({'a': rng.normal(size=len(dates)), 'b': rng.normal(size=len(dates))}, index=dates)
+    y = pd.Series((X['a'] > 0).astype(int), index=dates)
+    return X, y
+
+
+def _universe(dates):
+    # One US and one Taiwan ticker, each on its exchange's time zone like yfinance history()
+    return {
+        'AAPL': _features(dates.tz_localize('America/New_York'), 0),
+        '2330.TW': _features(dates.tz_localize('Asia/Taipei'), 1),
+    }
+
+
+def test_stack_features_uses_naive_exchange_dates():
+    dates = pd.bdate_range('2024-01-01', periods=10)
+    X, y = stack_features(_universe(dates))
+    stacked = X.index.get_level_values('Date')
+    assert stacked.tz is None
+    assert set(stacked) == set(dates[:-1])
+    assert X.index.equals(y.index)
+
+
+def test_second_run_only_adds_new_dates(tmp_path):
+    dates = pd.bdate_range('2024-01-01', periods=120)
+    kwargs = dict(base_trees=5, trees_per_fold=2, n_folds=3, n_jobs=1, root=str(tmp_path))
+
+    first = WalkForwardTrainer('tz', **kwargs).update(*stack_features(_universe(dates[:100])))
+    assert len(first) == 3
+
+    trainer = WalkForwardTrainer('tz', **kwargs)
+    second = trainer.update(*stack_features(_universe(dates)))
+    assert len(second) == 1
+    assert second['test_start'].iloc[0] == dates[99].date()
+    assert second['test_end'].iloc[0] == dates[118].date()
+    assert trainer.meta['last_date'] == str(dates[118].date())
+    assert trainer.update(*stack_features(_universe(dates))).empty
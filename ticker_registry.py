@@ -0,0 +1,237 @@
+import logging
+import re
+import zlib
+
+import pandas as pd
+
+from data_provider import market_of
+
+logger = logging.getLogger(__name__)
+
+# Source lists, as maintained by hand. Duplicates and provider-style spellings (BRK/B)
+# are fine here: every subset is normalized and deduplicated once at import.
+US_ETFS = [
+    "QQQ", "QQQM", "VOO", "VTI", "SPY", "IVV", "DIA",
+    "VT", "VXUS", "VUG", "VO", "XLF", "BND", "VWO", "DIAU", "QQQX",
+]
+
+US_CORE_STOCKS = [
+    "TSLA", "AAPL", "AMZN", "AMD", "NKE", "V", "TSM", "INTC",
+    "MSFT", "ADBE", "GOOG", "MU", "NVDA", "MCD", "SMCI", "BE",
+    "PLUG", "APD", "FCEL", "BLDP", "KO", "PLTR", "SOUN", "META",
+    "CFLT", "AVGO", "QCOM", "IBKR", "LULU", "DDOG", "ZS", "MDB",
+    "NFLX", "ORLY", "BKNG", "ASML", "INTU", "TPL", "URI", "UNH",
+    "ASX",
+]
+
+US_INDUSTRY_STOCKS = [
+    "DJCO", "PLBY", "ORCL", "PFE", "MRK", "TPR", "RH", "MSTR",
+    "PGR", "TER", "MRVL", "ANET", "LW", "CLS", "CIEN", "INTU",
+    "IBM", "BRK/B", "MELI", "COIN", "CRWD", "FICO", "NOW",
+    "HUBS", "IT", "MA", "ROP", "MPWR", "KLAC", "TYL", "MTD",
+    "LLY", "REGN", "GHC", "MUSA", "CVCO", "MSCI", "GS", "AMP",
+    "LNG", "PNRG", "TRGP", "URI", "PH", "LII", "SPOT", "CHTR", "MLM",
+    "NEU", "LIN", "COST", "CASY", "SAM", "EQIX", "PSA", "ESS",
+    "CEG", "VST", "ATO", "QUBT", "TNXP", "PG", "JNJ", "ABBV",
+]
+
+# stock_predict/stock_analyzer.py watchlists (the "ETFs" list also holds financial stocks)
+TW_ANALYZER_STOCKS = [
+    "2330.TW", "2317.TW", "2382.TW", "2303.TW", "1216.TW", "3711.TW", "1303.TW", "2002.TW", "1301.TW", "3231.TW",
+    "3045.TW", "2542.TW", "2449.TW", "5388.TW", "2376.TW", "2603.TW", "3035.TW", "2356.TW", "2357.TW", "2383.TW",
+    "2360.TW", "2454.TW", "6505.TW", "2412.TW", "2308.TW", "2881.TW", "3017.TW", "3006.TW", "2408.TW", "2344.TW",
+    "8046.TW", "3037.TW", "2891.TW", "2882.TW", "2353.TW", "1513.TW", "8996.TW", "6282.TW", "1795.TW", "2388.TW",
+]
+
+TW_ANALYZER_ETFS = [
+    "00929.TW", "00712.TW", "00637L.TW", "2884.TW", "00650L.TW", "2886.TW", "2892.TW", "00893.TW", "00706L.TW",
+    "2880.TW", "00830.TW", "00900.TW", "0050.TW", "5880.TW", "00673R.TW", "00715L.TW", "00633L.TW", "2812.TW",
+    "00885.TW", "00895.TW", "00662.TW", "00888.TW", "00646.TW", "00903.TW", "00683L.TW", "00642U.TW", "00770.TW",
+    "00762.TW", "0051.TW", "00851.TW", "006203.TW", "00660.TW",
+]
+
+# stock_predict/stock_analysis.py universe and report industries
+TW_ANALYSIS = [
+    "2330.TW", "2317.TW", "2454.TW", "2412.TW", "2308.TW",
+    "2881.TW", "1303.TW", "2882.TW", "2303.TW", "2002.TW",
+    "0050.TW", "0056.TW", "00878.TW", "00881.TW",
+]
+
+TW_INDUSTRIES = {
+    '半導體': ["2330.TW", "2303.TW", "2454.TW"],
+    '電子零組件': ["2317.TW", "2354.TW", "2382.TW"],
+    '金融': ["2882.TW", "2881.TW", "2891.TW"],
+    '通訊網路': ["2412.TW", "3045.TW", "4904.TW"],
+}
+
+# TW notebook lists documented in the README
+TW_WATCH_ETFS = [
+    "0050.TW", "0051.TW", "00830.TW", "00642U.TW", "00646.TW", "00637L.TW",
+    "00633L.TW", "00637R.TW", "00715L.TW", "00712.TW", "00650L.TW", "2882.TW",
+    "00679B.TW", "2881.TW",
+]
+
+TW_WATCH_STOCKS = [
+    "2330.TW", "2317.TW", "2382.TW", "2412.TW", "1216.TW", "3711.TW", "3231.TW",
+    "3045.TW", "2542.TW", "2449.TW", "2360.TW", "5388.TW", "2376.TW", "2603.TW",
+    "3035.TW", "2454.TW", "2357.TW", "2383.TW", "3017.TW", "8046.TW", "3037.TW",
+    "2891.TW", "1513.TW", "2308.TW", "8996.TW", "1795.TW", "2388.TW", "2301.TW",
+    "6757.TW", "4938.TW", "2609.TW", "6446.TW", "2345.TW",
+]
+
+# GICS-style sector per stock; ETFs have none
+SECTORS = {
+    'Information Technology': [
+        "AAPL", "AMD", "TSM", "INTC", "MSFT", "ADBE", "MU", "NVDA", "SMCI", "PLTR", "SOUN", "CFLT", "AVGO", "QCOM",
+        "DDOG", "ZS", "MDB", "ASML", "INTU", "ASX", "ORCL", "MSTR", "TER", "MRVL", "ANET", "CLS", "CIEN", "IBM",
+        "CRWD", "FICO", "NOW", "HUBS", "IT", "ROP", "MPWR", "KLAC", "TYL", "QUBT",
+        "2330.TW", "2317.TW", "2382.TW", "2303.TW", "3711.TW", "3231.TW", "2449.TW", "5388.TW", "2376.TW",
+        "3035.TW", "2356.TW", "2357.TW", "2383.TW", "2360.TW", "2454.TW", "2308.TW", "3017.TW", "3006.TW",
+        "2408.TW", "2344.TW", "8046.TW", "3037.TW", "2353.TW", "6282.TW", "2388.TW", "2301.TW", "4938.TW",
+        "2345.TW", "2354.TW",
+    ],
+    'Communication Services': ["GOOG", "META", "NFLX", "SPOT", "CHTR", "DJCO", "3045.TW", "2412.TW", "4904.TW"],
+    'Consumer Discretionary': ["TSLA", "AMZN", "NKE", "MCD", "LULU", "ORLY", "BKNG", "PLBY", "TPR", "RH", "MELI",
+                               "GHC", "MUSA", "CVCO"],
+    'Consumer Staples': ["KO", "LW", "COST", "CASY", "SAM", "PG", "1216.TW"],
+    'Energy': ["TPL", "LNG", "PNRG", "TRGP", "6505.TW"],
+    'Financials': ["V", "IBKR", "PGR", "BRK-B", "COIN", "MA", "MSCI", "GS", "AMP",
+                   "2881.TW", "2891.TW", "2882.TW", "2884.TW", "2886.TW", "2892.TW", "2880.TW", "5880.TW", "2812.TW"],
+    'Health Care': ["UNH", "PFE", "MRK", "MTD", "LLY", "REGN", "TNXP", "JNJ", "ABBV", "1795.TW", "6446.TW"],
+    'Industrials': ["BE", "PLUG", "FCEL", "BLDP", "URI", "PH", "LII", "2603.TW", "1513.TW", "8996.TW", "2609.TW",
+                    "6757.TW"],
+    'Materials': ["APD", "MLM", "NEU", "LIN", "1303.TW", "2002.TW", "1301.TW"],
+    'Real Estate': ["EQIX", "PSA", "ESS", "2542.TW"],
+    'Utilities': ["CEG", "VST", "ATO"],
+}
+
+CURRENCIES = {'US': 'USD', 'TW': 'TWD'}
+
+_US_SYMBOL = re.compile(r'^[A-Z]{1,5}(-[A-Z]{1,2})?$')
+_TW_SYMBOL = re.compile(r'^\d{4,6}[A-Z]?\.TWO?$')
+
+
+# Canonical (Yahoo Finance) spelling of a symbol: upper case, share-class separators as
+# '-' (BRK/B, BRK.B -> BRK-B) and bare Taiwan codes listed on TWSE (2330 -> 2330.TW).
+# Raises ValueError for anything the data source would reject.
+def normalize_symbol(symbol):
+    text = str(symbol).strip().upper().replace(' ', '')
+    if re.fullmatch(r'\d{4,6}[A-Z]?', text):
+        text = f"{text}.TW"
+    elif not text.endswith(('.TW', '.TWO')):
+        text = re.sub(r'[/.]', '-', text)
+    if not (_TW_SYMBOL.match(text) or _US_SYMBOL.match(text)):
+        raise ValueError(f"Invalid ticker symbol: {symbol!r}")
+    return text
+
+
+def is_valid_symbol(symbol):
+    try:
+        normalize_symbol(symbol)
+    except ValueError:
+        return False
+    return True
+
+
+# Normalize a list, keeping the first occurrence of each symbol; invalid symbols are
+# dropped with a warning (or raise when strict)
+def normalize_many(symbols, strict=False):
+    result = {}
+    for symbol in symbols:
+        try:
+            result.setdefault(normalize_symbol(symbol), None)
+        except ValueError:
+            if strict:
+                raise
+            logger.warning("Skipping invalid ticker symbol %r", symbol)
+    return list(result)
+
+
+def _subsets():
+    us_stocks = normalize_many(US_CORE_STOCKS + US_INDUSTRY_STOCKS)
+    subsets = {
+        'us_etfs': normalize_many(US_ETFS),
+        'us_stocks': us_stocks,
+        'us_core': normalize_many(US_CORE_STOCKS),
+        'us_industry': normalize_many(US_INDUSTRY_STOCKS),
+        'tw_analyzer_stocks': normalize_many(TW_ANALYZER_STOCKS),
+        'tw_analyzer_etfs': normalize_many(TW_ANALYZER_ETFS),
+        'tw_analysis': normalize_many(TW_ANALYSIS),
+        'tw_watch_etfs': normalize_many(TW_WATCH_ETFS),
+        'tw_watch_stocks': normalize_many(TW_WATCH_STOCKS),
+    }
+    for industry, symbols in TW_INDUSTRIES.items():
+        subsets[f"tw_industry:{industry}"] = normalize_many(symbols)
+    subsets['us'] = normalize_many(subsets['us_etfs'] + subsets['us_stocks'])
+    subsets['tw'] = normalize_many(symbol for name, symbols in subsets.items() if name.startswith('tw_')
+                                   for symbol in symbols)
+    subsets['all'] = normalize_many(subsets['us'] + subsets['tw'])
+    return subsets
+
+
+SUBSETS = _subsets()
+
+_SECTOR_OF = {normalize_symbol(symbol): sector for sector, symbols in SECTORS.items() for symbol in symbols}
+_US_ETF_SET = set(SUBSETS['us_etfs'])
+
+
+def _category(symbol):
+    if market_of(symbol) == 'TW':
+        return 'ETF' if symbol.startswith('00') else 'Stock'
+    return 'ETF' if symbol in _US_ETF_SET else 'Stock'
+
+
+# One row per registered symbol: market, category (ETF/Stock), currency, sector
+REGISTRY = pd.DataFrame(
+    [(symbol, market_of(symbol), _category(symbol), CURRENCIES[market_of(symbol)], _SECTOR_OF.get(symbol))
+     for symbol in SUBSETS['all']],
+    columns=['symbol', 'market', 'category', 'currency', 'sector'],
+).set_index('symbol')
+
+
+def subset_names():
+    return list(SUBSETS)
+
+
+# Symbols of one or more named subsets ('us_stocks', 'tw_analyzer_etfs', ...), deduplicated in order
+def get_universe(*names):
+    unknown = [name for name in names if name not in SUBSETS]
+    if unknown:
+        raise KeyError(f"Unknown universe subset(s): {', '.join(unknown)}; known: {', '.join(SUBSETS)}")
+    return normalize_many(symbol for name in names for symbol in SUBSETS[name])
+
+
+# Metadata rows of the given symbols (normalized); unregistered symbols get market/currency
+# derived from the suffix and no category or sector
+def metadata(symbols=None):
+    if symbols is None:
+        return REGISTRY.copy()
+    symbols = normalize_many(symbols)
+    frame = REGISTRY.reindex(symbols)
+    missing = frame['market'].isna()
+    frame.loc[missing, 'market'] = [market_of(s) for s in frame.index[missing]]
+    frame.loc[missing, 'currency'] = frame.loc[missing, 'market'].map(CURRENCIES)
+    frame.index.name = 'symbol'
+    return frame
+
+
+# Registered symbols matching every given attribute, optionally within a subset
+def select(subset='all', market=None, category=None, sector=None, currency=None):
+    frame = REGISTRY.loc[get_universe(subset)]
+    for column, value in (('market', market), ('category', category), ('sector', sector), ('currency', currency)):
+        if value is not None:
+            frame = frame[frame[column] == value]
+    return frame.index.tolist()
+
+
+# Shard index of count (0-based) of a symbol list, in the list's original order.
+# Symbols are dealt round-robin in crc32 order of their canonical spelling, so every
+# process or machine computes the same split from the same list regardless of input
+# order or duplicates, and shard sizes differ by at most one.
+def shard(symbols, index, count):
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {index} of {count}")
+    symbols = normalize_many(symbols)
+    ranked = sorted(symbols, key=lambda s: (zlib.crc32(s.encode('utf-8')), s))
+    members = set(ranked[index::count])
+    return [symbol for symbol in symbols if symbol in members]
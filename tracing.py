@@ -0,0 +1,217 @@
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Environment switches read by session(): STOCK_TRACE=<Chrome trace JSON path> turns tracing on,
+# STOCK_LOG_LEVEL=DEBUG|INFO|WARNING|ERROR sets the log level (default INFO)
+TRACE_ENV = 'STOCK_TRACE'
+LOG_LEVEL_ENV = 'STOCK_LOG_LEVEL'
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_tracer = None
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """In-memory spans and counters of one process.
+
+    Spans are stored as Chrome-trace complete events ("ph": "X", microseconds);
+    counters are summed per (name, ticker) and also emitted as counter events so
+    they show up as tracks next to the spans.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.events = []
+        self.counters = {}
+        self.totals = {}
+
+    def add_span(self, stage, ticker, args, start_ns, end_ns, error=None):
+        args = dict(args)
+        if ticker is not None:
+            args['ticker'] = ticker
+        if error is not None:
+            args['error'] = error
+        event = {'name': stage, 'cat': 'stage', 'ph': 'X', 'ts': start_ns / 1000, 'dur': (end_ns - start_ns) / 1000,
+                 'pid': self.pid, 'tid': threading.get_ident(), 'args': args}
+        with self.lock:
+            self.events.append(event)
+
+    def count(self, name, value, ticker):
+        key = (name, ticker)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.totals[name] = self.totals.get(name, 0) + value
+            self.events.append({'name': name, 'cat': 'counter', 'ph': 'C', 'ts': time.time_ns() / 1000,
+                                'pid': self.pid, 'args': {name: self.totals[name]}})
+
+    # Hand everything recorded so far to the caller and start empty (used by pool workers)
+    def drain(self):
+        with self.lock:
+            events, counters = self.events, self.counters
+            self.events, self.counters = [], {}
+        return events, counters
+
+    def merge(self, recorded):
+        events, counters = recorded
+        with self.lock:
+            self.events.extend(events)
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+
+class _Span:
+    __slots__ = ('tracer', 'stage', 'ticker', 'args', 'start')
+
+    def __init__(self, tracer, stage, ticker, args):
+        self.tracer = tracer
+        self.stage = stage
+        self.ticker = ticker
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.add_span(self.stage, self.ticker, self.args, self.start, time.time_ns(),
+                             exc_type.__name__ if exc_type is not None else None)
+        return False
+
+
+def enable():
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+# Time a block as one stage (download, clean, indicators, model, plot, write...) of one ticker.
+# Disabled tracing returns a shared no-op context manager.
+def span(stage, ticker=None, **args):
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, stage, ticker, args)
+
+
+# Decorator form of span(); ticker_arg names the parameter holding the ticker.
+# Disabled tracing costs one global lookup per call.
+def traced(stage, ticker_arg=None):
+    def decorate(func):
+        signature = inspect.signature(func) if ticker_arg else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            ticker = signature.bind_partial(*args, **kwargs).arguments.get(ticker_arg) if signature else None
+            with _Span(_tracer, stage, ticker, {'function': func.__qualname__}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Add to a counter such as rows, bytes_written or cache_hits
+def count(name, value=1, ticker=None):
+    if _tracer is not None:
+        _tracer.count(name, value, ticker)
+
+
+def drain():
+    return _tracer.drain() if _tracer is not None else ([], {})
+
+
+def merge(recorded):
+    if _tracer is not None and recorded is not None:
+        _tracer.merge(recorded)
+
+
+# Per-stage totals: calls, distinct tickers, total/mean/p95/max milliseconds, slowest first
+def summary():
+    spans = [e for e in (_tracer.events if _tracer is not None else []) if e['ph'] == 'X']
+    columns = ['calls', 'tickers', 'total_ms', 'mean_ms', 'p95_ms', 'max_ms']
+    if not spans:
+        return pd.DataFrame(columns=columns)
+    frame = pd.DataFrame({'stage': [e['name'] for e in spans], 'ticker': [e['args'].get('ticker') for e in spans],
+                          'ms': [e['dur'] / 1000 for e in spans]})
+    grouped = frame.groupby('stage')
+    table = pd.DataFrame({
+        'calls': grouped.size(),
+        'tickers': grouped['ticker'].nunique(),
+        'total_ms': grouped['ms'].sum(),
+        'mean_ms': grouped['ms'].mean(),
+        'p95_ms': grouped['ms'].quantile(0.95),
+        'max_ms': grouped['ms'].max(),
+    })
+    return table[columns].sort_values('total_ms', ascending=False)
+
+
+# Counter totals: name -> total over all tickers and the number of tickers that contributed
+def counters():
+    items = list(_tracer.counters.items()) if _tracer is not None else []
+    frame = pd.DataFrame([(name, ticker, value) for (name, ticker), value in items],
+                         columns=['counter', 'ticker', 'value'])
+    grouped = frame.groupby('counter')
+    return pd.DataFrame({'total': grouped['value'].sum(), 'tickers': grouped['ticker'].nunique()})
+
+
+# Write the Chrome trace (open in chrome://tracing or https://ui.perfetto.dev)
+def export(path):
+    events = list(_tracer.events) if _tracer is not None else []
+    pids = sorted({e['pid'] for e in events})
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                 'args': {'name': 'main' if pid == os.getpid() else f"worker {pid}"}} for pid in pids]
+    trace = {'traceEvents': metadata + events, 'displayTimeUnit': 'ms',
+             'otherData': {'counters': {f"{name}/{ticker}" if ticker else name: value
+                                        for (name, ticker), value in (_tracer.counters.items() if _tracer else [])}}}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(trace, f)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def configure_logging(level=None):
+    level = level or os.environ.get(LOG_LEVEL_ENV, 'INFO')
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, format=LOG_FORMAT)
+
+
+# Entry-point wrapper: sets up logging, traces the whole run when STOCK_TRACE (or trace_path)
+# is set, then writes the Chrome trace and logs the per-stage summary
+@contextlib.contextmanager
+def session(name, trace_path=None):
+    configure_logging()
+    trace_path = trace_path or os.environ.get(TRACE_ENV)
+    if trace_path:
+        enable()
+    try:
+        with span(name):
+            yield
+    finally:
+        if trace_path:
+            export(trace_path)
+            logger.info("Trace written to %s", trace_path)
+            logger.info("Stage summary:\n%s", summary().to_string(float_format=lambda x: f"{x:.1f}"))
+            table = counters()
+            if not table.empty:
+                logger.info("Counters:\n%s", table.to_string())
@@ -1,34 +1,29 @@
-import yfinance as yf
 import pandas as pd
 import mplfinance as mpf
 import os
+import logging
 
-# 美股 ETF 清單
+import tracing
+from artifact_cache import ArtifactManifest
+from batch_runner import print_summary, run_batch
+from bar_store import get_bars, refresh_many
+from indicator_engine import TREND_SPECS, build_panel, compute_frame, compute_indicators, ticker_frame
+from results_dataset import write_results
+from run_manifest import RunManifest, checkpoint, merge_shards, run_arguments, shard_lists
+from ticker_registry import get_universe
+
+logger = logging.getLogger(__name__)
+
+# 美股 ETF 清單 (由 ticker_registry 統一維護，已去除重複與無效代碼)
 def get_us_etf_tickers():
-    return [
-        "QQQ", "QQQM", "VOO", "VTI", "SPY", "IVV", "DIA",
-        "VT", "VXUS", "VUG", "VO", "XLF", "BND", "VWO", "DIAU", "QQQX"
-    ]
+    return get_universe('us_etfs')
 
 # 美股個股清單
 def get_us_stock_tickers():
-    return [
-        "TSLA", "AAPL", "AMZN", "AMD", "NKE", "V", "TSM", "INTC",
-        "MSFT", "ADBE", "GOOG", "MU", "NVDA", "MCD", "SMCI", "BE",
-        "PLUG", "APD", "FCEL", "BLDP", "KO", "PLTR", "SOUN", "META",
-        "CFLT", "AVGO", "QCOM", "IBKR", "LULU", "DDOG", "ZS", "MDB",
-        "NFLX", "ORLY", "BKNG", "ASML", "INTU", "TPL", "URI", "UNH",
-        "ASX", "DJCO", "PLBY", "ORCL", "PFE", "MRK", "TPR", "RH",
-        "MSTR", "PGR", "TER", "MRVL", "ANET", "LW", "CLS", "CIEN",
-        "INTU", "IBM", "BRK/B", "MELI", "COIN", "CRWD", "FICO", "NOW",
-        "HUBS", "IT", "MA", "ROP", "MPWR", "KLAC", "TYL", "MTD", "LLY",
-        "REGN", "GHC", "MUSA", "CVCO", "MSCI", "GS", "AMP", "LNG", "PNRG",
-        "TRGP", "URI", "PH", "LII", "SPOT", "CHTR", "MLM", "NEU", "LIN",
-        "COST", "CASY", "SAM", "EQIX", "PSA", "ESS", "CEG", "VST", "ATO",
-        "QUBT", "TNXP", "PG", "JNJ", "ABBV"
-    ]
+    return get_universe('us_stocks')
 
 # Function to clean and prepare stock data
+@tracing.traced('clean')
 def clean_stock_data(df):
     # Flatten MultiIndex columns if necessary
     if isinstance(df.columns, pd.MultiIndex):
@@ -39,25 +34,46 @@ def clean_stock_data(df):
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')  # Convert non-numeric to NaN
             if df[col].isnull().any():
-                print(f"Warning: Non-numeric data found in column '{col}'. Dropping rows with NaN.")
+                logger.warning("Non-numeric data found in column '%s'. Dropping rows with NaN.", col)
             df = df.dropna(subset=[col])  # Drop rows with NaN in these columns
         else:
             raise KeyError(f"Missing expected column: {col}")
     return df
 
 # Function to download and prepare stock data
+@tracing.traced('download', 'ticker')
 def download_and_prepare_stock_data(ticker, start_date='2024-10-01'):
-    print(f"Downloading data for {ticker}...")
-    df = yf.download(ticker, start=start_date, end=pd.Timestamp('today'), interval='1d')
+    logger.debug("Downloading data for %s...", ticker)
+    df = get_bars(ticker, start=start_date, end=pd.Timestamp('today'))
     if df.empty:
         raise ValueError(f"No data available for {ticker}")
+    tracing.count('rows', len(df), ticker)
     df = df.ffill().bfill()  # Fill missing values
-    print(f"{ticker} data downloaded with columns: {list(df.columns)}")
+    logger.debug("%s data downloaded with columns: %s", ticker, list(df.columns))
     return clean_stock_data(df)
 
+# Function to compute the chart moving averages for every ticker in one pass
+def calculate_universe_indicators(frames):
+    with tracing.span('indicators', tickers=len(frames)):
+        return compute_indicators(build_panel(frames), TREND_SPECS)
+
+# Bump when the chart style changes so existing charts get redrawn
+PLOT_STYLE_VERSION = 1
+
+# Function to get the chart path of one ticker
+def chart_path_for(ticker, category):
+    return os.path.join(f"results_stock_analysis/{category}/{ticker}", f"{ticker}_candlestick.png")
+
 # Function to plot candlestick chart
+@tracing.traced('plot', 'ticker')
 def plot_candlestick_chart(df, ticker, category):
-    print(f"Plotting candlestick chart for {ticker}...")
+    logger.debug("Plotting candlestick chart for %s...", ticker)
+    ma_columns = [names[0] for names, _, _ in TREND_SPECS]
+    if not set(ma_columns) <= set(df.columns):
+        df = compute_frame(df, TREND_SPECS)
+    # Moving averages come precomputed from the indicator engine
+    addplot = [mpf.make_addplot(df[col], width=1) for col in ma_columns if df[col].notna().any()]
+
     # Define custom market colors
     mc = mpf.make_marketcolors(up='r', down='g', inherit=True)
     s = mpf.make_mpf_style(base_mpf_style='yahoo', marketcolors=mc)
@@ -65,7 +81,7 @@ def plot_candlestick_chart(df, ticker, category):
     # Plotting configuration
     kwargs = dict(
         type='candle',
-        mav=(5, 20, 60),  # Moving averages
+        addplot=addplot,  # Moving averages (5, 20, 60)
         volume=True,
         figratio=(10, 8),
         figscale=0.75,
@@ -74,32 +90,66 @@ def plot_candlestick_chart(df, ticker, category):
     )
     
     # Plot and save the chart
-    output_dir = f"results_stock_analysis/{category}/{ticker}"
-    os.makedirs(output_dir, exist_ok=True)
-    chart_path = os.path.join(output_dir, f"{ticker}_candlestick.png")
+    chart_path = chart_path_for(ticker, category)
+    os.makedirs(os.path.dirname(chart_path), exist_ok=True)
     mpf.plot(df, **kwargs, savefig=chart_path)
-    print(f"Chart for {ticker} saved to {chart_path}")
+    logger.debug("Chart for %s saved to %s", ticker, chart_path)
+    return chart_path
 
-# Main function
-def main():
-    etf_tickers = get_us_etf_tickers()
-    stock_tickers = get_us_stock_tickers()
-    
-    # Process ETFs
-    for ticker in etf_tickers:
-        try:
-            df = download_and_prepare_stock_data(ticker)
-            plot_candlestick_chart(df, ticker, "ETF")
-        except Exception as e:
-            print(f"Error processing ETF {ticker}: {e}")
+# Main function (max_workers: size of the process pool, defaults to the CPU count;
+# force: redraw every chart even when its inputs are unchanged)
+def main(max_workers=None, force=False, shard=None):
+    etf_tickers, stock_tickers = shard_lists(shard, get_us_etf_tickers(), get_us_stock_tickers())
+
+    # Charts that already cover the last trading day are skipped, so an interrupted
+    # run resumes from the first unfinished ticker
+    run = RunManifest('trend', shard)
+    todo, current = run.split(etf_tickers + stock_tickers, 'outputs', force)
+    logger.info("%d tickers are already current", len(current))
+    if not todo:
+        return
+
+    # Refresh the local bar cache in batched requests before the per-ticker loop
+    _, errors = refresh_many(etf_tickers + stock_tickers, '2024-10-01')
+    for ticker, error in errors.items():
+        logger.warning("Download failed for %s: %s", ticker, error)
     
-    # Process Stocks
-    for ticker in stock_tickers:
+    frames = {}
+    for ticker in etf_tickers + stock_tickers:
         try:
-            df = download_and_prepare_stock_data(ticker)
-            plot_candlestick_chart(df, ticker, "Stocks")
+            frames[ticker] = download_and_prepare_stock_data(ticker)
         except Exception as e:
-            print(f"Error processing Stock {ticker}: {e}")
+            logger.error("Error preparing %s: %s", ticker, e)
+
+    # Moving averages for the whole universe in one vectorized pass
+    indicators = calculate_universe_indicators(frames)
+
+    # Also append this run to the consolidated columnar results dataset
+    write_results('trend', indicators, {"ETF": etf_tickers, "Stocks": stock_tickers}, shard=shard)
+
+    # Render ETF and stock charts across a process pool
+    jobs = []
+    data_dates = {}
+    for category, tickers in (("ETF", etf_tickers), ("Stocks", stock_tickers)):
+        for ticker in tickers:
+            if ticker in frames and ticker in todo:
+                df = ticker_frame(indicators, ticker)
+                key = f"{category}/{ticker}"
+                data_dates[key] = df.index[-1]
+                jobs.append((key, (df, ticker, category), df, [chart_path_for(ticker, category)]))
+    manifest = ArtifactManifest('trend', shard=shard)
+    jobs, skipped = manifest.plan(jobs, [TREND_SPECS, PLOT_STYLE_VERSION], force)
+    logger.info("Skipping %d charts with unchanged inputs", len(skipped))
+    for key in skipped:
+        run.mark(key.split('/', 1)[1], 'outputs', data_dates[key], save=False)
+    run.save()
+    results, failures = run_batch(plot_candlestick_chart, jobs, max_workers, on_done=checkpoint(run, manifest, data_dates))
+    print_summary("Candlestick charts", results, failures)
 
 if __name__ == "__main__":
-    main()
+    args = run_arguments("Candlestick trend charts of US ETFs and stocks")
+    with tracing.session('trend'):
+        if args.merge:
+            merge_shards('trend', get_us_etf_tickers() + get_us_stock_tickers())
+        else:
+            main(args.workers, args.force, args.shard)
@@ -1,11 +1,13 @@
 import yfinance as yf
 import pandas as pd
 import numpy as np
-import backtrader as bt
+import matplotlib.pyplot as plt
 from keras.models import Sequential
 from keras.layers import LSTM, Dense
 from tqdm import tqdm
 
+from backtest import run_backtest, summarize
+
 # Function to preprocess data
 def preprocess_data(data):
     if isinstance(data.columns, pd.MultiIndex):
@@ -27,17 +29,6 @@ def download_stock_data(ticker, start_date, end_date):
         raise ValueError(f"No data available for {ticker}")
     return preprocess_data(data)
 
-# Define Backtrader data feed
-class PandasData(bt.feeds.PandasData):
-    params = (
-        ('datetime', None),
-        ('open', 'Open'),
-        ('high', 'High'),
-        ('low', 'Low'),
-        ('close', 'Close'),
-        ('volume', 'Volume'),
-    )
-
 # LSTM model definition
 def create_lstm_model(input_shape):
     model = Sequential()
@@ -48,42 +39,38 @@ def create_lstm_model(input_shape):
     model.compile(optimizer='adam', loss='mean_squared_error')
     return model
 
-# Backtesting with Backtrader
-def backtest_lstm_model(ticker, start_date, end_date, model, time_steps):
-    # Download and preprocess data
-    data = download_stock_data(ticker, start_date, end_date)
-    data_feed = PandasData(dataname=data)
-    
-    # Backtrader setup
-    cerebro = bt.Cerebro()
-    cerebro.adddata(data_feed)
-    cerebro.addstrategy(bt.Strategy)
-    
-    # Run backtest
-    try:
-        cerebro.run()
-        cerebro.plot()
-    except ValueError as ve:
-        print(f"Plotting failed for {ticker}: {ve}")
-    except Exception as e:
-        print(f"Unexpected error during backtest for {ticker}: {e}")
+# Long while the fast moving average is above the slow one
+def ma_crossover_positions(close, fast=20, slow=60):
+    return (close.rolling(fast).mean() > close.rolling(slow).mean()).astype(float)
+
+# Backtest all tickers at once; signal maps a close panel (dates x tickers) to target positions
+def backtest_universe(tickers, start_date, end_date, signal=ma_crossover_positions, commission=0.001):
+    frames = {}
+    for ticker in tqdm(tickers, desc="Downloading Stocks"):
+        try:
+            frames[ticker] = download_stock_data(ticker, start_date, end_date)
+        except Exception as e:
+            print(f"Error processing {ticker}: {e}")
+    if not frames:
+        return None, None
+
+    close = pd.DataFrame({ticker: data['Close'] for ticker, data in frames.items()})
+    open_ = pd.DataFrame({ticker: data['Open'] for ticker, data in frames.items()})
+    equity, trades = run_backtest(close, signal(close), open_, commission=commission)
+    summary = summarize(equity, trades)
+    print(summary.round(2).to_string())
+
+    equity.plot(figsize=(12, 6), title='Equity Curves')
+    plt.show()
+    return summary, trades
 
 # Main function
 def main():
     tickers = ['AAPL', 'MSFT', 'TSLA', 'AMZN']
     start_date = '2022-01-01'
     end_date = '2024-12-31'
-    time_steps = 60
-
-    # Create LSTM model
-    model = create_lstm_model((time_steps, 1))
 
-    # Process each ticker
-    for ticker in tqdm(tickers, desc="Processing Stocks"):
-        try:
-            backtest_lstm_model(ticker, start_date, end_date, model, time_steps)
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
+    backtest_universe(tickers, start_date, end_date)
 
 if __name__ == "__main__":
     main()
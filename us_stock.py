@@ -1,79 +1,70 @@
-import yfinance as yf
 import pandas as pd
-import talib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import logging
 import warnings
 
+import tracing
+from artifact_cache import ArtifactManifest
+from batch_runner import print_summary, run_batch
+from bar_store import get_bars, refresh_many
+from indicator_engine import TECHNICAL_SPECS, build_panel, compute_frame, compute_indicators, ticker_frame
+from results_dataset import write_results
+from run_manifest import RunManifest, checkpoint, merge_shards, run_arguments, shard_lists
+from ticker_registry import get_universe
+
+logger = logging.getLogger(__name__)
+
 # 忽略 FutureWarning
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 # 設置 Seaborn 樣式
 sns.set(style='whitegrid')
 
-# 美股 ETF 清單
+# 美股 ETF 清單 (由 ticker_registry 統一維護，已去除重複與無效代碼)
 def get_us_etf_tickers():
-    return [
-        "QQQ",  "QQQM", "VOO", "VTI", "SPY", "IVV", "DIA",
-        "VT", "VXUS", "VUG", "VO", "XLF", "BND", "VWO",  "DIAU", "QQQX"
-    ]
+    return get_universe('us_etfs')
 
 # 美股個股清單
 def get_us_stock_tickers():
-    return [
-        "TSLA", "AAPL", "AMZN", "AMD", "NKE", "V", "TSM", "INTC",
-        "MSFT", "ADBE", "GOOG", "MU", "NVDA", "MCD", "SMCI", "BE",
-        "PLUG", "APD", "FCEL", "BLDP", "KO", "PLTR", "SOUN", "META",
-        "CFLT", "AVGO", "QCOM", "IBKR", "LULU", "DDOG", "ZS", "MDB",
-        "NFLX", "ORLY", "BKNG", "ASML", "INTU", "TPL", "URI", "UNH",
-        "ASX",
-        # US_industry
-        "DJCO", "PLBY", "ORCL", "PFE", "MRK", "TPR", "RH", "MSTR",
-        "PGR", "TER", "MRVL", "ANET", "LW", "CLS", "CIEN", "INTU",
-        "IBM", "BRK/B", "MELI", "COIN", "CRWD", "FICO", "NOW",
-        "HUBS", "IT", "MA", "ROP", "MPWR", "KLAC", "TYL", "MTD",
-        "LLY", "REGN", "GHC", "MUSA", "CVCO", "MSCI", "GS", "AMP",
-        "LNG", "PNRG", "TRGP", "PH", "LII", "SPOT", "CHTR", "MLM",
-        "NEU", "LIN", "COST", "CASY", "SAM", "EQIX", "PSA", "ESS",
-        "CEG", "VST", "ATO", "QUBT", "TNXP", "PG", "JNJ", "ABBV"
-
-    ]
-
-# 計算技術指標
+    return get_universe('us_stocks')
+
+# 計算技術指標 (單檔)
+@tracing.traced('indicators')
 def calculate_technical_indicators(df):
     try:
-        # 提取數據為一維 numpy.ndarray
-        close = df['Close'].values.flatten()  # 確保為一維
-        high = df['High'].values.flatten()
-        low = df['Low'].values.flatten()
-
-        # 打印調試信息
-        print(f"Close shape: {close.shape}, High shape: {high.shape}, Low shape: {low.shape}")
+        logger.debug("Data shape: %s", df.shape)
 
         # 檢查數據是否足夠
-        if len(close) < 20 or len(high) < 20 or len(low) < 20:
+        if len(df) < 20:
             raise ValueError("Not enough data to calculate indicators")
 
-        # 初始化新列
-        df['MA10'] = talib.SMA(close, timeperiod=10) if len(close) >= 10 else None
-        df['MA20'] = talib.SMA(close, timeperiod=20) if len(close) >= 20 else None
-        df['RSI'] = talib.RSI(close, timeperiod=14) if len(close) >= 14 else None
-        df['MACD'], df['MACD_signal'], df['MACD_hist'] = (
-            talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-            if len(close) >= 26
-            else (None, None, None)
-        )
-        df['Upper_BB'], df['Middle_BB'], df['Lower_BB'] = (
-            talib.BBANDS(close, timeperiod=20) if len(close) >= 20 else (None, None, None)
-        )
-        df['ATR'] = talib.ATR(high, low, close, timeperiod=14) if len(close) >= 14 else None
-        df['ADX'] = talib.ADX(high, low, close, timeperiod=14) if len(close) >= 14 else None
-        return df
+        return compute_frame(df, TECHNICAL_SPECS)
     except Exception as e:
-        print(f"Error calculating indicators: {e}")
+        logger.error("Error calculating indicators: %s", e)
         return df
+
+# 一次計算整個清單的技術指標 (dates x tickers 面板)
+def calculate_universe_indicators(tickers):
+    frames = {}
+    for ticker in tickers:
+        data = load_stock_data(ticker)
+        if data is not None:
+            frames[ticker] = data
+    with tracing.span('indicators', tickers=len(frames)):
+        return compute_indicators(build_panel(frames), TECHNICAL_SPECS)
+
+# 圖表樣式版本：修改繪圖程式時遞增，讓既有圖表重新繪製
+PLOT_STYLE_VERSION = 1
+
+# 單檔的輸出檔案
+def output_paths(ticker, category):
+    output_dir = f'results_stock_analysis/{category}/{ticker}'
+    return [f'{output_dir}/{ticker}_technical_indicators.png', f'{output_dir}/technical_indicators_and_volume.csv']
+
 # 繪製技術指標圖表 (改進版)
+@tracing.traced('plot', 'ticker')
 def plot_technical_indicators(ticker, df, category):
     fig, ax = plt.subplots(5, 1, figsize=(14, 20), sharex=True)
 
@@ -116,42 +107,52 @@ def plot_technical_indicators(ticker, df, category):
     plt.savefig(f'{output_dir}/{ticker}_technical_indicators.png')
     plt.close()
 
-# 分析單個股票或 ETF
-def analyze_stock(ticker, category):
-    try:
-        # 加载数据
-        data = yf.download(ticker, start='2024-01-01', end=pd.Timestamp('today'), threads=False)
-        if data.empty:
-            print(f"No data for {ticker}")
-            return None
+# 載入並檢查單檔資料
+@tracing.traced('download', 'ticker')
+def load_stock_data(ticker):
+    # 加载数据
+    data = get_bars(ticker, start='2024-01-01', end=pd.Timestamp('today'))
+    if data.empty:
+        logger.warning("No data for %s", ticker)
+        return None
+    tracing.count('rows', len(data), ticker)
 
-        # 填充缺失值
-        data = data.ffill().bfill()
+    # 填充缺失值
+    data = data.ffill().bfill()
 
-        # 确保索引是 DatetimeIndex
-        data.index = pd.to_datetime(data.index, errors='coerce')
-        if data.index.isnull().any():
-            print(f"Invalid index detected for {ticker}")
-            return None
+    # 确保索引是 DatetimeIndex
+    data.index = pd.to_datetime(data.index, errors='coerce')
+    if data.index.isnull().any():
+        logger.warning("Invalid index detected for %s", ticker)
+        return None
 
-        # 检查数据完整性
-        if len(data) < 20:
-            print(f"Not enough data for {ticker}")
-            return None
+    # 检查数据完整性
+    if len(data) < 20:
+        logger.warning("Not enough data for %s", ticker)
+        return None
+    return data
+
+# 分析單個股票或 ETF (df 為已算好的指標時直接使用)
+@tracing.traced('analyze', 'ticker')
+def analyze_stock(ticker, category, df=None):
+    try:
+        if df is None:
+            data = load_stock_data(ticker)
+            if data is None:
+                return None
 
-        # 打印数据头部信息以调试
-        print(f"Processing {ticker} with data shape: {data.shape}")
-        print(data.head())
+            # 調試資訊 (DEBUG 等級才輸出)
+            logger.debug("Processing %s with data shape: %s\n%s", ticker, data.shape, data.head())
 
-        # 计算技术指标
-        df = calculate_technical_indicators(data)
+            # 计算技术指标
+            df = calculate_technical_indicators(data)
 
         # 检查是否所有列都存在
         required_columns = ['Close', 'Volume', 'MA10', 'MA20', 'RSI', 'MACD', 'MACD_signal',
                             'Upper_BB', 'Middle_BB', 'Lower_BB', 'ATR', 'ADX']
         missing_columns = [col for col in required_columns if col not in df.columns]
         if missing_columns:
-            print(f"Missing columns for {ticker}: {missing_columns}")
+            logger.warning("Missing columns for %s: %s", ticker, missing_columns)
             return None
 
         # 提取相关特征用于分析
@@ -161,32 +162,62 @@ def analyze_stock(ticker, category):
         plot_technical_indicators(ticker, df, category)
 
         # 保存每个股票的技术指标和成交量数据
-        features.to_csv(f'results_stock_analysis/{category}/{ticker}/technical_indicators_and_volume.csv')
+        output_file = f'results_stock_analysis/{category}/{ticker}/technical_indicators_and_volume.csv'
+        with tracing.span('write', ticker):
+            features.to_csv(output_file)
+        tracing.count('bytes_written', os.path.getsize(output_file), ticker)
 
         return features
     except Exception as e:
-        print(f"Error processing {ticker}: {e}")
+        logger.error("Error processing %s: %s", ticker, e)
         return None
-# 主程序
-def main():
-    # 確認清單數量
-    etf_tickers = get_us_etf_tickers()
-    stock_tickers = get_us_stock_tickers()
-
-    print(f"美股 ETF 清單數量: {len(etf_tickers)}")  # 應為 18
-    print(f"美股個股清單數量: {len(stock_tickers)}")  # 應為 45
-
-    # 分析 US ETF
-    for ticker in etf_tickers:
-        df = analyze_stock(ticker, "ETF")  # 獲取分析結果
-        if df is not None:
-            check_missing_columns(ticker, df)
-
-    # 分析 US 個股
-    for ticker in stock_tickers:
-        df = analyze_stock(ticker, "Stocks")  # 獲取分析結果
-        if df is not None:
-            check_missing_columns(ticker, df)
+# 主程序 (max_workers: 平行處理的行程數，預設為 CPU 核心數；force: 忽略快取全部重繪)
+def main(max_workers=None, force=False, shard=None):
+    # 確認清單數量 (指定 shard 時只處理其中一份)
+    etf_tickers, stock_tickers = shard_lists(shard, get_us_etf_tickers(), get_us_stock_tickers())
+
+    logger.info("美股 ETF 清單數量: %d", len(etf_tickers))  # 應為 18
+    logger.info("美股個股清單數量: %d", len(stock_tickers))  # 應為 45
+
+    # 已產出最新交易日結果的標的直接略過，中斷後重跑會從未完成的標的繼續
+    run = RunManifest('us_stock', shard)
+    todo, current = run.split(etf_tickers + stock_tickers, 'outputs', force)
+    logger.info("%d 檔標的已是最新交易日的結果", len(current))
+    if not todo:
+        return
+
+    # 批次更新本地快取，之後逐檔分析皆直接讀取快取
+    _, errors = refresh_many(etf_tickers + stock_tickers, '2024-01-01')
+    for ticker, error in errors.items():
+        logger.warning("Download failed for %s: %s", ticker, error)
+
+    # 整個清單一次計算技術指標，逐檔只切片繪圖與輸出
+    indicators = calculate_universe_indicators(etf_tickers + stock_tickers)
+    computed = set(indicators.columns.get_level_values('Ticker'))
+
+    # 寫入整合的欄式結果資料集 (供查詢用)
+    write_results('us_stock', indicators, {"ETF": etf_tickers, "Stocks": stock_tickers}, shard=shard)
+
+    # 分析 US ETF 與個股 (繪圖與輸出分散到多個行程)，輸入未變的標的直接略過
+    jobs = []
+    data_dates = {}
+    for category, tickers in (("ETF", etf_tickers), ("Stocks", stock_tickers)):
+        for ticker in tickers:
+            if ticker in computed and ticker in todo:
+                df = ticker_frame(indicators, ticker)
+                key = f"{category}/{ticker}"
+                data_dates[key] = df.index[-1]
+                jobs.append((key, (ticker, category, df), df, output_paths(ticker, category)))
+    manifest = ArtifactManifest('us_stock', shard=shard)
+    jobs, skipped = manifest.plan(jobs, [TECHNICAL_SPECS, PLOT_STYLE_VERSION], force)
+    logger.info("略過 %d 檔未變動的標的", len(skipped))
+    for key in skipped:
+        run.mark(key.split('/', 1)[1], 'outputs', data_dates[key], save=False)
+    run.save()
+    results, failures = run_batch(analyze_stock, jobs, max_workers, on_done=checkpoint(run, manifest, data_dates))
+    for key, df in results.items():
+        check_missing_columns(key.split('/', 1)[1], df)
+    print_summary("US stock indicators", results, failures)
 
 def check_missing_columns(ticker, df):
     """檢查缺失的技術指標列"""
@@ -194,7 +225,12 @@ def check_missing_columns(ticker, df):
                         'Upper_BB', 'Middle_BB', 'Lower_BB', 'ATR', 'ADX']
     missing_columns = [col for col in required_columns if col not in df.columns]
     if missing_columns:
-        print(f"Missing columns for {ticker}: {missing_columns}")
+        logger.warning("Missing columns for %s: %s", ticker, missing_columns)
 
 if __name__ == "__main__":
-    main()
+    args = run_arguments("美股技術指標分析")
+    with tracing.session('us_stock'):
+        if args.merge:
+            merge_shards('us_stock', get_us_etf_tickers() + get_us_stock_tickers())
+        else:
+            main(args.workers, args.force, args.shard)